@@ -1,63 +1,196 @@
-from langgraph.graph import StateGraph, END
-from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
 from state.conversation_state import ConversationState
 from models.schemas import ConversationContext, IntentType, MeetingDetails, EmailDetails
 from agents.intent_classifier import IntentClassifierAgent
 from agents.entity_extractor import EntityExtractorAgent
-from typing import Dict, Literal
+from chains.confirmation_chain import ConfirmationChain
+from agents.local_responder import local_chitchat
+from agents.local_intent_model import ReloadingIntentModel
+from agents.dialog_executor import DirectExecutor, END
+from helpers.semantic_cache import SemanticCache
+from agents.rule_based import (
+    RuleBasedIntentClassifier, RuleBasedEntityExtractor,
+    strip_context_prefix, extract_date, extract_time, extract_emails, is_cancel
+)
+from utils.llm_factory import create_llm, llm_circuit_breaker
+from utils.prompt_cache_stats import llm_node
+from utils.tracing import annotate, traced_node
+from helpers.response_templates import missing_field_question, CHITCHAT_FALLBACK, FORM_CANCELLED
+from helpers.context_compaction import get_encoding
+from config import Config
+from typing import Dict, List, Literal, Optional, Tuple
+import random
+
+# Slots answered with free text rather than a date, time or address
+TEXT_SLOTS = {"title", "subject", "body"}
+# LLM classifications below this are likely fallbacks and aren't cached
+CACHEABLE_INTENT_CONFIDENCE = 0.7
 
 class DialogAgent:
     def __init__(self, api_key: str):
-        self.llm = ChatOpenAI(api_key=api_key, model_name="gpt-4o-mini", temperature=0.3)
+        self.api_key = api_key
+        # One model per LLM node (Config.LLM_NODES), created on first use and shared by the chains
+        self.llms: Dict[str, object] = {}
+        self.llm = self.node_llm("chitchat")
         self.intent_classifier = IntentClassifierAgent(api_key)
         self.entity_extractor = EntityExtractorAgent(api_key)
-        self.graph = self.build_graph()
+        # Rule-only fallbacks for when the LLM is out of budget or the circuit is open
+        self.rule_classifier = RuleBasedIntentClassifier()
+        self.rule_extractor = RuleBasedEntityExtractor()
+        self.circuit_breaker = llm_circuit_breaker
+        self.chitchat_responder = local_chitchat
+        self.local_intent_model = ReloadingIntentModel(Config.LOCAL_INTENT_MODEL_PATH)
+        # Paraphrases of messages already seen reuse their intent or chitchat reply
+        self.intent_cache = None
+        self.chitchat_cache = None
+        if Config.SEMANTIC_CACHE_ENABLED:
+            self.intent_cache = SemanticCache(Config.SEMANTIC_CACHE_CAPACITY, Config.SEMANTIC_CACHE_INTENT_THRESHOLD)
+            self.chitchat_cache = SemanticCache(Config.SEMANTIC_CACHE_CAPACITY, Config.SEMANTIC_CACHE_CHITCHAT_THRESHOLD)
         
-    def build_graph(self):
-        workflow = StateGraph(ConversationState)
+        # Prompts are compiled once here rather than on every turn
+        self.missing_info_prompt = ChatPromptTemplate.from_template("""
+        Generate a natural, friendly question to ask for the missing information.
+        Ask for only the first missing field in a conversational way.
         
-        # Add nodes
-        workflow.add_node("classify_intent", self.classify_intent_node)
-        workflow.add_node("extract_entities", self.extract_entities_node)
-        workflow.add_node("check_completeness", self.check_completeness_node)
-        workflow.add_node("ask_missing_info", self.ask_missing_info_node)
-        workflow.add_node("generate_confirmation", self.generate_confirmation_node)
-        workflow.add_node("process_confirmation", self.process_confirmation_node)
-        workflow.add_node("execute_action", self.execute_action_node)
-        workflow.add_node("handle_chitchat", self.handle_chitchat_node)
-        
-        # Define edges
-        workflow.set_entry_point("classify_intent")
-        
-        workflow.add_conditional_edges(
-            "classify_intent",
-            self.route_by_intent,
-            {
-                "extract": "extract_entities",
-                "chitchat": "handle_chitchat"
-            }
-        )
+        Be specific and helpful. For example:
+        - For 'title': "What would you like to call this meeting?"
+        - For 'date': "What day would you like to schedule this?"
+        - For 'time': "What time works best for you?"
+        - For 'recipient': "Who should I send this email to?"
+        - For 'body': "What would you like to say in the email?"
+        
+        The user wants to {intent} but we're missing: {missing_fields}.
+        Missing field: {first_missing}
+        """)
+        
+        self.chitchat_prompt = ChatPromptTemplate.from_template("""
+        Respond to this general conversation in a friendly, helpful way.
+        Keep your response brief and natural.
+        
+        User: {message}
+        """)
+        
+        self.graph = self.build_executor() if Config.DIALOG_EXECUTOR == "direct" else self.build_graph()
+    
+    def warm_up(self):
+        """Pay one-off startup costs before the first real turn"""
+        # Load the tokenizer used for prompt context caps (from the local cache when present)
+        get_encoding()
+        
+        # Format every prompt once so template parsing and validation are done
+        self.missing_info_prompt.format_messages(intent="schedule meeting", missing_fields="time", first_missing="time")
+        self.chitchat_prompt.format_messages(message="Hello")
+        self.intent_classifier.prompt.format_messages(input="Hello", current_datetime="")
+        for prompt in (self.entity_extractor.meeting_prompt, self.entity_extractor.email_prompt):
+            prompt.format_messages(input="Hello", context="None", current_datetime="", day_of_week="", tomorrow="")
+        if hasattr(self.graph, "get_graph"):
+            self.graph.get_graph()
         
-        workflow.add_edge("extract_entities", "check_completeness")
+        # Open a pooled connection to the API so the first turn skips the TLS handshake
+        if Config.WARMUP_CONNECT and self.circuit_breaker.is_closed and hasattr(self.llm, "root_client"):
+            try:
+                self.llm.root_client.with_options(timeout=5, max_retries=0).models.list()
+            except Exception as e:
+                print(f"Warm-up connection to the LLM backend failed: {e}")
         
-        workflow.add_conditional_edges(
-            "check_completeness",
-            self.route_by_completeness,
-            {
+    def dialog_flow(self):
+        """Nodes, entry route and edges of a turn; both executors are built from this"""
+        steps = {
+            "classify_intent": self.classify_intent_node,
+            "extract_entities": self.extract_entities_node,
+            "check_completeness": self.check_completeness_node,
+            "ask_missing_info": self.ask_missing_info_node,
+            "generate_confirmation": self.generate_confirmation_node,
+            "process_confirmation": self.process_confirmation_node,
+            "execute_action": self.execute_action_node,
+            "handle_chitchat": self.handle_chitchat_node,
+            "fill_slot": self.fill_slot_node
+        }
+        nodes = {name: traced_node(name, node) for name, node in steps.items()}
+        
+        # A reply to a missing-field question skips classification
+        entry = (self.route_entry, {
+            "classify": "classify_intent",
+            "fill_slot": "fill_slot"
+        })
+        
+        edges = {
+            "fill_slot": (self.route_slot_fill, {
+                "filled": "check_completeness",
+                "extract": "extract_entities",
+                "reclassify": "classify_intent",
+                "chitchat": "handle_chitchat",
+                "cancelled": END
+            }),
+            "classify_intent": (self.route_by_intent, {
+                "extract": "extract_entities",
+                "chitchat": "handle_chitchat"
+            }),
+            "extract_entities": "check_completeness",
+            "check_completeness": (self.route_by_completeness, {
                 "incomplete": "ask_missing_info",
                 "complete": "generate_confirmation"
-            }
-        )
+            }),
+            "ask_missing_info": END,
+            "generate_confirmation": END,
+            "process_confirmation": "execute_action",
+            "execute_action": END,
+            "handle_chitchat": END
+        }
+        return nodes, entry, edges
+    
+    def build_graph(self, flow=None):
+        # LangGraph is only imported when it runs the dialog
+        from langgraph.graph import StateGraph
+        
+        nodes, entry, edges = flow or self.dialog_flow()
+        workflow = StateGraph(ConversationState)
         
-        workflow.add_edge("ask_missing_info", END)
-        workflow.add_edge("generate_confirmation", END)
-        workflow.add_edge("process_confirmation", "execute_action")
-        workflow.add_edge("execute_action", END)
-        workflow.add_edge("handle_chitchat", END)
+        for name, node in nodes.items():
+            workflow.add_node(name, node)
+        
+        workflow.set_conditional_entry_point(*entry)
+        for source, target in edges.items():
+            if isinstance(target, str):
+                workflow.add_edge(source, target)
+            else:
+                workflow.add_conditional_edges(source, *target)
         
         return workflow.compile()
     
+    def build_executor(self, flow=None) -> DirectExecutor:
+        """Plain-Python alternative to build_graph (DIALOG_EXECUTOR=direct)"""
+        nodes, entry, edges = flow or self.dialog_flow()
+        return DirectExecutor(ConversationState, nodes, entry, edges)
+    
+    def can_call_llm(self, state: ConversationState) -> bool:
+        """Check that the turn isn't in rule-only mode and its deadline covers another LLM call"""
+        if state.get("rule_only"):
+            return False
+        deadline = state.get("deadline")
+        return deadline is None or deadline.can_afford(Config.LLM_CALL_ESTIMATE_SECONDS)
+    
+    def node_llm(self, node: str):
+        """The chat model configured for an LLM node"""
+        if node not in self.llms:
+            self.llms[node] = create_llm(self.api_key, node)
+        return self.llms[node]
+    
+    def bound_llm(self, state: ConversationState, node: str = "chitchat"):
+        """Return the node's LLM capped at the remaining turn budget"""
+        llm = self.node_llm(node)
+        deadline = state.get("deadline")
+        return deadline.bind_timeout(llm) if deadline else llm
+    
+    def route_entry(self, state: ConversationState) -> Literal["classify", "fill_slot"]:
+        """Go straight to slot filling while the dialog is waiting on missing fields"""
+        if state.get("pending_slots") and state.get("current_intent") in [IntentType.SCHEDULE_MEETING, IntentType.SEND_EMAIL]:
+            return "fill_slot"
+        return "classify"
+    
+    def route_slot_fill(self, state: ConversationState) -> Literal["filled", "extract", "reclassify", "chitchat", "cancelled"]:
+        return state.get("slot_fill_result") or "reclassify"
+    
     def route_by_intent(self, state: ConversationState) -> Literal["extract", "chitchat"]:
         """Route based on intent"""
         if state["current_intent"] in [IntentType.SCHEDULE_MEETING, IntentType.SEND_EMAIL]:
@@ -73,7 +206,53 @@ class DialogAgent:
     def classify_intent_node(self, state: ConversationState):
         """Classify user intent"""
         latest_message = state["messages"][-1] if state["messages"] else ""
-        classification = self.intent_classifier.classify(latest_message)
+        
+        # Batch requests classify the messages nothing local can answer up front in one call
+        precomputed = state.get("precomputed_intent")
+        if precomputed is not None:
+            if self.intent_cache and precomputed.confidence >= CACHEABLE_INTENT_CONFIDENCE:
+                self.intent_cache.put(strip_context_prefix(latest_message).strip(), precomputed.intent)
+            return {
+                "current_intent": precomputed.intent,
+                "context": ConversationContext(intent=precomputed.intent, raw_user_input=latest_message)
+            }
+        
+        # The local model answers confident cases without an LLM round trip
+        local = self.local_intent_model.classify(latest_message)
+        if local is not None and local.confidence >= Config.LOCAL_INTENT_MIN_CONFIDENCE:
+            return {
+                "current_intent": local.intent,
+                "context": ConversationContext(intent=local.intent, raw_user_input=latest_message)
+            }
+        
+        cache_key = strip_context_prefix(latest_message).strip()
+        cached = self.intent_cache.lookup(cache_key) if self.intent_cache else None
+        if cached is not None and not self.should_audit(state):
+            annotate({"semantic_cache.hit": True})
+            return {
+                "current_intent": cached,
+                "context": ConversationContext(intent=cached, raw_user_input=latest_message)
+            }
+        
+        if not self.can_call_llm(state):
+            return self.rule_classification(latest_message, False)
+        # The breaker is consulted right before the call, since it may hand out its one recovery probe;
+        # when it is open the whole turn runs rule-only
+        if not self.circuit_breaker.allow_request():
+            return self.rule_classification(latest_message, True)
+        
+        classification = self.intent_classifier.classify(latest_message, state.get("deadline"))
+        if not self.circuit_breaker.is_closed:
+            # The backend failed during classification; finish the turn rule-only
+            return self.rule_classification(latest_message, True)
+        if classification is None:
+            # A failed or malformed call is routed by rules rather than treated as chitchat
+            return self.rule_classification(latest_message, False)
+        
+        if cached is not None:
+            self.intent_cache.record_audit(classification.intent == cached)
+        if self.intent_cache and classification.confidence >= CACHEABLE_INTENT_CONFIDENCE:
+            self.intent_cache.put(cache_key, classification.intent)
         
         return {
             "current_intent": classification.intent,
@@ -83,27 +262,153 @@ class DialogAgent:
             )
         }
     
+    def classifies_locally(self, message: str) -> bool:
+        """Whether classify_intent_node can answer from the local model or the intent cache"""
+        local = self.local_intent_model.classify(message)
+        if local is not None and local.confidence >= Config.LOCAL_INTENT_MIN_CONFIDENCE:
+            return True
+        return bool(self.intent_cache) and self.intent_cache.contains(strip_context_prefix(message).strip())
+    
+    def should_audit(self, state: ConversationState) -> bool:
+        """Sample a cache hit for re-classification by the LLM"""
+        return (
+            random.random() < Config.SEMANTIC_CACHE_AUDIT_RATE
+            and self.circuit_breaker.is_closed
+            and self.can_call_llm(state)
+        )
+    
+    def rule_classification(self, message: str, rule_only: bool):
+        # A trained local model beats the keyword rules even below its confidence threshold
+        local = self.local_intent_model.classify(message)
+        intent = local.intent if local is not None else self.rule_classifier.classify(message).intent
+        return {
+            "current_intent": intent,
+            "context": ConversationContext(intent=intent, raw_user_input=message),
+            "rule_only": rule_only,
+            "degraded": True
+        }
+    
+    def fill_slot_node(self, state: ConversationState):
+        """Parse a reply to a missing-field question for just the pending slots"""
+        intent = state["current_intent"]
+        pending = state["pending_slots"]
+        message = strip_context_prefix(state["messages"][-1]).strip()
+        context = ConversationContext(intent=intent, raw_user_input=message, state="collecting_info")
+        
+        if is_cancel(message):
+            return {
+                "slot_fill_result": "cancelled",
+                "current_intent": IntentType.CHITCHAT,
+                "pending_slots": None,
+                "final_response": FORM_CANCELLED
+            }
+        
+        # Routine chitchat ("hello", "thanks") is answered locally and ends the form
+        if self.chitchat_responder.category(message):
+            return {"slot_fill_result": "chitchat", "current_intent": IntentType.CHITCHAT, "pending_slots": None}
+        
+        # A new request mid-form ("actually, send an email instead") goes back through classification
+        reclassify = {"slot_fill_result": "reclassify", "pending_slots": None}
+        if self.rule_classifier.classify(message).intent not in (intent, IntentType.CHITCHAT):
+            return reclassify
+        
+        filled, needs_extractor = self.parse_pending_slots(message, pending)
+        if not filled and self.is_off_topic(message):
+            return reclassify
+        
+        entities = {**(state.get("extracted_entities") or {}), **filled}
+        if needs_extractor:
+            # Not a plain answer; extract the rest against the known entities, keeping what was parsed here
+            return {
+                "slot_fill_result": "extract",
+                "context": context,
+                "extracted_entities": entities,
+                "slot_values": filled
+            }
+        
+        return {
+            "slot_fill_result": "filled",
+            "context": context,
+            "extracted_entities": entities
+        }
+    
+    def is_off_topic(self, message: str) -> bool:
+        """A reply with no slot values that asks something else, or that the local model reads as chitchat"""
+        if message.endswith("?"):
+            return True
+        local = self.local_intent_model.classify(message)
+        return (
+            local is not None
+            and local.intent == IntentType.CHITCHAT
+            and local.confidence >= Config.LOCAL_INTENT_MIN_CONFIDENCE
+        )
+    
+    def parse_pending_slots(self, message: str, pending: List[str]) -> Tuple[Dict, bool]:
+        """Slots filled from the reply locally, and whether the rest of it needs the full extractor"""
+        filled = {}
+        for slot in pending:
+            if slot == "date":
+                value = extract_date(message)
+            elif slot == "time":
+                value = extract_time(message)
+            elif slot == "recipient":
+                emails = extract_emails(message)
+                value = emails[0] if len(emails) == 1 else None
+            elif slot == "participants":
+                value = extract_emails(message) or None
+            else:
+                continue
+            if value:
+                filled[slot] = value
+        
+        # The question asked for the first pending slot; a bare answer to a text slot is its value
+        first = pending[0] if pending else None
+        if first in TEXT_SLOTS:
+            if filled or message.endswith("?"):
+                return filled, True
+            filled[first] = message.strip(" .!")
+        return filled, not filled
+    
     def extract_entities_node(self, state: ConversationState):
         """Extract entities based on intent"""
         intent = state["current_intent"]
         message = state["messages"][-1]
         
+        # Slot-filling turns skip classification, so the breaker may not have been consulted yet
+        breaker_open = self.can_call_llm(state) and not self.circuit_breaker.allow_request()
+        breaker_state = {"rule_only": True} if breaker_open else {}
+        if breaker_open or not self.can_call_llm(state):
+            if intent == IntentType.SCHEDULE_MEETING:
+                entities = self.rule_extractor.extract_meeting_entities(message, state.get("extracted_entities"))
+            else:
+                entities = self.rule_extractor.extract_email_entities(message, state.get("extracted_entities"))
+            return {"extracted_entities": entities.dict(), "degraded": True, **breaker_state}
+        
         if intent == IntentType.SCHEDULE_MEETING:
             entities = self.entity_extractor.extract_meeting_entities(
                 message, 
-                state.get("extracted_entities", {})
+                state.get("extracted_entities", {}),
+                state.get("deadline"),
+                state.get("history")
             )
-            return {"extracted_entities": entities.dict()}
+            return {"extracted_entities": self.merge_entities(state, entities.dict())}
             
         elif intent == IntentType.SEND_EMAIL:
             entities = self.entity_extractor.extract_email_entities(
                 message,
-                state.get("extracted_entities", {})
+                state.get("extracted_entities", {}),
+                state.get("deadline"),
+                state.get("history")
             )
-            return {"extracted_entities": entities.dict()}
+            return {"extracted_entities": self.merge_entities(state, entities.dict())}
         
         return {}
     
+    def merge_entities(self, state: ConversationState, extracted: Dict) -> Dict:
+        """Keep known values the LLM left empty this turn, and values the reply was parsed into locally"""
+        known = state.get("extracted_entities") or {}
+        return {**known, **{key: value for key, value in extracted.items() if value}, **(state.get("slot_values") or {})}
+    
     def check_completeness_node(self, state: ConversationState):
         """Check if all required fields are present"""
         intent = state["current_intent"]
@@ -124,43 +429,51 @@ class DialogAgent:
     def ask_missing_info_node(self, state: ConversationState):
         """Generate questions for missing information"""
         missing = state["missing_fields"]
+        first_missing = missing[0] if missing else ""
         
-        prompt = ChatPromptTemplate.from_template("""
-        The user wants to {intent} but we're missing: {missing_fields}.
-        Generate a natural, friendly question to ask for the missing information.
-        Ask for only the first missing field in a conversational way.
+        # Templates need no round trip; the LLM only phrases questions when that style is chosen
+        if Config.MISSING_FIELD_STYLE != "llm":
+            return {"final_response": self.template_question(state, first_missing)}
         
-        Missing field: {first_missing}
-        
-        Be specific and helpful. For example:
-        - For 'title': "What would you like to call this meeting?"
-        - For 'date': "What day would you like to schedule this?"
-        - For 'time': "What time works best for you?"
-        - For 'recipient': "Who should I send this email to?"
-        - For 'body': "What would you like to say in the email?"
-        """)
+        if not self.can_call_llm(state):
+            return {
+                "final_response": self.template_question(state, first_missing),
+                "degraded": True
+            }
         
-        chain = prompt | self.llm
+        chain = self.missing_info_prompt | self.bound_llm(state, "missing_info")
         
-        response = chain.invoke({
-            "intent": state["current_intent"].value.replace("_", " "),
-            "missing_fields": ", ".join(missing),
-            "first_missing": missing[0] if missing else ""
-        })
+        try:
+            response = chain.invoke({
+                "intent": state["current_intent"].value.replace("_", " "),
+                "missing_fields": ", ".join(missing),
+                "first_missing": first_missing
+            }, config=llm_node("missing_info"))
+        except Exception as e:
+            print(f"Missing info question failed, using template: {e}")
+            return {
+                "final_response": self.template_question(state, first_missing),
+                "degraded": True
+            }
         
         return {"final_response": response.content}
     
+    def template_question(self, state: ConversationState, field: str) -> str:
+        # Rotate phrasings with the conversation length so a repeated question reads differently
+        history = state.get("history")
+        return missing_field_question(
+            state["current_intent"],
+            field,
+            state.get("extracted_entities"),
+            variant=len(history) if history is not None else 0
+        )
+    
     def generate_confirmation_node(self, state: ConversationState):
         """Generate confirmation message"""
         intent = state["current_intent"]
         entities = state["extracted_entities"]
         
-        if intent == IntentType.SCHEDULE_MEETING:
-            confirmation = f"Should I book a meeting '{entities.get('title', 'Meeting')}' on {entities.get('date')} at {entities.get('time')}?"
-        elif intent == IntentType.SEND_EMAIL:
-            confirmation = f"Should I send an email to {entities.get('recipient')} saying: '{entities.get('body')}'?"
-        else:
-            confirmation = "Should I proceed with this action?"
+        confirmation = ConfirmationChain.render_confirmation(intent, entities)
         
         return {
             "confirmation_message": confirmation,
@@ -180,17 +493,37 @@ class DialogAgent:
     
     def handle_chitchat_node(self, state: ConversationState):
         """Handle general conversation"""
-        prompt = ChatPromptTemplate.from_template("""
-        Respond to this general conversation in a friendly, helpful way.
-        Keep your response brief and natural.
+        # Greetings, thanks, help and goodbyes are answered locally; only open-ended chat reaches the LLM
+        history = state.get("history")
+        local_reply = self.chitchat_responder.respond(
+            state["messages"][-1] if state["messages"] else "Hello",
+            variant=len(history) if history is not None else 0
+        )
+        if local_reply is not None:
+            return {"final_response": local_reply}
         
-        User: {message}
-        """)
+        message = strip_context_prefix(state["messages"][-1] if state["messages"] else "Hello").strip()
+        # Open-ended replies are only reused within the session that got them
+        session_id = state.get("session_id")
+        chitchat_cache = self.chitchat_cache if session_id else None
+        cached_reply = chitchat_cache.lookup(message, session_id) if chitchat_cache else None
+        if cached_reply is not None:
+            annotate({"semantic_cache.hit": True})
+            return {"final_response": cached_reply}
         
-        chain = prompt | self.llm
+        if not self.can_call_llm(state):
+            return {"final_response": CHITCHAT_FALLBACK, "degraded": True}
         
-        response = chain.invoke({
-            "message": state["messages"][-1] if state["messages"] else "Hello"
-        })
+        chain = self.chitchat_prompt | self.bound_llm(state)
+        
+        try:
+            response = chain.invoke({
+                "message": state["messages"][-1] if state["messages"] else "Hello"
+            }, config=llm_node("chitchat"))
+        except Exception as e:
+            print(f"Chitchat reply failed, using canned response: {e}")
+            return {"final_response": CHITCHAT_FALLBACK, "degraded": True}
         
+        if chitchat_cache:
+            chitchat_cache.put(message, response.content, session_id)
         return {"final_response": response.content}
\ No newline at end of file
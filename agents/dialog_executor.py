@@ -0,0 +1,97 @@
+"""Plain-Python executor for the dialog flow.
+
+The dialog's routing is deterministic, so a turn is just a walk from the
+entry router through node functions until END. This runs that walk directly
+with the same node functions and ConversationState contract as the compiled
+LangGraph graph, minus its channels, checkpoints and task scheduling.
+"""
+from typing import Annotated, Any, Callable, Dict, Iterator, List, Optional, Tuple, Union, get_origin, get_type_hints
+import asyncio
+
+# Same sentinel as langgraph.graph.END, so one flow definition drives both executors
+END = "__end__"
+
+# A router and the mapping from its return value to the next node
+Route = Tuple[Callable[[dict], str], Dict[str, str]]
+
+
+class DialogFlowError(RuntimeError):
+    """Raised when a turn doesn't reach END within the recursion limit"""
+
+
+class DirectExecutor:
+    """Runs the dialog nodes as a state machine; a drop-in for the compiled graph's invoke/stream"""
+
+    def __init__(
+        self,
+        state_schema: type,
+        nodes: Dict[str, Callable[[dict], Optional[dict]]],
+        entry: Route,
+        edges: Dict[str, Union[str, Route]],
+        recursion_limit: int = 25
+    ):
+        self.nodes = nodes
+        self.entry = entry
+        self.edges = edges
+        self.recursion_limit = recursion_limit
+        # Keys annotated with a reducer (e.g. messages: Annotated[..., operator.add]) are combined, not replaced
+        self.reducers = {
+            key: hint.__metadata__[0]
+            for key, hint in get_type_hints(state_schema, include_extras=True).items()
+            if get_origin(hint) is Annotated and callable(hint.__metadata__[0])
+        }
+
+    def apply(self, state: dict, update: Optional[dict]):
+        for key, value in (update or {}).items():
+            reducer = self.reducers.get(key)
+            if reducer is not None and key in state:
+                state[key] = reducer(state[key], value)
+            else:
+                state[key] = value
+
+    @staticmethod
+    def follow(route: Union[str, Route], state: dict) -> str:
+        if isinstance(route, str):
+            return route
+        router, destinations = route
+        return destinations[router(state)]
+
+    def steps(self, input: dict) -> Iterator[Tuple[str, Optional[dict], dict]]:
+        """Yield (node, update, state) after each node runs"""
+        state: Dict[str, Any] = {}
+        self.apply(state, input)
+        node = self.follow(self.entry, state)
+        for _ in range(self.recursion_limit):
+            if node == END:
+                return
+            update = self.nodes[node](state)
+            self.apply(state, update)
+            yield node, update, state
+            node = self.follow(self.edges[node], state)
+        raise DialogFlowError(f"Dialog flow did not finish within {self.recursion_limit} steps")
+
+    def invoke(self, input: dict, config: Optional[dict] = None) -> dict:
+        state = dict(input)
+        for _, _, state in self.steps(input):
+            pass
+        return state
+
+    async def ainvoke(self, input: dict, config: Optional[dict] = None) -> dict:
+        # Nodes are synchronous; run the turn off the event loop as LangGraph does for sync nodes
+        return await asyncio.to_thread(self.invoke, input, config)
+
+    def stream(self, input: dict, config: Optional[dict] = None, stream_mode: Union[str, List[str]] = "values") -> Iterator[Any]:
+        """Mirror of CompiledGraph.stream for "values" and "updates".
+
+        "messages" (token streaming) is accepted but yields nothing: tokens are
+        only surfaced through LangGraph's callback handler.
+        """
+        modes = [stream_mode] if isinstance(stream_mode, str) else list(stream_mode)
+        tagged = not isinstance(stream_mode, str)
+        if "values" in modes:
+            yield ("values", dict(input)) if tagged else dict(input)
+        for node, update, state in self.steps(input):
+            if "updates" in modes:
+                yield ("updates", {node: update}) if tagged else {node: update}
+            if "values" in modes:
+                yield ("values", dict(state)) if tagged else dict(state)
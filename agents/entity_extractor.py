@@ -1,61 +1,91 @@
-from langchain_openai import ChatOpenAI
+from utils.llm_factory import create_llm
+from utils.prompt_cache_stats import llm_node
 from langchain.prompts import ChatPromptTemplate
 from langchain_core.utils.function_calling import convert_to_openai_function
-from models.schemas import MeetingDetails, EmailDetails
-from typing import Dict
-from datetime import datetime, timedelta
+from models.schemas import MeetingDetails, EmailDetails, IntentType
+from utils.deadline import Deadline
+from helpers.date_context import DateContext
+from helpers.context_compaction import ConversationHistory, serialize_prompt_context
+from config import Config
+from typing import Dict, Optional
+from datetime import timedelta
 import json
 import re
 class EntityExtractorAgent:
-    def __init__(self, api_key: str, model_name: str = "gpt-4o-mini"):
-        self.llm = ChatOpenAI(
-            api_key=api_key,
-            model_name=model_name,
-            temperature=0
-        )
-        
-    def extract_meeting_entities(self, text: str, context: Dict = None) -> MeetingDetails:
-        """Extract meeting details using function calling"""
-        
-        current_date = datetime.now()
+    def __init__(self, api_key: str):
+        # Each extraction step has its own model and limits (Config.LLM_NODES)
+        self.meeting_model = create_llm(api_key, "meeting_extraction")
+        self.email_model = create_llm(api_key, "email_extraction")
+        self.date_llm = create_llm(api_key, "date_parsing")
         
-        extraction_prompt = ChatPromptTemplate.from_messages([
+        # Prompts and function schemas are built once and reused for every call
+        self.meeting_prompt = ChatPromptTemplate.from_messages([
             ("system", """Extract meeting details from the user's message. 
             
-            CURRENT DATE AND TIME: {current_datetime}
-            Day of week: {day_of_week}
-            
-            Parse dates relative to the current date:
-            - "tomorrow" means {tomorrow}
+            Parse dates relative to the current date given below:
+            - "tomorrow" means the day after the current date
             - "next Monday" means the Monday after today
             - "next week" means 7 days from today
             
             Parse times like '3pm', '15:00' into 24-hour format (HH:MM).
-            Extract participant email addresses if mentioned.
+            Extract participant email addresses if mentioned."""),
+            ("system", """CURRENT DATE AND TIME: {current_datetime}
+            Day of week: {day_of_week}
+            Tomorrow: {tomorrow}
+            
+            Previous context: {context}"""),
+            ("user", "{input}")
+        ])
+        
+        self.email_prompt = ChatPromptTemplate.from_messages([
+            ("system", """Extract email details from the user's message.
+            
+            Identify the recipient's email address and the message body.
+            If a subject is mentioned, extract it too.
+            If any date/time references are in the email body, keep them relative to the current date and time given below."""),
+            ("system", """CURRENT DATE AND TIME: {current_datetime}
             
             Previous context: {context}"""),
             ("user", "{input}")
         ])
         
+        self.meeting_llm = self.meeting_model.bind_functions(
+            functions=[convert_to_openai_function(MeetingDetails)],
+            function_call={"name": "MeetingDetails"}
+        )
+        self.email_llm = self.email_model.bind_functions(
+            functions=[convert_to_openai_function(EmailDetails)],
+            function_call={"name": "EmailDetails"}
+        )
+        
+    def extract_meeting_entities(
+        self,
+        text: str,
+        context: Dict = None,
+        deadline: Optional[Deadline] = None,
+        history: Optional[ConversationHistory] = None
+    ) -> MeetingDetails:
+        """Extract meeting details using function calling"""
+        
+        current_date = DateContext.now()
+        
         try:
             # Calculate relative dates
             tomorrow = (current_date + timedelta(days=1)).strftime("%Y-%m-%d")
             
-            # Bind the schema as a function
-            llm_with_tools = self.llm.bind_functions(
-                functions=[convert_to_openai_function(MeetingDetails)],
-                function_call={"name": "MeetingDetails"}
-            )
+            llm_with_tools = self.meeting_llm
+            if deadline:
+                llm_with_tools = deadline.bind_timeout(llm_with_tools)
             
-            chain = extraction_prompt | llm_with_tools
+            chain = self.meeting_prompt | llm_with_tools
             
             result = chain.invoke({
                 "input": text,
-                "context": json.dumps(context) if context else "None",
+                "context": serialize_prompt_context(context, IntentType.SCHEDULE_MEETING, history),
                 "current_datetime": current_date.strftime("%Y-%m-%d %H:%M"),
                 "day_of_week": current_date.strftime("%A"),
                 "tomorrow": tomorrow
-            })
+            }, config=llm_node("meeting_extraction"))
             
             # Parse the function call arguments
             if result.additional_kwargs.get("function_call"):
@@ -63,12 +93,18 @@ class EntityExtractorAgent:
                 
                 # Post-process dates using our parser
                 from utils.datetime_parser import LLMDateTimeParser
-                parser = LLMDateTimeParser(self.llm)
                 
                 # If date field contains relative expression, parse it
                 if args.get("date") and not re.match(r'\d{4}-\d{2}-\d{2}', args["date"]):
-                    parsed = parser.parse(args["date"])
-                    args["date"] = parsed["date"]
+                    if deadline is None:
+                        parsed = LLMDateTimeParser(self.date_llm).parse(args["date"])
+                        args["date"] = parsed["date"]
+                    elif deadline.can_afford(Config.LLM_CALL_ESTIMATE_SECONDS):
+                        parsed = LLMDateTimeParser(deadline.bind_timeout(self.date_llm)).parse(args["date"])
+                        args["date"] = parsed["date"]
+                    else:
+                        # Out of budget: fall back to the rule-based parser
+                        args["date"] = DateContext.parse_relative_date(args["date"]) or args["date"]
                 
                 return MeetingDetails(**args)
         except Exception as e:
@@ -76,37 +112,29 @@ class EntityExtractorAgent:
         
         return MeetingDetails()
     
-    def extract_email_entities(self, text: str, context: Dict = None) -> EmailDetails:
+    def extract_email_entities(
+        self,
+        text: str,
+        context: Dict = None,
+        deadline: Optional[Deadline] = None,
+        history: Optional[ConversationHistory] = None
+    ) -> EmailDetails:
         """Extract email details using function calling"""
         
-        current_date = datetime.now()
-        
-        extraction_prompt = ChatPromptTemplate.from_messages([
-            ("system", """Extract email details from the user's message.
-            
-            CURRENT DATE AND TIME: {current_datetime}
-            
-            Identify the recipient's email address and the message body.
-            If a subject is mentioned, extract it too.
-            If any date/time references are in the email body, keep them relative to {current_datetime}.
-            
-            Previous context: {context}"""),
-            ("user", "{input}")
-        ])
+        current_date = DateContext.now()
         
         try:
-            llm_with_tools = self.llm.bind_functions(
-                functions=[convert_to_openai_function(EmailDetails)],
-                function_call={"name": "EmailDetails"}
-            )
+            llm_with_tools = self.email_llm
+            if deadline:
+                llm_with_tools = deadline.bind_timeout(llm_with_tools)
             
-            chain = extraction_prompt | llm_with_tools
+            chain = self.email_prompt | llm_with_tools
             
             result = chain.invoke({
                 "input": text,
-                "context": json.dumps(context) if context else "None",
+                "context": serialize_prompt_context(context, IntentType.SEND_EMAIL, history),
                 "current_datetime": current_date.strftime("%Y-%m-%d %H:%M")
-            })
+            }, config=llm_node("email_extraction"))
             
             if result.additional_kwargs.get("function_call"):
                 args = json.loads(result.additional_kwargs["function_call"]["arguments"])
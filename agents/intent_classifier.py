@@ -1,55 +1,95 @@
-from langchain_openai import ChatOpenAI
+from utils.llm_factory import create_llm
+from utils.prompt_cache_stats import llm_node
 from langchain.prompts import ChatPromptTemplate
-from langchain.output_parsers import PydanticOutputParser
+from langchain_core.messages import AIMessage
 from models.schemas import IntentClassification, IntentType
-from datetime import datetime
+from utils.deadline import Deadline
+from helpers.date_context import DateContext
+from agents.local_intent_model import IntentLabelLog
+from typing import List, Optional
 import json
 
+# Minimal schema for the forced function call: the intent enum and a confidence, nothing else
+CLASSIFY_FUNCTION = {
+    "name": "classify_intent",
+    "description": "Record the primary action the user wants to take",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "intent": {"type": "string", "enum": [intent.value for intent in IntentType]},
+            "confidence": {"type": "number", "minimum": 0, "maximum": 1}
+        },
+        "required": ["intent", "confidence"]
+    }
+}
+
+
+def parse_classification(message: AIMessage) -> IntentClassification:
+    """Validate the function call arguments; raises instead of guessing when they don't fit the schema"""
+    args = json.loads(message.additional_kwargs["function_call"]["arguments"])
+    return IntentClassification(intent=args["intent"], confidence=args["confidence"])
+
 class IntentClassifierAgent:
-    def __init__(self, api_key: str, model_name: str = "gpt-4o-mini"):
-        self.llm = ChatOpenAI(
-            api_key=api_key,
-            model_name=model_name,
-            temperature=0.1
+    def __init__(self, api_key: str):
+        self.llm = create_llm(api_key, "intent")
+        # The answer is constrained to CLASSIFY_FUNCTION instead of parsed out of free text
+        self.classify_llm = self.llm.bind_functions(
+            functions=[CLASSIFY_FUNCTION],
+            function_call={"name": CLASSIFY_FUNCTION["name"]}
         )
-        
-        # Use structured output with Pydantic
-        self.parser = PydanticOutputParser(pydantic_object=IntentClassification)
+        # LLM labels become training data for the local intent model
+        self.label_log = IntentLabelLog()
         
         self.prompt = ChatPromptTemplate.from_messages([
             ("system", """You are an intent classification expert. 
             
-            Current date and time: {current_datetime}
-            
             Analyze the user's message and classify it into one of these intents:
             
             1. schedule_meeting: User wants to book, schedule, or arrange a meeting/appointment/call
             2. send_email: User wants to send, write, or compose an email
             3. chitchat: General conversation, greetings, or anything else
             
-            Also extract any relevant entities mentioned.
-            
-            {format_instructions}
-            
             Be precise and consider the primary action the user wants to take."""),
+            ("system", "Current date and time: {current_datetime}"),
             ("user", "{input}")
         ])
         
-    def classify(self, user_input: str) -> IntentClassification:
+    def classify(self, user_input: str, deadline: Optional[Deadline] = None) -> Optional[IntentClassification]:
+        """Classify with the LLM; None when the call or its arguments fail, so callers can fall back"""
         try:
-            chain = self.prompt | self.llm | self.parser
+            llm = deadline.bind_timeout(self.classify_llm) if deadline else self.classify_llm
+            chain = self.prompt | llm | parse_classification
             
             result = chain.invoke({
                 "input": user_input,
-                "format_instructions": self.parser.get_format_instructions(),
-                "current_datetime": datetime.now().strftime("%Y-%m-%d %H:%M %A")
-            })
+                "current_datetime": DateContext.now().strftime("%Y-%m-%d %H:%M %A")
+            }, config=llm_node("intent"))
             
+            self.label_log.record(user_input, result)
             return result
         except Exception as e:
-            # Fallback to chitchat if classification fails
-            return IntentClassification(
-                intent=IntentType.CHITCHAT,
-                confidence=0.5,
-                entities={}
-            )
\ No newline at end of file
+            print(f"Intent classification failed: {e}")
+            return None
+    
+    async def aclassify_batch(self, user_inputs: List[str], max_concurrency: int = 8) -> List[Optional[IntentClassification]]:
+        """Classify many messages in one batched call; failed items come back as None"""
+        chain = self.prompt | self.classify_llm | parse_classification
+        current_datetime = DateContext.now().strftime("%Y-%m-%d %H:%M %A")
+        
+        results = await chain.abatch(
+            [
+                {
+                    "input": user_input,
+                    "current_datetime": current_datetime
+                }
+                for user_input in user_inputs
+            ],
+            config={"max_concurrency": max_concurrency, **llm_node("intent")},
+            return_exceptions=True
+        )
+        
+        classifications = [result if isinstance(result, IntentClassification) else None for result in results]
+        for user_input, classification in zip(user_inputs, classifications):
+            if classification is not None:
+                self.label_log.record(user_input, classification)
+        return classifications
\ No newline at end of file
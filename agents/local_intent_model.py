@@ -0,0 +1,285 @@
+"""Local intent classifier: hashed n-gram features with NumPy softmax regression.
+
+Trained from logged IntentClassifierAgent outputs and labelled corpora, saved
+as a small .npz file and loaded at startup. evaluation/corpus.jsonl is the
+held-out evaluation set: training refuses it and drops any example whose
+text appears in it.
+
+Usage:
+    python -m agents.local_intent_model train --log logs/intent_labels.jsonl --corpus data/intent_training.jsonl
+    python -m agents.local_intent_model classify utterances.txt --output predictions.jsonl
+"""
+from models.schemas import IntentClassification, IntentType
+from agents.rule_based import EMAIL_PATTERN, strip_context_prefix
+from config import Config
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+import numpy as np
+import argparse
+import threading
+import json
+import time
+import zlib
+import sys
+import os
+import re
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+DEFAULT_FEATURES = 1 << 14
+REPO_DIR = Path(__file__).resolve().parent.parent
+TRAINING_CORPUS = REPO_DIR / "data" / "intent_training.jsonl"
+# Scored by python -m evaluation.run_eval, so it must never be trained on
+EVALUATION_CORPUS = REPO_DIR / "evaluation" / "corpus.jsonl"
+
+
+def tokenize(text: str) -> List[str]:
+    text = EMAIL_PATTERN.sub(" emailaddr ", strip_context_prefix(text).lower())
+    return [re.sub(r"\d", "0", token) for token in TOKEN_PATTERN.findall(text)]
+
+
+def feature_ids(text: str, n_features: int) -> List[int]:
+    """Hashed unigram and bigram ids (crc32, so they are stable across processes)"""
+    tokens = tokenize(text)
+    grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    return [zlib.crc32(gram.encode()) % n_features for gram in grams] or [0]
+
+
+def featurize(texts: Iterable[str], n_features: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Sparse batch as (row index, feature id) pairs"""
+    rows, cols = [], []
+    for row, text in enumerate(texts):
+        ids = feature_ids(text, n_features)
+        rows.extend([row] * len(ids))
+        cols.extend(ids)
+    return np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    logits = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class LocalIntentModel:
+    """Multinomial logistic regression over hashed n-grams"""
+
+    def __init__(self, weights: np.ndarray, bias: np.ndarray, labels: List[str]):
+        self.weights = weights
+        self.bias = bias
+        self.labels = labels
+        self.n_features = weights.shape[0]
+
+    def logits(self, texts: List[str]) -> np.ndarray:
+        rows, cols = featurize(texts, self.n_features)
+        logits = np.tile(self.bias, (len(texts), 1))
+        np.add.at(logits, rows, self.weights[cols])
+        return logits
+
+    def predict_proba(self, texts: List[str]) -> np.ndarray:
+        return _softmax(self.logits(texts))
+
+    def classify(self, text: str) -> IntentClassification:
+        return self.classify_batch([text])[0]
+
+    def classify_batch(self, texts: List[str]) -> List[IntentClassification]:
+        probs = self.predict_proba(texts)
+        best = probs.argmax(axis=1)
+        return [
+            IntentClassification(intent=IntentType(self.labels[index]), confidence=float(probs[row, index]))
+            for row, index in enumerate(best)
+        ]
+
+    @classmethod
+    def train(
+        cls,
+        texts: List[str],
+        labels: List[str],
+        n_features: int = DEFAULT_FEATURES,
+        epochs: int = 300,
+        learning_rate: float = 0.5,
+        l2: float = 1e-4
+    ) -> "LocalIntentModel":
+        """Full-batch gradient descent on the cross-entropy loss"""
+        classes = [intent.value for intent in IntentType]
+        targets = np.zeros((len(texts), len(classes)), dtype=np.float32)
+        targets[np.arange(len(texts)), [classes.index(label) for label in labels]] = 1.0
+        rows, cols = featurize(texts, n_features)
+
+        weights = np.zeros((n_features, len(classes)), dtype=np.float32)
+        bias = np.zeros(len(classes), dtype=np.float32)
+        for _ in range(epochs):
+            logits = np.tile(bias, (len(texts), 1))
+            np.add.at(logits, rows, weights[cols])
+            error = (_softmax(logits) - targets) / len(texts)
+            grad = np.zeros_like(weights)
+            np.add.at(grad, cols, error[rows])
+            weights -= learning_rate * (grad + l2 * weights)
+            bias -= learning_rate * error.sum(axis=0)
+        return cls(weights, bias, classes)
+
+    def save(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # float16 keeps the file small; inference upcasts on load
+        np.savez_compressed(
+            path,
+            weights=self.weights.astype(np.float16),
+            bias=self.bias.astype(np.float32),
+            labels=np.array(self.labels)
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "LocalIntentModel":
+        with np.load(path) as data:
+            return cls(data["weights"].astype(np.float32), data["bias"], [str(label) for label in data["labels"]])
+
+
+class ReloadingIntentModel:
+    """Loads the model file at startup and again whenever it is replaced on disk"""
+
+    def __init__(self, path: str = Config.LOCAL_INTENT_MODEL_PATH, check_interval: float = 5.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.model: Optional[LocalIntentModel] = None
+        self._mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.reload()
+
+    def reload(self) -> bool:
+        """Load the file if it changed since the last load; True when a new model was loaded"""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except OSError:
+                return False
+            if mtime == self._mtime:
+                return False
+            try:
+                self.model = LocalIntentModel.load(self.path)
+                self._mtime = mtime
+                return True
+            except Exception as e:
+                print(f"Error loading local intent model from {self.path}: {e}")
+                return False
+
+    def classify(self, text: str) -> Optional[IntentClassification]:
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            self.reload()
+        model = self.model
+        return model.classify(text) if model is not None else None
+
+
+class IntentLabelLog:
+    """Appends LLM intent classifications to a JSONL file as training data for the local model"""
+
+    def __init__(self, path: str = Config.INTENT_LOG_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, text: str, classification: IntentClassification):
+        if not self.path:
+            return
+        line = json.dumps({
+            "text": strip_context_prefix(text),
+            "intent": classification.intent.value,
+            "confidence": classification.confidence,
+            "timestamp": datetime.now().isoformat()
+        }, ensure_ascii=False)
+        try:
+            with self._lock:
+                Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+                with open(self.path, "a") as f:
+                    f.write(line + "\n")
+        except OSError as e:
+            print(f"Error writing intent label log: {e}")
+
+
+def load_examples(paths: List[str], min_confidence: float) -> Tuple[List[str], List[str]]:
+    """Read {text, intent[, confidence]} records from JSONL files, skipping low-confidence labels"""
+    texts, labels = [], []
+    for path in paths:
+        with open(path, "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if "text" not in record or "intent" not in record:
+                    continue
+                if record.get("confidence", 1.0) < min_confidence:
+                    continue
+                texts.append(record["text"])
+                labels.append(record["intent"])
+    return texts, labels
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Train or run the local intent model")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    train_parser = subparsers.add_parser("train", help="Train from logged LLM labels and labelled corpora")
+    train_parser.add_argument("--log", nargs="*", default=[], help="Intent label logs written by IntentClassifierAgent")
+    train_parser.add_argument("--corpus", nargs="*", default=[str(TRAINING_CORPUS)],
+                              help="Labelled JSONL corpora with text and intent (default: data/intent_training.jsonl)")
+    train_parser.add_argument("--min-confidence", type=float, default=0.7, help="Skip logged labels below this confidence")
+    train_parser.add_argument("--features", type=int, default=DEFAULT_FEATURES)
+    train_parser.add_argument("--epochs", type=int, default=300)
+    train_parser.add_argument("--output", default=Config.LOCAL_INTENT_MODEL_PATH)
+
+    classify_parser = subparsers.add_parser("classify", help="Classify a file of utterances (one per line) in batches")
+    classify_parser.add_argument("input")
+    classify_parser.add_argument("--model", default=Config.LOCAL_INTENT_MODEL_PATH)
+    classify_parser.add_argument("--output", help="JSONL predictions (default: stdout)")
+    classify_parser.add_argument("--batch-size", type=int, default=4096)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "train":
+        if any(Path(path).resolve() == EVALUATION_CORPUS for path in args.log + args.corpus):
+            parser.error(f"{EVALUATION_CORPUS.relative_to(REPO_DIR)} is the evaluation set; train on "
+                         f"{TRAINING_CORPUS.relative_to(REPO_DIR)} and/or logged labels instead")
+        texts, labels = load_examples(args.log, args.min_confidence)
+        corpus_texts, corpus_labels = load_examples(args.corpus, 0.0)
+        texts, labels = texts + corpus_texts, labels + corpus_labels
+        if EVALUATION_CORPUS.exists():
+            # Logged labels can include the evaluation utterances; hold them out
+            held_out = {" ".join(text.lower().split()) for text in load_examples([str(EVALUATION_CORPUS)], 0.0)[0]}
+            kept = [(text, label) for text, label in zip(texts, labels) if " ".join(text.lower().split()) not in held_out]
+            if len(kept) < len(texts):
+                print(f"Skipped {len(texts) - len(kept)} examples that are in the evaluation set")
+            texts, labels = [text for text, _ in kept], [label for _, label in kept]
+        if not texts:
+            parser.error("no training examples; pass --log and/or --corpus")
+        started = time.perf_counter()
+        model = LocalIntentModel.train(texts, labels, n_features=args.features, epochs=args.epochs)
+        predictions = [result.intent.value for result in model.classify_batch(texts)]
+        accuracy = sum(p == label for p, label in zip(predictions, labels)) / len(labels)
+        model.save(args.output)
+        print(f"Trained on {len(texts)} examples in {time.perf_counter() - started:.1f}s, "
+              f"training accuracy {accuracy:.3f}, saved to {args.output}")
+        return 0
+
+    model = LocalIntentModel.load(args.model)
+    with open(args.input, "r") as f:
+        utterances = [line.rstrip("\n") for line in f if line.strip()]
+    out = open(args.output, "w") if args.output else sys.stdout
+    started = time.perf_counter()
+    try:
+        for start in range(0, len(utterances), args.batch_size):
+            batch = utterances[start:start + args.batch_size]
+            probs = model.predict_proba(batch)
+            for text, row in zip(batch, probs):
+                index = int(row.argmax())
+                out.write(json.dumps({"text": text, "intent": model.labels[index], "confidence": round(float(row[index]), 4)}) + "\n")
+    finally:
+        if args.output:
+            out.close()
+    elapsed = time.perf_counter() - started
+    print(f"Classified {len(utterances)} utterances in {elapsed:.2f}s "
+          f"({elapsed / max(len(utterances), 1) * 1e6:.1f} us each)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+from models.schemas import IntentType
+from helpers.context_compaction import INTENT_FIELDS
+from agents.rule_based import strip_context_prefix
+from typing import Dict, List, Optional, Tuple
+import threading
+import re
+
+# What each supported intent is called in help text, with an example request
+CAPABILITIES = {
+    IntentType.SCHEDULE_MEETING: ("schedule meetings", "Book a meeting with sara@example.com tomorrow at 3pm"),
+    IntentType.SEND_EMAIL: ("send emails", "Email bob@example.com saying the report is ready"),
+}
+
+
+def capability_help() -> str:
+    """Describe what the assistant can do, built from the intents it supports"""
+    lines = ["I can help you:"]
+    for intent in IntentType:
+        if intent == IntentType.CHITCHAT:
+            continue
+        action, example = CAPABILITIES.get(intent, (intent.value.replace("_", " "), None))
+        fields = ", ".join(INTENT_FIELDS.get(intent, []))
+        line = f"- {action[0].upper()}{action[1:]}"
+        if fields:
+            line += f" ({fields})"
+        if example:
+            line += f', e.g. "{example}"'
+        lines.append(line)
+    lines.append("Just tell me what you need and I'll ask for anything that's missing.")
+    return "\n".join(lines)
+
+
+# Checked in order against short routine messages; anything else goes to the LLM
+CHITCHAT_PATTERNS: List[Tuple[str, re.Pattern, int]] = [
+    ("help", re.compile(r"\b(what can you do|what do you do|what can you help|how can you help|who are you|what are you|how does this work|help me|^help)\b"), 12),
+    ("how_are_you", re.compile(r"\b(how are you|how's it going|how are things|how are you doing)\b"), 8),
+    ("thanks", re.compile(r"\b(thanks|thank you|thx|cheers|appreciate it)\b"), 6),
+    ("goodbye", re.compile(r"^(bye|goodbye|see you|see ya|good night|that's all|that is all|i'm done)\b"), 5),
+    ("greeting", re.compile(r"^(hi|hello|hey|hiya|howdy|good (morning|afternoon|evening))\b"), 4),
+]
+
+CHITCHAT_RESPONSES: Dict[str, List[str]] = {
+    "help": [capability_help()],
+    "how_are_you": [
+        "I'm doing well, thanks for asking! Would you like to schedule a meeting or send an email?",
+        "All good here! What can I do for you - a meeting or an email?",
+    ],
+    "thanks": [
+        "You're welcome! Anything else I can help with?",
+        "Happy to help! Let me know if you need anything else.",
+    ],
+    "goodbye": [
+        "Goodbye! Come back any time you need a meeting booked or an email sent.",
+        "See you later! Have a great day.",
+    ],
+    "greeting": [
+        "Hello! I can schedule meetings and send emails for you. What would you like to do?",
+        "Hi there! Would you like to book a meeting or send an email?",
+    ],
+}
+
+
+class LocalChitchatResponder:
+    """Answers routine chitchat from a pattern table so it costs no LLM call"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.by_category: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def category(self, message: str) -> Optional[str]:
+        """The routine chitchat category of a message, or None; not counted in the hit rate"""
+        text = re.sub(r"[^\w\s']", " ", strip_context_prefix(message).lower()).strip()
+        words = len(text.split())
+        for category, pattern, max_words in CHITCHAT_PATTERNS:
+            if words <= max_words and pattern.search(text):
+                return category
+        return None
+
+    def respond(self, message: str, variant: int = 0) -> Optional[str]:
+        """Canned reply for routine chitchat, or None when the message needs the LLM"""
+        category = self.category(message)
+        with self._lock:
+            if category is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.by_category[category] = self.by_category.get(category, 0) + 1
+        responses = CHITCHAT_RESPONSES[category]
+        return responses[variant % len(responses)]
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hit_rate(), 3),
+                "by_category": dict(self.by_category)
+            }
+
+
+# Shared so /health reports one hit rate for the process
+local_chitchat = LocalChitchatResponder()
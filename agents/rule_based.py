@@ -0,0 +1,143 @@
+from models.schemas import IntentClassification, IntentType, MeetingDetails, EmailDetails
+from helpers.date_context import DateContext
+from typing import Dict, Optional
+import re
+
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+ISO_DATE_PATTERN = re.compile(r"\b(\d{4}-\d{2}-\d{2})\b")
+RELATIVE_DATE_PATTERN = re.compile(
+    r"\b((?:next\s+|this\s+)?(?:monday|tuesday|wednesday|thursday|friday|saturday|sunday)"
+    r"|today|tomorrow|next\s+week|next\s+month)\b"
+)
+# Times are anchored on the left so "10.30am" is never read from its "30am"
+TIME_12H_PATTERN = re.compile(r"(?<![\w.:])(1[0-2]|0?[1-9])(?:[:.]([0-5]\d))?\s*([ap])\.?m\b")
+TIME_24H_PATTERN = re.compile(r"(?<![\w.:])([01]?\d|2[0-3]):([0-5]\d)\b")
+RELATIVE_TIME_PATTERN = re.compile(r"\bin\s+\d+\s*(?:hours?|minutes?)\b")
+# Replies that abandon a half-filled request
+CANCEL_PATTERN = re.compile(r"^(?:cancel|never ?mind|forget (?:about )?it|stop|abort|that's all|that is all|no thanks)\b")
+# Front ends prepend "[Current date: ...]" to messages; it must not be read as user input
+CONTEXT_PREFIX_PATTERN = re.compile(r"^\s*\[[^\]]*\]\s*")
+
+MEETING_KEYWORDS = ["meeting", "schedule", "book", "appointment", "call with", "set up a call", "calendar"]
+EMAIL_KEYWORDS = ["email", "e-mail", "mail to", "write to", "send a message", "send a note"]
+
+YES_WORDS = {"yes", "yeah", "yep", "yup", "sure", "ok", "okay", "confirm", "confirmed", "correct", "go ahead", "do it", "please do"}
+NO_WORDS = {"no", "nope", "nah", "cancel", "stop", "don't", "dont", "nevermind", "never mind", "abort"}
+# Longer replies to a confirmation question usually qualify the answer
+MAX_CONFIRMATION_WORDS = 4
+
+
+def strip_context_prefix(text: str) -> str:
+    return CONTEXT_PREFIX_PATTERN.sub("", text, count=1)
+
+
+def is_cancel(message: str) -> bool:
+    text = re.sub(r"[^\w\s']", " ", strip_context_prefix(message).lower()).strip()
+    return len(text.split()) <= 5 and bool(CANCEL_PATTERN.match(text))
+
+
+def extract_date(text: str) -> Optional[str]:
+    """Find a date in free text and return it as YYYY-MM-DD"""
+    text_lower = text.lower()
+    match = ISO_DATE_PATTERN.search(text_lower)
+    if match:
+        return match.group(1)
+    match = RELATIVE_DATE_PATTERN.search(text_lower)
+    if match:
+        return DateContext.parse_relative_date(match.group(1))
+    return None
+
+
+def extract_time(text: str) -> Optional[str]:
+    """Find a time in free text and return it as HH:MM"""
+    text_lower = text.lower()
+    match = TIME_12H_PATTERN.search(text_lower)
+    if match:
+        hour = int(match.group(1)) % 12
+        if match.group(3) == "p":
+            hour += 12
+        return f"{hour:02d}:{match.group(2) or '00'}"
+    match = TIME_24H_PATTERN.search(text_lower)
+    if match:
+        return f"{int(match.group(1)):02d}:{match.group(2)}"
+    if "noon" in text_lower:
+        return "12:00"
+    if "midnight" in text_lower:
+        return "00:00"
+    match = RELATIVE_TIME_PATTERN.search(text_lower)
+    if match:
+        return DateContext.parse_relative_time(match.group())
+    return None
+
+
+def extract_emails(text: str) -> list:
+    return EMAIL_PATTERN.findall(text)
+
+
+def detect_confirmation(message: str) -> str:
+    """Classify a reply to a confirmation question as YES, NO or UNCLEAR.
+
+    Only short replies with yes words or no words (not both) are decided here;
+    "Sure, no problem" or a longer reply is UNCLEAR and left to the LLM.
+    """
+    message_lower = re.sub(r"[^\w\s']", " ", message.lower()).strip()
+    words = message_lower.split()
+    if len(words) > MAX_CONFIRMATION_WORDS:
+        return "UNCLEAR"
+    word_set = set(words)
+    said_no = any(phrase in message_lower for phrase in NO_WORDS if " " in phrase) or bool(word_set & NO_WORDS)
+    said_yes = any(phrase in message_lower for phrase in YES_WORDS if " " in phrase) or bool(word_set & YES_WORDS)
+    if said_no and not said_yes:
+        return "NO"
+    if said_yes and not said_no:
+        return "YES"
+    return "UNCLEAR"
+
+
+class RuleBasedIntentClassifier:
+    """Deterministic keyword classifier used when the LLM is unavailable"""
+
+    def classify(self, user_input: str) -> IntentClassification:
+        text_lower = strip_context_prefix(user_input).lower()
+        if any(keyword in text_lower for keyword in EMAIL_KEYWORDS):
+            return IntentClassification(intent=IntentType.SEND_EMAIL, confidence=0.6)
+        if any(keyword in text_lower for keyword in MEETING_KEYWORDS):
+            return IntentClassification(intent=IntentType.SCHEDULE_MEETING, confidence=0.6)
+        return IntentClassification(intent=IntentType.CHITCHAT, confidence=0.5)
+
+
+class RuleBasedEntityExtractor:
+    """Regex extraction of emails, dates and times, merged over previously known entities"""
+
+    TITLE_PATTERN = re.compile(r"\b(?:about|for|titled|called|regarding)\s+(?:the\s+)?(.+?)(?:\s+(?:on|at|with|tomorrow|today|next)\b|[.?!]|$)", re.IGNORECASE)
+    BODY_PATTERN = re.compile(r"\b(?:saying|that says|to say|telling (?:him|her|them))\s+(.+)$", re.IGNORECASE)
+    SUBJECT_PATTERN = re.compile(r"\b(?:about|regarding|subject)\s+(.+?)(?:\s+saying\b|[.?!]|$)", re.IGNORECASE)
+
+    def extract_meeting_entities(self, text: str, context: Dict = None) -> MeetingDetails:
+        text = strip_context_prefix(text)
+        entities = {k: v for k, v in (context or {}).items() if k in MeetingDetails.__fields__}
+        participants = extract_emails(text)
+        found = {
+            "date": extract_date(text),
+            "time": extract_time(text),
+            "participants": participants or None
+        }
+        title_match = self.TITLE_PATTERN.search(text)
+        if title_match:
+            found["title"] = title_match.group(1).strip()
+        entities.update({k: v for k, v in found.items() if v})
+        return MeetingDetails(**entities)
+
+    def extract_email_entities(self, text: str, context: Dict = None) -> EmailDetails:
+        text = strip_context_prefix(text)
+        entities = {k: v for k, v in (context or {}).items() if k in EmailDetails.__fields__}
+        recipients = extract_emails(text)
+        found = {"recipient": recipients[0] if recipients else None}
+        body_match = self.BODY_PATTERN.search(text)
+        if body_match:
+            found["body"] = body_match.group(1).strip()
+        subject_match = self.SUBJECT_PATTERN.search(text)
+        if subject_match:
+            found["subject"] = subject_match.group(1).strip()
+        entities.update({k: v for k, v in found.items() if v})
+        return EmailDetails(**entities)
@@ -1,20 +1,28 @@
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, WebSocket, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Dict, Optional
 import uvicorn
-import json
-import uuid
+import asyncio
+import threading
+import time
 from datetime import datetime
 
 # Import your existing modules
-from agents.intent_classifier import IntentClassifierAgent
-from agents.entity_extractor import EntityExtractorAgent
-from agents.dialog_agent import DialogAgent
-from chains.confirmation_chain import ConfirmationChain
-from chains.correction_chain import CorrectionChain
-from executors.action_executor import ActionExecutor
-from state.conversation_state import ConversationContext
+# (LangChain/LangGraph-backed components are imported lazily in Components)
+from state.session_record import SessionRecord
+from models.schemas import IntentType, IntentClassification
+from utils.deadline import Deadline
+from helpers.date_context import DateContext
+from utils.llm_factory import llm_circuit_breaker, prompt_cache_stats
+from agents.local_responder import local_chitchat
+from helpers.context_compaction import ConversationHistory, HistorySummarizer
+from utils.serialization import MSGPACK_SUBPROTOCOL, dumps_json, fast_json_enabled, json_response, negotiate_subprotocol
+from utils.ws_pipeline import ConnectionHub, FrameCodec, PipelinedConnection
+from utils.profiling import profile_mode, run_profiled
+from utils.tracing import SPAN_KIND_SERVER, span
 from config import Config
 
 app = FastAPI(title="AI Assistant API", version="1.0.0")
@@ -30,13 +38,66 @@ app.add_middleware(
 
 # Initialize components
 config = Config()
-dialog_agent = DialogAgent(config.OPENAI_API_KEY)
-executor = ActionExecutor(config.OUTBOX_PATH)
-confirmation_chain = ConfirmationChain(dialog_agent.llm)
-correction_chain = CorrectionChain(dialog_agent.llm)
+
+class Components:
+    """Heavy components, built once by warm_up() (or by the first request) instead of at import time"""
+    
+    def __init__(self, config: Config):
+        from agents.dialog_agent import DialogAgent
+        from chains.confirmation_chain import ConfirmationChain
+        from chains.correction_chain import CorrectionChain
+        from executors.action_executor import ActionExecutor
+        
+        # Chat models are built against the recording/replay cassette when LLM_CASSETTE_MODE is set;
+        # turns are added to it while recording
+        self.turn_recorder = None
+        if config.LLM_CASSETTE_MODE in ("record", "replay"):
+            from utils.llm_cassette import use_configured_cassette
+            cassette = use_configured_cassette()
+            if config.LLM_CASSETTE_MODE == "record":
+                self.turn_recorder = cassette
+        self.dialog_agent = DialogAgent(config.OPENAI_API_KEY)
+        self.executor = ActionExecutor(config.OUTBOX_PATH)
+        self.confirmation_chain = ConfirmationChain(self.dialog_agent.node_llm("confirmation"))
+        self.correction_chain = CorrectionChain(self.dialog_agent.node_llm("correction"))
+        self.history_summarizer = HistorySummarizer(self.dialog_agent.node_llm("history_summary"), lambda: llm_circuit_breaker.is_closed)
+
+_components: Optional[Components] = None
+_components_lock = threading.Lock()
+warmup_status = {"ready": False, "seconds": None, "error": None}
+
+def get_components() -> Components:
+    global _components
+    if _components is None:
+        with _components_lock:
+            if _components is None:
+                _components = Components(config)
+    return _components
+
+def warm_up():
+    """Build components, compile the graph and prompts, load tokenizers and open the LLM connection"""
+    started = time.monotonic()
+    try:
+        get_components().dialog_agent.warm_up()
+        warmup_status["seconds"] = round(time.monotonic() - started, 3)
+        warmup_status["ready"] = True
+        print(f"Warm-up finished in {warmup_status['seconds']}s")
+    except Exception as e:
+        warmup_status["error"] = str(e)
+        print(f"Warm-up failed: {e}")
 
 # Store session states
-session_states = {}
+session_states: Dict[str, SessionRecord] = {}
+
+# Turns run in worker threads; a fixed set of striped locks keeps each session's turns in order
+_session_locks = [asyncio.Lock() for _ in range(64)]
+
+def session_lock(session_id: str) -> asyncio.Lock:
+    return _session_locks[hash(session_id) % len(_session_locks)]
+
+def with_date_context(message: str) -> str:
+    current_date = DateContext.now()
+    return f"[Current date: {current_date.strftime('%Y-%m-%d %H:%M %A')}]\n{message}"
 
 # Request/Response Models
 class ChatRequest(BaseModel):
@@ -51,6 +112,14 @@ class ChatResponse(BaseModel):
     action_result: Optional[Dict] = None
     requires_confirmation: bool = False
     suggestions: List[str] = []
+    degraded: bool = False
+
+class BatchChatItem(BaseModel):
+    session_id: str
+    message: str
+
+class BatchChatRequest(BaseModel):
+    items: List[BatchChatItem]
 
 class SessionInfo(BaseModel):
     session_id: str
@@ -72,46 +141,87 @@ async def root():
         "version": "1.0.0"
     }
 
+@app.on_event("startup")
+async def start_warm_up():
+    # Run in the background so the server accepts liveness checks while warming up
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
 @app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
-    """Main chat endpoint"""
+async def chat(
+    request: ChatRequest,
+    x_request_budget_ms: Optional[str] = Header(None),
+    x_profile: Optional[str] = Header(None)
+):
+    """Main chat endpoint; "X-Profile: 1" (or "trace") writes a profile of the turn to PROFILE_DIR"""
+    deadline = Deadline.from_header(x_request_budget_ms, config.REQUEST_BUDGET_SECONDS)
+    response = await process_chat(request, deadline, profile=profile_mode(x_profile))
+    if fast_json_enabled():
+        # Returning a Response skips FastAPI's re-validation and jsonable_encoder pass
+        return json_response(response.dict())
+    return response
+
+async def process_chat(
+    request: ChatRequest,
+    deadline: Deadline,
+    classification: Optional[IntentClassification] = None,
+    profile: Optional[str] = None,
+    transport: str = "http"
+) -> ChatResponse:
+    """Run one turn within the given latency budget without blocking the event loop"""
+    # The turn's root span; the worker thread inherits it as the current span
+    with span("turn", SPAN_KIND_SERVER, {"session.id": request.session_id, "transport": transport}):
+        async with session_lock(request.session_id):
+            # Profiled inside the worker thread, where the whole turn runs
+            return await run_in_threadpool(
+                run_profiled, profile, request.session_id, "chat", run_turn, request, deadline, classification
+            )
+
+def run_turn(
+    request: ChatRequest,
+    deadline: Deadline,
+    classification: Optional[IntentClassification] = None
+) -> ChatResponse:
+    """Run one turn through the dialog graph"""
     try:
+        components = get_components()
+        
         # Get or create session state
         if request.session_id not in session_states:
-            session_states[request.session_id] = {
-                "context": ConversationContext(),
-                "awaiting_confirmation": False,
-                "extracted_entities": {},
-                "last_intent": None,
-                "history": [],
-                "created_at": datetime.now().isoformat(),
-                "message_count": 0
-            }
+            session_states[request.session_id] = SessionRecord(
+                ConversationHistory(summarizer=components.history_summarizer)
+            )
         
         session = session_states[request.session_id]
-        session["message_count"] += 1
+        session.message_count += 1
         
         # Add current date context
-        current_date = datetime.now()
-        enhanced_message = f"[Current date: {current_date.strftime('%Y-%m-%d %H:%M %A')}]\n{request.message}"
+        enhanced_message = with_date_context(request.message)
         
         # Process message through dialog agent
-        result = dialog_agent.graph.invoke({
+        result = components.dialog_agent.graph.invoke({
             "messages": [enhanced_message],
-            "context": session["context"].to_dict()
+            "context": session.context,
+            "extracted_entities": session.extracted_entities,
+            "current_intent": session.last_intent if session.pending_slots else None,
+            "missing_fields": [],
+            "awaiting_confirmation": False,
+            "confirmation_message": "",
+            "final_response": "",
+            "deadline": deadline,
+            "degraded": False,
+            "history": session.history,
+            "session_id": request.session_id,
+            "precomputed_intent": classification,
+            "pending_slots": session.pending_slots
         })
         
         # Extract response
-        response_text = result["messages"][-1]
-        if hasattr(response_text, 'content'):
-            response_text = response_text.content
+        response_text = result.get("final_response", "")
         
         # Update session
-        session["history"].append({
-            "user": request.message,
-            "bot": response_text,
-            "timestamp": datetime.now().isoformat()
-        })
+        session.history.add_turn(request.message, response_text)
+        if components.turn_recorder is not None:
+            components.turn_recorder.record_turn(request.session_id, "api", response_text, message=request.message)
         
         # Determine current state
         state = "idle"
@@ -120,20 +230,16 @@ async def chat(request: ChatRequest):
         suggestions = []
         
         # Check if awaiting confirmation
-        if session["awaiting_confirmation"]:
+        if session.awaiting_confirmation:
             state = "awaiting_confirmation"
             requires_confirmation = True
             suggestions = ["Yes, confirm", "No, cancel", "Let me change something"]
         
-        # Check for intent and entities
-        intent_result = dialog_agent.intent_classifier.classify(request.message)
-        entities = {}
+        # Intent and entities come from the graph run so the turn stays within its budget
+        intent = result.get("current_intent") or IntentType.CHITCHAT
+        entities = result.get("extracted_entities") or {}
         
-        if intent_result.intent.value == "schedule_meeting":
-            entities = dialog_agent.entity_extractor.extract_meeting_entities(
-                request.message, 
-                session["context"].to_dict()
-            ).dict()
+        if intent == IntentType.SCHEDULE_MEETING:
             state = "gathering_meeting_info"
             
             # Check if we have all required info
@@ -141,21 +247,22 @@ async def chat(request: ChatRequest):
                 state = "ready_to_confirm"
                 requires_confirmation = True
                 
-        elif intent_result.intent.value == "send_email":
-            entities = dialog_agent.entity_extractor.extract_email_entities(
-                request.message,
-                session["context"].to_dict()
-            ).dict()
+        elif intent == IntentType.SEND_EMAIL:
             state = "gathering_email_info"
             
             if entities.get("recipient") and entities.get("body"):
                 state = "ready_to_confirm"
                 requires_confirmation = True
         
-        # Store extracted entities
-        if entities:
-            session["extracted_entities"].update(entities)
-            session["last_intent"] = intent_result.intent.value
+        # Store extracted entities; a cancelled form drops the ones gathered so far
+        if result.get("slot_fill_result") == "cancelled":
+            session.extracted_entities = {}
+        elif entities:
+            session.extracted_entities.update(entities)
+        if intent != IntentType.CHITCHAT:
+            session.last_intent = intent
+        # Remember which fields were asked for so the reply can be slot-filled
+        session.pending_slots = result.get("missing_fields") or None if intent != IntentType.CHITCHAT else None
         
         # Generate suggestions based on state
         if state == "gathering_meeting_info":
@@ -180,17 +287,100 @@ async def chat(request: ChatRequest):
         
         return ChatResponse(
             response=response_text,
-            intent=intent_result.intent.value,
-            entities=session["extracted_entities"],
+            intent=intent.value,
+            entities=session.extracted_entities,
             state=state,
             action_result=action_result,
             requires_confirmation=requires_confirmation,
-            suggestions=suggestions
+            suggestions=suggestions,
+            degraded=result.get("degraded", False)
         )
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/chat/batch")
+async def chat_batch(batch: BatchChatRequest, x_request_budget_ms: Optional[str] = Header(None)):
+    """Replay queued messages for many sessions at once.
+    
+    Sessions run concurrently, each session's messages run in order, and results
+    are streamed back as NDJSON lines (tagged with the item index) as they finish.
+    """
+    if len(batch.items) > config.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {config.BATCH_MAX_ITEMS} items per batch")
+    
+    components = get_components()
+    agent = components.dialog_agent
+    
+    items_by_session: Dict[str, List[int]] = {}
+    for index, item in enumerate(batch.items):
+        items_by_session.setdefault(item.session_id, []).append(index)
+    
+    # Only each session's first item is classified up front: later ones may turn out to be replies to a
+    # missing-field question, and the first is one when the session has pending slots. Items the local
+    # model or the intent cache can classify are left to their turn; the rest go to the LLM in one batch.
+    needs_llm = [
+        indices[0] for session_id, indices in items_by_session.items()
+        if not (session_id in session_states and session_states[session_id].pending_slots)
+        and not agent.classifies_locally(batch.items[indices[0]].message)
+    ]
+    classifications: List[Optional[IntentClassification]] = [None] * len(batch.items)
+    
+    async def classify_rest():
+        if not needs_llm or not llm_circuit_breaker.is_closed:
+            return
+        try:
+            with span("batch.classify", SPAN_KIND_SERVER, {"batch.items": len(needs_llm)}):
+                results = await agent.intent_classifier.aclassify_batch(
+                    [with_date_context(batch.items[index].message) for index in needs_llm],
+                    max_concurrency=config.BATCH_MAX_CONCURRENCY
+                )
+        except Exception as e:
+            # Each turn then classifies its own message
+            print(f"Batch classification failed: {e}")
+            return
+        for index, classification in zip(needs_llm, results):
+            classifications[index] = classification
+    
+    # Items that need no LLM classification start (and stream back) without waiting for it
+    classified = asyncio.create_task(classify_rest())
+    waits_for_classification = set(needs_llm)
+    
+    results: asyncio.Queue = asyncio.Queue()
+    turn_slots = asyncio.Semaphore(config.BATCH_MAX_CONCURRENCY)
+    
+    async def run_session(indices: List[int]):
+        for index in indices:
+            item = batch.items[index]
+            try:
+                if index in waits_for_classification:
+                    await classified
+                async with turn_slots:
+                    # Each item's budget starts when it gets a slot, not while it queues for one
+                    response = await process_chat(
+                        ChatRequest(message=item.message, session_id=item.session_id),
+                        Deadline.from_header(x_request_budget_ms, config.REQUEST_BUDGET_SECONDS),
+                        classifications[index],
+                        transport="batch"
+                    )
+                line = {"index": index, "session_id": item.session_id, "ok": True, "response": response.dict()}
+            except HTTPException as e:
+                line = {"index": index, "session_id": item.session_id, "ok": False, "error": e.detail}
+            await results.put(line)
+    
+    tasks = [asyncio.create_task(run_session(indices)) for indices in items_by_session.values()]
+    
+    async def stream_results():
+        try:
+            for _ in range(len(batch.items)):
+                yield dumps_json(await results.get()) + "\n"
+        finally:
+            classified.cancel()
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
 @app.post("/confirm-action")
 async def confirm_action(confirmation: ActionConfirmation):
     """Confirm or cancel a pending action"""
@@ -199,25 +389,30 @@ async def confirm_action(confirmation: ActionConfirmation):
             raise HTTPException(status_code=404, detail="Session not found")
         
         session = session_states[confirmation.session_id]
+        components = get_components()
+        executor = components.executor
         
-        if not session.get("awaiting_confirmation"):
+        if not session.awaiting_confirmation:
             return {"message": "No action pending confirmation"}
         
         if confirmation.confirmed:
             # Execute the action
-            intent = session["last_intent"]
-            entities = session["extracted_entities"]
+            intent = session.last_intent
+            entities = session.extracted_entities
             
-            if intent == "schedule_meeting":
-                result = executor.execute_meeting(entities)
-            elif intent == "send_email":
-                result = executor.execute_email(entities)
-            else:
-                result = {"status": "error", "message": "Unknown intent"}
+            with span("confirm_action", SPAN_KIND_SERVER, {"session.id": confirmation.session_id, "transport": "http"}):
+                if intent == "schedule_meeting":
+                    result = executor.execute_meeting(entities)
+                elif intent == "send_email":
+                    result = executor.execute_email(entities)
+                else:
+                    result = {"status": "error", "message": "Unknown intent"}
             
             # Clear confirmation state
-            session["awaiting_confirmation"] = False
-            session["extracted_entities"] = {}
+            session.awaiting_confirmation = False
+            session.extracted_entities = {}
+            if components.turn_recorder is not None:
+                components.turn_recorder.record_turn(confirmation.session_id, "api", "Action executed successfully", confirmed=True)
             
             return {
                 "message": "Action executed successfully",
@@ -225,7 +420,9 @@ async def confirm_action(confirmation: ActionConfirmation):
             }
         else:
             # Cancel the action
-            session["awaiting_confirmation"] = False
+            session.awaiting_confirmation = False
+            if components.turn_recorder is not None:
+                components.turn_recorder.record_turn(confirmation.session_id, "api", "Action cancelled", confirmed=False)
             return {"message": "Action cancelled"}
             
     except Exception as e:
@@ -240,10 +437,10 @@ async def get_session(session_id: str):
     session = session_states[session_id]
     return SessionInfo(
         session_id=session_id,
-        created_at=session.get("created_at", ""),
-        message_count=session.get("message_count", 0),
-        last_intent=session.get("last_intent"),
-        state="awaiting_confirmation" if session.get("awaiting_confirmation") else "idle"
+        created_at=session.created_at_iso,
+        message_count=session.message_count,
+        last_intent=session.last_intent.value if session.last_intent else None,
+        state="awaiting_confirmation" if session.awaiting_confirmation else "idle"
     )
 
 @app.delete("/session/{session_id}")
@@ -253,28 +450,55 @@ async def clear_session(session_id: str):
         del session_states[session_id]
     return {"message": "Session cleared"}
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: only green once warm-up has finished"""
+    if not warmup_status["ready"]:
+        return JSONResponse(status_code=503, content={"status": "warming_up", **warmup_status})
+    return {"status": "ready", **warmup_status}
+
+def semantic_cache_status() -> Optional[dict]:
+    # Reported once the agents exist; /health must not trigger building them
+    if _components is None:
+        return None
+    agent = _components.dialog_agent
+    if agent.intent_cache is None:
+        return None
+    return {"intent": agent.intent_cache.status(), "chitchat": agent.chitchat_cache.status()}
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
-        "active_sessions": len(session_states)
+        "active_sessions": len(session_states),
+        "llm_circuit": llm_circuit_breaker.status(),
+        "local_chitchat": local_chitchat.status(),
+        "semantic_cache": semantic_cache_status(),
+        "websockets": ws_hub.status(),
+        "prompt_cache": prompt_cache_stats.status()
     }
 
 # WebSocket for real-time chat (optional but nice to have)
+# Shared heartbeat for every WebSocket connection in this worker
+ws_hub = ConnectionHub()
+
 @app.websocket("/ws/{session_id}")
 async def websocket_endpoint(websocket: WebSocket, session_id: str):
-    await websocket.accept()
-    try:
-        while True:
-            data = await websocket.receive_text()
-            # Process message
-            request = ChatRequest(message=data, session_id=session_id)
-            response = await chat(request)
-            await websocket.send_json(response.dict())
-    except WebSocketDisconnect:
-        print(f"Client {session_id} disconnected")
+    """Pipelined chat: see utils/ws_pipeline.py for the frame protocol"""
+    # Clients offering the "msgpack" subprotocol get binary msgpack frames instead of JSON text
+    subprotocol = negotiate_subprotocol(websocket.scope.get("subprotocols", []))
+    await websocket.accept(subprotocol=subprotocol)
+    
+    async def handle(message: str) -> dict:
+        request = ChatRequest(message=message, session_id=session_id)
+        response = await process_chat(request, Deadline(config.REQUEST_BUDGET_SECONDS), transport="websocket")
+        return response.dict()
+    
+    connection = PipelinedConnection(websocket, FrameCodec(subprotocol == MSGPACK_SUBPROTOCOL), handle, ws_hub)
+    await connection.run()
+    print(f"Client {session_id} disconnected")
 
 if __name__ == "__main__":
     uvicorn.run(
@@ -0,0 +1,91 @@
+"""Compare per-turn orchestration overhead of the LangGraph graph and the direct executor.
+
+Turns run on the rule-only path (a zero budget keeps every node off the LLM),
+which is where orchestration is the largest share of a turn. The "replayed"
+rows swap each node for its recorded update, leaving routing and state
+handling as the only work.
+
+Run from the repository root:
+    python -m benchmarks.dialog_executor --iterations 2000
+"""
+import argparse
+import os
+import time
+
+from agents.dialog_agent import DialogAgent
+from models.schemas import ConversationContext
+from utils.deadline import Deadline
+
+MESSAGES = [
+    "Book a meeting with sara@example.com tomorrow at 3pm about project sync",
+    "Send an email to bob@example.com",
+    "Hello!",
+    "Tell me something interesting",
+]
+
+
+def turn_input(message: str) -> dict:
+    return {
+        "messages": [message],
+        "context": ConversationContext(),
+        "extracted_entities": {},
+        "current_intent": None,
+        "missing_fields": [],
+        "awaiting_confirmation": False,
+        "confirmation_message": "",
+        "final_response": "",
+        "deadline": Deadline(0),
+        "degraded": False,
+        "history": None,
+        "pending_slots": None
+    }
+
+
+def replayed_flow(agent: DialogAgent):
+    """The agent's flow with every node returning the update it produced for MESSAGES"""
+    nodes, entry, edges = agent.dialog_flow()
+    executor = agent.build_executor()
+    updates = {}
+    for message in MESSAGES:
+        for node, update, _ in executor.steps(turn_input(message)):
+            updates.setdefault(node, {})[message] = update
+    replayed = {
+        name: (lambda state, recorded=updates.get(name, {}): recorded.get(state["messages"][0]))
+        for name in nodes
+    }
+    return replayed, entry, edges
+
+
+def time_turns(runner, iterations: int) -> float:
+    """Mean microseconds per turn over MESSAGES"""
+    inputs = [turn_input(message) for message in MESSAGES]
+    for state in inputs:
+        runner.invoke(dict(state))
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for state in inputs:
+            runner.invoke(dict(state))
+    return (time.perf_counter() - started) / (iterations * len(inputs)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    agent = DialogAgent(os.getenv("OPENAI_API_KEY", "sk-benchmark"))
+    replayed = replayed_flow(agent)
+    rows = {
+        "langgraph, rule-only nodes": agent.build_graph(),
+        "direct, rule-only nodes": agent.build_executor(),
+        "langgraph, replayed nodes": agent.build_graph(replayed),
+        "direct, replayed nodes": agent.build_executor(replayed),
+    }
+
+    print(f"{'executor':<30} {'us/turn':>9}")
+    for name, runner in rows.items():
+        print(f"{name:<30} {time_turns(runner, args.iterations):>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
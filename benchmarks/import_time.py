@@ -0,0 +1,66 @@
+"""Check module import time against a budget using `python -X importtime`.
+
+Run from the repository root:
+    python -m benchmarks.import_time --module api_server --budget-ms 1500
+Exits with status 1 when the import takes longer than the budget.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+
+def measure_import(module: str):
+    """Import `module` in a fresh interpreter and return (total_us, [(cumulative_us, name), ...])"""
+    env = dict(os.environ, OPENAI_API_KEY=os.environ.get("OPENAI_API_KEY", "sk-import-time"))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=env
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    entries = []
+    for line in result.stderr.splitlines():
+        # Format: "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented under their parent; drop the column's leading space
+        entries.append((int(cumulative), name.rstrip()[1:]))
+
+    total = sum(cumulative for cumulative, name in entries if not name.startswith(" "))
+    return total, entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", action="append", help="Module to import (repeatable)")
+    parser.add_argument("--budget-ms", type=float, default=1500.0)
+    parser.add_argument("--top", type=int, default=10, help="Show the N slowest direct imports")
+    args = parser.parse_args()
+
+    over_budget = False
+    for module in args.module or ["api_server"]:
+        total, entries = measure_import(module)
+        total_ms = total / 1000
+        status = "OK" if total_ms <= args.budget_ms else "OVER BUDGET"
+        over_budget = over_budget or total_ms > args.budget_ms
+        print(f"{module}: {total_ms:.0f} ms (budget {args.budget_ms:.0f} ms) {status}")
+
+        # Direct imports of the module are indented one level (two spaces)
+        direct = sorted(
+            ((cumulative, name.strip()) for cumulative, name in entries
+             if name.startswith("  ") and not name.startswith("    ")),
+            reverse=True
+        )
+        for cumulative, name in direct[:args.top]:
+            print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Measure how much of each node's prompt is a stable, cacheable prefix.
+
+Renders every LLM node's request twice, with different dates, inputs and
+context, and counts the leading tokens the two share (function schemas
+included). That shared prefix is what the provider's prompt cache can reuse;
+OpenAI only caches prefixes of 1024 tokens or more. Live cached-token ratios
+per node are on GET /health under "prompt_cache".
+
+Run from the repository root:
+    python -m benchmarks.prompt_prefix
+"""
+import argparse
+import json
+import os
+
+# Config reads the key at import time; rendering prompts never calls the API
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from langchain_core.utils.function_calling import convert_to_openai_function
+
+from agents.intent_classifier import CLASSIFY_FUNCTION
+from helpers.context_compaction import count_tokens
+from models.schemas import EmailDetails, MeetingDetails
+from utils.datetime_parser import LLMDateTimeParser
+
+# Requests shorter than this are never served from OpenAI's prompt cache
+CACHEABLE_PREFIX_TOKENS = 1024
+
+MONDAY = {"current_datetime": "2025-01-27 10:30 Monday", "input": "Book a sync with sara@example.com tomorrow at 3pm"}
+TUESDAY = {"current_datetime": "2025-01-28 16:05 Tuesday", "input": "Email bob@example.com that the report is late"}
+
+
+def node_requests(app):
+    """node -> (prompt, function schemas, [values for two different calls])"""
+    agent = app.dialog_agent
+    extractor = agent.entity_extractor
+    dates = [
+        dict(current_date="2025-01-27", current_time="10:30", day_of_week="Monday", tomorrow_date="2025-01-28",
+             next_week_date="2025-02-03", two_hours_later="12:30", expression="tomorrow at 3pm"),
+        dict(current_date="2025-01-28", current_time="16:05", day_of_week="Tuesday", tomorrow_date="2025-01-29",
+             next_week_date="2025-02-04", two_hours_later="18:05", expression="next friday"),
+    ]
+    return {
+        "intent": (agent.intent_classifier.prompt, [CLASSIFY_FUNCTION], [MONDAY, TUESDAY]),
+        "meeting_extraction": (extractor.meeting_prompt, [MeetingDetails], [
+            dict(MONDAY, day_of_week="Monday", tomorrow="2025-01-28", context="None"),
+            dict(TUESDAY, day_of_week="Tuesday", tomorrow="2025-01-29", context='{"title":"Sync"}'),
+        ]),
+        "email_extraction": (extractor.email_prompt, [EmailDetails], [
+            dict(MONDAY, context="None"),
+            dict(TUESDAY, context='{"recipient":"bob@example.com"}'),
+        ]),
+        "date_parsing": (LLMDateTimeParser(agent.node_llm("date_parsing")).prompt, [], dates),
+        "confirmation": (app.confirmation_chain.confirmation_prompt, [], [
+            dict(current_datetime=MONDAY["current_datetime"], intent="schedule_meeting", details="Meeting 'Sync' on Tuesday"),
+            dict(current_datetime=TUESDAY["current_datetime"], intent="send_email", details="Email to bob@example.com"),
+        ]),
+        "confirmation_check": (app.confirmation_check_prompt, [], [{"message": "yes please"}, {"message": "no, cancel it"}]),
+        "correction": (app.correction_chain.correction_prompt, [MeetingDetails], [
+            dict(input="actually make it 4pm", previous_entities='{"time":"15:00"}', history=[]),
+            dict(input="change the title to Review", previous_entities='{"title":"Sync"}', history=[]),
+        ]),
+        "missing_info": (agent.missing_info_prompt, [], [
+            dict(intent="schedule meeting", missing_fields="time", first_missing="time"),
+            dict(intent="send email", missing_fields="body, subject", first_missing="body"),
+        ]),
+        "chitchat": (agent.chitchat_prompt, [], [{"message": "How are you?"}, {"message": "Tell me a joke"}]),
+        "history_summary": (app.history_summarizer.prompt, [], [
+            dict(summary="None", turns="User: hi\nAssistant: hello", max_words=75),
+            dict(summary="Booked a sync", turns="User: email bob\nAssistant: what should it say?", max_words=75),
+        ]),
+    }
+
+
+def render(prompt, functions, values) -> str:
+    """The request as the provider sees it: function schemas, then the messages in order"""
+    schemas = [convert_to_openai_function(schema) for schema in functions]
+    messages = [{"role": message.type, "content": message.content} for message in prompt.format_messages(**values)]
+    return json.dumps({"functions": schemas, "messages": messages})
+
+
+def shared_prefix(first: str, second: str) -> str:
+    length = 0
+    for a, b in zip(first, second):
+        if a != b:
+            break
+        length += 1
+    return first[:length]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.parse_args()
+
+    from main import ConversationalAssistant
+    app = ConversationalAssistant()
+
+    print(f"{'node':<20} {'prefix':>7} {'total':>7} {'share':>7}  cacheable")
+    for node, (prompt, functions, samples) in node_requests(app).items():
+        first, second = (render(prompt, functions, values) for values in samples)
+        prefix_tokens = count_tokens(shared_prefix(first, second))
+        total_tokens = count_tokens(first)
+        cacheable = "yes" if prefix_tokens >= CACHEABLE_PREFIX_TOKENS else "no (under 1024)"
+        print(f"{node:<20} {prefix_tokens:>7} {total_tokens:>7} {prefix_tokens / total_tokens:>7.0%}  {cacheable}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Re-run the conversations recorded in an LLM cassette, offline.
+
+Record with LLM_CASSETTE_MODE=record while running api_server or the Gradio
+app. Every LLM call is then served from the cassette (at recorded speed with
+--latency-scale 1) and each session's turns are replayed in order, with the
+clock pinned to when the turn was recorded. The report gives turn latency,
+LLM requests the cassette couldn't answer, and replies that differ from the
+recording, i.e. behaviour changed by the code under test.
+
+Run from the repository root:
+    python -m benchmarks.replay_cassette cassettes/llm.json
+    python -m benchmarks.replay_cassette cassettes/llm.json --target api --latency-scale 1 --fail-on-diff
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Config reads the key at import time; replayed turns never call the API
+os.environ.setdefault("OPENAI_API_KEY", "sk-replay")
+
+from config import Config
+from helpers.date_context import DateContext
+from utils.deadline import Deadline
+from utils.llm_cassette import Cassette, install_cassette
+
+TARGETS = ("recorded", "assistant", "api")
+
+
+class AssistantTarget:
+    """Turns through ConversationalAssistant.process_message, as the Gradio app runs them"""
+
+    def __init__(self):
+        from main import ConversationalAssistant
+        self.app = ConversationalAssistant()
+        self.histories = {}
+
+    def run(self, turn: dict) -> str:
+        history = self.histories.get(turn["session_id"], [])
+        for history, *_ in self.app.process_message(turn["message"], history, turn["session_id"]):
+            pass
+        self.histories[turn["session_id"]] = history
+        return history[-1][1]
+
+
+class ApiTarget:
+    """Turns through api_server's /chat and /confirm-action handlers"""
+
+    def __init__(self):
+        import api_server
+        self.api = api_server
+        self.loop = asyncio.new_event_loop()
+        # Built here rather than inside the first timed turn
+        api_server.get_components()
+
+    def run(self, turn: dict) -> str:
+        if turn.get("confirmed") is not None:
+            result = self.loop.run_until_complete(self.api.confirm_action(
+                self.api.ActionConfirmation(session_id=turn["session_id"], confirmed=turn["confirmed"])
+            ))
+            return result["message"]
+        response = self.loop.run_until_complete(self.api.process_chat(
+            self.api.ChatRequest(message=turn["message"], session_id=turn["session_id"]),
+            Deadline(Config.REQUEST_BUDGET_SECONDS),
+            transport="replay"
+        ))
+        return response.response
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("cassette")
+    parser.add_argument("--target", choices=TARGETS, default="recorded",
+                        help="where to run turns; 'recorded' uses the transport each turn was recorded on")
+    parser.add_argument("--latency-scale", type=float, default=0.0, help="sleep recorded LLM latency times this")
+    parser.add_argument("--show-diffs", type=int, default=5)
+    parser.add_argument("--fail-on-diff", action="store_true", help="exit with status 1 when any reply changed")
+    args = parser.parse_args()
+
+    cassette = Cassette(args.cassette)
+    if not cassette.turns:
+        parser.error(f"{args.cassette} has no recorded turns")
+    # No circuit breaker: one miss would otherwise turn the rest of the replay rule-only
+    install_cassette(cassette, record=False, latency_scale=args.latency_scale, model_callbacks=[])
+    # Replayed confirmations write to a scratch outbox; the semantic cache audit is made repeatable
+    Config.OUTBOX_PATH = tempfile.mkdtemp(prefix="replay-outbox-")
+    random.seed(0)
+
+    targets = {}
+    durations = []
+    diffs = []
+    skipped = 0
+    for turn in cassette.turns:
+        name = args.target
+        if name == "recorded":
+            name = "api" if turn["transport"] == "api" else "assistant"
+        if name == "assistant" and turn.get("message") is None:
+            # /confirm-action calls have no chat message to send through the assistant
+            skipped += 1
+            continue
+        if name not in targets:
+            targets[name] = ApiTarget() if name == "api" else AssistantTarget()
+
+        DateContext.set_reference(datetime.fromisoformat(turn["at"]))
+        started = time.perf_counter()
+        try:
+            reply = targets[name].run(turn)
+        except Exception as e:
+            reply = f"<error: {e}>"
+        durations.append((time.perf_counter() - started) * 1000)
+        if reply != turn["response"]:
+            diffs.append((turn, reply))
+    DateContext.set_reference(None)
+
+    durations.sort()
+    print(f"turns replayed     {len(durations)} ({skipped} skipped) from {len(cassette.turns)} recorded")
+    print(f"turn latency ms    mean {statistics.mean(durations):.1f}  p50 {durations[len(durations) // 2]:.1f}  "
+          f"p95 {durations[min(len(durations) - 1, int(0.95 * len(durations)))]:.1f}  max {durations[-1]:.1f}")
+    print(f"cassette misses    {cassette.misses} of {len(cassette.interactions)} recorded LLM calls")
+    print(f"changed replies    {len(diffs)}")
+    for turn, reply in diffs[:args.show_diffs]:
+        print(f"\n  [{turn['session_id']}] {turn.get('message') or ('confirm' if turn.get('confirmed') else 'cancel')}")
+        print(f"    recorded: {turn['response']}")
+        print(f"    replayed: {reply}")
+    if args.fail_on_diff and diffs:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Compare payload size and encode/decode time of the API's serialization paths.
+
+Run from the repository root:
+    python -m benchmarks.serialization --iterations 20000
+"""
+import argparse
+import json
+import timeit
+
+from api_server import ChatResponse
+from utils.serialization import orjson, ormsgpack
+
+RESPONSE = ChatResponse(
+    response="Should I book this? Meeting 'Quarterly planning' on Tuesday, January 28, 2025 at 3:00 PM with sara@example.com, bob@example.com.",
+    intent="schedule_meeting",
+    entities={
+        "title": "Quarterly planning",
+        "date": "2025-01-28",
+        "time": "15:00",
+        "participants": ["sara@example.com", "bob@example.com"]
+    },
+    state="ready_to_confirm",
+    requires_confirmation=True,
+    suggestions=["Yes, confirm", "No, cancel", "Let me change something"]
+)
+
+
+def encoders():
+    """name -> (encode the response, decode the bytes)"""
+    payload = RESPONSE.dict()
+    paths = {
+        "pydantic + json (default REST)": (
+            lambda: json.dumps(RESPONSE.dict()).encode(),
+            json.loads
+        ),
+        "model_dump_json": (
+            lambda: RESPONSE.model_dump_json().encode(),
+            json.loads
+        ),
+    }
+    if orjson is not None:
+        paths["orjson (FAST_JSON)"] = (lambda: orjson.dumps(payload), orjson.loads)
+    if ormsgpack is not None:
+        paths["msgpack (ws subprotocol)"] = (lambda: ormsgpack.packb(payload), ormsgpack.unpackb)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20_000)
+    args = parser.parse_args()
+
+    print(f"{'path':<32} {'bytes':>7} {'encode us':>10} {'decode us':>10}")
+    for name, (encode, decode) in encoders().items():
+        data = encode()
+        encode_us = timeit.timeit(encode, number=args.iterations) / args.iterations * 1e6
+        decode_us = timeit.timeit(lambda: decode(data), number=args.iterations) / args.iterations * 1e6
+        print(f"{name:<32} {len(data):>7} {encode_us:>10.2f} {decode_us:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Measure memory held per live session, legacy dict layout vs SessionRecord.
+
+Run from the repository root:
+    python -m benchmarks.session_memory --sessions 10000 100000 --turns 4
+"""
+import argparse
+import gc
+import tracemalloc
+from datetime import datetime
+
+from models.schemas import ConversationContext, IntentType
+from helpers.context_compaction import ConversationHistory
+from state.session_record import SessionRecord
+
+ENTITIES = {"title": "Project sync", "date": "2025-01-28", "time": "15:00", "participants": []}
+
+
+def build_legacy_session(turns: int) -> dict:
+    """The original per-session dict: pydantic context, ISO strings and one dict per turn"""
+    return {
+        "context": ConversationContext(),
+        "awaiting_confirmation": False,
+        "extracted_entities": dict(ENTITIES),
+        "last_intent": "schedule_meeting",
+        "history": [
+            {
+                "user": f"message {i}",
+                "bot": f"reply {i}",
+                "timestamp": datetime.now().isoformat()
+            }
+            for i in range(turns)
+        ],
+        "created_at": datetime.now().isoformat(),
+        "message_count": turns
+    }
+
+
+def build_compact_session(turns: int) -> SessionRecord:
+    session = SessionRecord(ConversationHistory(window=max(turns, 1)))
+    session.extracted_entities = dict(ENTITIES)
+    session.last_intent = IntentType.SCHEDULE_MEETING
+    for i in range(turns):
+        session.history.add_turn(f"message {i}", f"reply {i}")
+    session.message_count = turns
+    return session
+
+
+def measure(builder, count: int, turns: int) -> float:
+    """Bytes allocated per session while `count` sessions are alive"""
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    sessions = {f"session-{i}": builder(turns) for i in range(count)}
+    gc.collect()
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del sessions
+    return (current - baseline) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--turns", type=int, default=4, help="History turns per session")
+    args = parser.parse_args()
+
+    print(f"{'sessions':>10} {'legacy B/session':>18} {'compact B/session':>18} {'saving':>8}")
+    for count in args.sessions:
+        legacy = measure(build_legacy_session, count, args.turns)
+        compact = measure(build_compact_session, count, args.turns)
+        print(f"{count:>10} {legacy:>18.0f} {compact:>18.0f} {1 - compact / legacy:>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
 from models.schemas import IntentType
+from helpers.date_context import DateContext
+from utils.prompt_cache_stats import llm_node
 from datetime import datetime
 from typing import Dict
 
@@ -11,14 +13,14 @@ class ConfirmationChain:
         self.confirmation_prompt = ChatPromptTemplate.from_template("""
         Generate a clear, friendly confirmation message for the user's request.
         
+        Format it as a yes/no question that clearly states what action will be taken.
+        Be specific about all details so the user can verify everything is correct.
+        Include the actual dates (not relative terms) in the confirmation.
+        
         Current date and time: {current_datetime}
         
         Intent: {intent}
         Details: {details}
-        
-        Format it as a yes/no question that clearly states what action will be taken.
-        Be specific about all details so the user can verify everything is correct.
-        Include the actual dates (not relative terms) in the confirmation.
         """)
         
     def generate_confirmation(self, intent: IntentType, details: dict) -> str:
@@ -27,16 +29,42 @@ class ConfirmationChain:
         response = chain.invoke({
             "intent": intent.value,
             "details": self.format_details(intent, details),
-            "current_datetime": datetime.now().strftime("%Y-%m-%d %H:%M %A")
-        })
+            "current_datetime": DateContext.now().strftime("%Y-%m-%d %H:%M %A")
+        }, config=llm_node("confirmation"))
         
         return response.content
     
-    def format_details(self, intent: IntentType, details: dict) -> str:
+    def confirm(self, intent: IntentType, details: dict, use_llm: bool = False) -> str:
+        """Confirmation question for the front ends; the LLM phrasing is an opt-in style"""
+        if use_llm:
+            try:
+                return self.generate_confirmation(intent, details)
+            except Exception as e:
+                print(f"Confirmation generation failed, using template: {e}")
+        return self.render_confirmation(intent, details)
+    
+    @staticmethod
+    def render_confirmation(intent: IntentType, details: dict) -> str:
+        """Deterministic yes/no confirmation with absolute, readable details"""
+        if intent == IntentType.SCHEDULE_MEETING:
+            return f"Should I book this? {ConfirmationChain.format_details(intent, details)}."
+        elif intent == IntentType.SEND_EMAIL:
+            return f"Should I send this? {ConfirmationChain.format_details(intent, details)}."
+        return "Should I proceed with this action?"
+    
+    @staticmethod
+    def format_time(time_str: str) -> str:
+        try:
+            return datetime.strptime(time_str, "%H:%M").strftime("%I:%M %p").lstrip("0")
+        except (TypeError, ValueError):
+            return time_str
+    
+    @staticmethod
+    def format_details(intent: IntentType, details: dict) -> str:
         # Include actual parsed dates in confirmation
         if intent == IntentType.SCHEDULE_MEETING:
-            date_str = details.get('date', 'unspecified date')
-            time_str = details.get('time', 'unspecified time')
+            date_str = details.get('date') or 'unspecified date'
+            time_str = ConfirmationChain.format_time(details.get('time')) or 'unspecified time'
             
             # Convert date to readable format if it's in YYYY-MM-DD format
             try:
@@ -45,10 +73,16 @@ class ConfirmationChain:
                     date_str = date_obj.strftime("%A, %B %d, %Y")
             except:
                 pass
-                
-            return f"Meeting '{details.get('title')}' on {date_str} at {time_str}"
+            
+            summary = f"Meeting '{details.get('title')}' on {date_str} at {time_str}"
+            if details.get('participants'):
+                summary += f" with {', '.join(details['participants'])}"
+            return summary
             
         elif intent == IntentType.SEND_EMAIL:
-            return f"Email to {details.get('recipient')} with message: '{details.get('body')}'"
+            summary = f"Email to {details.get('recipient')}"
+            if details.get('subject'):
+                summary += f" with subject '{details['subject']}'"
+            return summary + f" saying: '{details.get('body')}'"
         
         return str(details)
\ No newline at end of file
@@ -1,20 +1,50 @@
 from langchain_openai import ChatOpenAI
-from langchain.memory import ConversationBufferMemory
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
-from typing import Dict
+from langchain_core.utils.function_calling import convert_to_openai_function
+from models.schemas import IntentType, MeetingDetails, EmailDetails
+from agents.rule_based import (
+    EMAIL_PATTERN, ISO_DATE_PATTERN, RELATIVE_DATE_PATTERN, TIME_12H_PATTERN, TIME_24H_PATTERN,
+    strip_context_prefix, extract_date, extract_time, extract_emails
+)
+from helpers.context_compaction import CorrectionMemory
+from utils.prompt_cache_stats import llm_node
+from typing import Dict, Optional
 import json
+import re
+
+# "change the title to X", "subject should be X", "call it X"
+FIELD_CHANGE_PATTERN = re.compile(
+    r"\b(?:(title|name|subject|body|message)\s+(?:to|as|is|should be|:)|call it|rename it to)\s+[\"']?(.+?)[\"']?\s*[.!?]*$",
+    re.IGNORECASE
+)
+ADD_PARTICIPANT_PATTERN = re.compile(r"\b(?:add|also|invite|include)\b", re.IGNORECASE)
+FIELD_ALIASES = {
+    IntentType.SCHEDULE_MEETING: {"title": "title", "name": "title", "subject": "title", None: "title"},
+    IntentType.SEND_EMAIL: {"title": "subject", "name": "subject", "subject": "subject", "body": "body", "message": "body", None: "subject"},
+}
+# "3 not 4pm", "instead of Friday": the message also names the value being replaced
+NEGATED_VALUE_PATTERN = re.compile(r"\b(?:not|instead of|rather than|except)\b|n't\b", re.IGNORECASE)
+SCHEMAS = {IntentType.SCHEDULE_MEETING: MeetingDetails, IntentType.SEND_EMAIL: EmailDetails}
+
+
+def count_time_mentions(text: str) -> int:
+    """Distinct times in `text`; "2:15 pm" matches both time patterns but is one mention"""
+    spans = [match.span() for match in TIME_12H_PATTERN.finditer(text)]
+    for match in TIME_24H_PATTERN.finditer(text):
+        if not any(start < match.end() and match.start() < end for start, end in spans):
+            spans.append(match.span())
+    return len(spans)
+
 
 class CorrectionChain:
     def __init__(self, llm: ChatOpenAI):
         self.llm = llm
-        self.memory = ConversationBufferMemory(return_messages=True)
         
         self.correction_prompt = ChatPromptTemplate.from_messages([
             ("system", """You are helping a user correct their previous request.
-            Previous entities: {previous_entities}
             
             The user now wants to make a change. Update the entities accordingly.
-            Return the complete updated entities, not just the changes.
+            Call the function with the complete updated entities, not just the changes.
             
             Look for correction patterns like:
             - "actually make it X"
@@ -22,30 +52,126 @@ class CorrectionChain:
             - "no, I meant Z"
             """),
             MessagesPlaceholder(variable_name="history"),
+            ("system", "Previous entities: {previous_entities}"),
             ("user", "{input}")
         ])
         
-    def process_correction(self, user_input: str, previous_entities: dict) -> dict:
-        chain = self.correction_prompt | self.llm
+        # The LLM must answer with the intent's schema instead of free text
+        self.correction_llms = {
+            intent: self.llm.bind_functions(
+                functions=[convert_to_openai_function(schema)],
+                function_call={"name": schema.__name__}
+            )
+            for intent, schema in SCHEMAS.items()
+        }
+        
+    def process_correction(
+        self,
+        user_input: str,
+        previous_entities: dict,
+        memory: Optional[CorrectionMemory] = None,
+        intent: Optional[IntentType] = None,
+        use_llm: bool = True
+    ) -> Optional[dict]:
+        """Patch the targeted slot locally, asking the LLM only when the change is ambiguous.
+        
+        Returns None for an ambiguous change when `use_llm` is False.
+        """
+        updated_entities = self.patch_locally(user_input, previous_entities, intent)
+        if updated_entities is not None:
+            if memory is not None:
+                memory.add(user_input, updated_entities)
+            return updated_entities
+        if not use_llm:
+            return None
+        return self.correct_with_llm(user_input, previous_entities, memory, intent)
+        
+    def patch_locally(self, user_input: str, previous_entities: dict, intent: Optional[IntentType] = None) -> Optional[dict]:
+        """Update only the slot the correction targets; None when that can't be told without the LLM"""
+        intent = intent or self.infer_intent(previous_entities)
+        text = strip_context_prefix(user_input)
+        patch = {}
         
-        response = chain.invoke({
-            "input": user_input,
-            "previous_entities": json.dumps(previous_entities),
-            "history": self.memory.chat_memory.messages
-        })
+        # An explicit "<field> to <value>" takes the rest of the message as the value
+        field_match = FIELD_CHANGE_PATTERN.search(text)
+        if field_match:
+            field = FIELD_ALIASES[intent].get((field_match.group(1) or "").lower() or None)
+            if field is None:
+                return None
+            patch[field] = field_match.group(2).strip()
+            text = text[:field_match.start()]
+        
+        emails = extract_emails(text)
+        if emails:
+            if intent == IntentType.SEND_EMAIL:
+                if len(set(emails)) > 1:
+                    return None
+                patch["recipient"] = emails[0]
+            elif ADD_PARTICIPANT_PATTERN.search(text):
+                known = list(previous_entities.get("participants") or [])
+                patch["participants"] = known + [email for email in emails if email not in known]
+            else:
+                patch["participants"] = emails
+            text = EMAIL_PATTERN.sub(" ", text)
+        
+        text_lower = text.lower()
+        if NEGATED_VALUE_PATTERN.search(text_lower):
+            return None
+        # Numbers the date and time patterns can't read ("make it 3", "the 14th") need the LLM
+        unparsed = ISO_DATE_PATTERN.sub(" ", text_lower)
+        unparsed = TIME_24H_PATTERN.sub(" ", TIME_12H_PATTERN.sub(" ", unparsed))
+        if re.search(r"\d", unparsed):
+            return None
+        date_mentions = len(ISO_DATE_PATTERN.findall(text_lower)) + len(RELATIVE_DATE_PATTERN.findall(text_lower))
+        time_mentions = count_time_mentions(text_lower)
+        if date_mentions or time_mentions:
+            # Dates and times only patch meetings, and only when each is mentioned once
+            if intent != IntentType.SCHEDULE_MEETING or date_mentions > 1 or time_mentions > 1:
+                return None
+            date, time = extract_date(text), extract_time(text)
+            if date:
+                patch["date"] = date
+            if time:
+                patch["time"] = time
+        
+        if not patch:
+            return None
+        return {**previous_entities, **patch}
+        
+    def correct_with_llm(
+        self,
+        user_input: str,
+        previous_entities: dict,
+        memory: Optional[CorrectionMemory] = None,
+        intent: Optional[IntentType] = None
+    ) -> dict:
+        intent = intent or self.infer_intent(previous_entities)
+        schema = SCHEMAS[intent]
+        chain = self.correction_prompt | self.correction_llms[intent]
         
-        # Parse and return updated entities
         try:
-            # Attempt to parse JSON from response
-            import re
-            json_match = re.search(r'\{.*\}', response.content, re.DOTALL)
-            if json_match:
-                return json.loads(json_match.group())
-        except:
-            pass
-        
-        return previous_entities
-    
+            response = chain.invoke({
+                "input": user_input,
+                "previous_entities": json.dumps(previous_entities, separators=(",", ":")),
+                "history": memory.messages() if memory is not None else []
+            }, config=llm_node("correction"))
+            args = json.loads(response.additional_kwargs["function_call"]["arguments"])
+            known = {k: v for k, v in previous_entities.items() if k in schema.__fields__}
+            updated_entities = schema(**{**known, **{k: v for k, v in args.items() if v}}).dict()
+        except Exception as e:
+            print(f"Error applying correction, keeping previous details: {e}")
+            return previous_entities
+        
+        if memory is not None:
+            memory.add(user_input, updated_entities)
+        return updated_entities
+        
+    @staticmethod
+    def infer_intent(entities: dict) -> IntentType:
+        if any(entities.get(field) for field in EmailDetails.__fields__):
+            return IntentType.SEND_EMAIL
+        return IntentType.SCHEDULE_MEETING
+        
     def detect_correction(self, message: str) -> bool:
         """Check if message contains correction intent"""
         correction_keywords = [
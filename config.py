@@ -5,7 +5,93 @@ load_dotenv()
 
 class Config:
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-    MODEL_NAME = "gpt-4o-mini"
+    MODEL_NAME = os.getenv("MODEL_NAME", "gpt-4o-mini")
     TEMPERATURE = 0.1  # Low temperature for consistent intent classification
     MAX_RETRIES = 3
-    OUTBOX_PATH = "./outbox"
\ No newline at end of file
+    OUTBOX_PATH = "./outbox"
+    # Per-turn latency budget; clients can override it with the X-Request-Budget-Ms header
+    REQUEST_BUDGET_SECONDS = float(os.getenv("REQUEST_BUDGET_SECONDS", "15"))
+    # Time we expect a single LLM round trip to take when deciding whether to degrade
+    LLM_CALL_ESTIMATE_SECONDS = float(os.getenv("LLM_CALL_ESTIMATE_SECONDS", "2.5"))
+    # Circuit breaker around the LLM backend; while open the assistant runs rule-only
+    LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "20"))
+    CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3"))
+    CIRCUIT_SLOW_CALL_SECONDS = float(os.getenv("CIRCUIT_SLOW_CALL_SECONDS", "10"))
+    CIRCUIT_RECOVERY_SECONDS = float(os.getenv("CIRCUIT_RECOVERY_SECONDS", "30"))
+    # Per-node generation settings; missing fields fall back to MODEL_NAME, TEMPERATURE and
+    # LLM_TIMEOUT_SECONDS. Any field can be overridden with LLM_<NODE>_<FIELD>, e.g.
+    # LLM_CHITCHAT_MODEL=gpt-4o, LLM_INTENT_MAX_TOKENS=128, LLM_DATE_PARSING_STOP='["\\n"]'
+    LLM_NODES = {
+        # A forced function call with two arguments
+        "intent": {"temperature": 0.1, "max_tokens": 32},
+        "meeting_extraction": {"temperature": 0, "max_tokens": 256},
+        "email_extraction": {"temperature": 0, "max_tokens": 512},
+        "correction": {"temperature": 0, "max_tokens": 512},
+        # One line: "YYYY-MM-DD HH:MM"
+        "date_parsing": {"temperature": 0, "max_tokens": 16, "stop": ["\n"]},
+        # One word: YES, NO or UNCLEAR
+        "confirmation_check": {"temperature": 0, "max_tokens": 3, "stop": ["\n"]},
+        "confirmation": {"temperature": 0.3, "max_tokens": 120},
+        "missing_info": {"temperature": 0.3, "max_tokens": 60},
+        "chitchat": {"temperature": 0.3, "max_tokens": 300},
+        "history_summary": {"temperature": 0.3, "max_tokens": 200}
+    }
+    # Context compaction: recent turns kept verbatim, older ones folded into a summary
+    HISTORY_WINDOW = int(os.getenv("HISTORY_WINDOW", "6"))
+    HISTORY_SUMMARY_MAX_TOKENS = int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", "150"))
+    PROMPT_CONTEXT_MAX_TOKENS = int(os.getenv("PROMPT_CONTEXT_MAX_TOKENS", "400"))
+    CORRECTION_MEMORY_TURNS = int(os.getenv("CORRECTION_MEMORY_TURNS", "4"))
+    CORRECTION_MEMORY_MAX_TOKENS = int(os.getenv("CORRECTION_MEMORY_MAX_TOKENS", "200"))
+    # Missing-field questions: "template" (no LLM call) or "llm" to have the model phrase them
+    MISSING_FIELD_STYLE = os.getenv("MISSING_FIELD_STYLE", "template")
+    # Confirmations: "template" renders them locally, "llm" has the model phrase them
+    CONFIRMATION_STYLE = os.getenv("CONFIRMATION_STYLE", "template")
+    # Local intent model (python -m agents.local_intent_model train); used when confident enough
+    LOCAL_INTENT_MODEL_PATH = os.getenv("LOCAL_INTENT_MODEL_PATH", "./data/intent_model.npz")
+    LOCAL_INTENT_MIN_CONFIDENCE = float(os.getenv("LOCAL_INTENT_MIN_CONFIDENCE", "0.85"))
+    # LLM intent labels are appended here as training data when set
+    INTENT_LOG_PATH = os.getenv("INTENT_LOG_PATH", "")
+    # Semantic cache for intents and per-session LLM chitchat replies (hashed weighted word vectors, cosine
+    # top-1); thresholds from python -m evaluation.tune_semantic_cache (0.85 is the lowest with no false
+    # hits on evaluation/paraphrase_pairs.jsonl; chitchat is one step stricter since a false hit is a wrong reply)
+    SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+    SEMANTIC_CACHE_CAPACITY = int(os.getenv("SEMANTIC_CACHE_CAPACITY", "4096"))
+    SEMANTIC_CACHE_DIM = int(os.getenv("SEMANTIC_CACHE_DIM", "512"))
+    SEMANTIC_CACHE_INTENT_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_INTENT_THRESHOLD", "0.85"))
+    SEMANTIC_CACHE_CHITCHAT_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_CHITCHAT_THRESHOLD", "0.9"))
+    # Share of intent cache hits re-checked against the LLM to measure hit quality
+    SEMANTIC_CACHE_AUDIT_RATE = float(os.getenv("SEMANTIC_CACHE_AUDIT_RATE", "0.02"))
+    # Serialize REST responses with orjson (needs the orjson package)
+    FAST_JSON = os.getenv("FAST_JSON", "false").lower() == "true"
+    # WebSocket: pipelined requests per connection, throttled at 3/4 full and rejected when full
+    WS_INBOX_SIZE = int(os.getenv("WS_INBOX_SIZE", "32"))
+    WS_PING_INTERVAL_SECONDS = float(os.getenv("WS_PING_INTERVAL_SECONDS", "20"))
+    WS_IDLE_TIMEOUT_SECONDS = float(os.getenv("WS_IDLE_TIMEOUT_SECONDS", "60"))
+    # Gradio UI: turns processed at once and turns allowed to wait in the queue
+    GRADIO_CONCURRENCY_LIMIT = int(os.getenv("GRADIO_CONCURRENCY_LIMIT", "4"))
+    GRADIO_MAX_QUEUE_SIZE = int(os.getenv("GRADIO_MAX_QUEUE_SIZE", "64"))
+    # Profiling: turns sent with "X-Profile: 1" (or "sample"/"trace"), plus this share of all turns,
+    # are profiled and written to PROFILE_DIR as collapsed stacks with per-node timings
+    PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+    PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    PROFILE_MODE = os.getenv("PROFILE_MODE", "sample")
+    PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "2"))
+    # Tracing: spans for every turn, dialog node, LLM call and outbox write, as OTLP/JSON lines in a rotating file
+    TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+    TRACE_PATH = os.getenv("TRACE_PATH", "./traces/spans.jsonl")
+    TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(10 * 1024 * 1024)))
+    TRACE_BACKUP_COUNT = int(os.getenv("TRACE_BACKUP_COUNT", "5"))
+    # LLM cassettes: "record" saves every LLM request/response (secrets redacted) and each turn to
+    # LLM_CASSETTE_PATH; "replay" serves the responses from it offline, optionally at recorded speed
+    LLM_CASSETTE_MODE = os.getenv("LLM_CASSETTE_MODE", "off")
+    LLM_CASSETTE_PATH = os.getenv("LLM_CASSETTE_PATH", "./cassettes/llm.json")
+    LLM_CASSETTE_LATENCY_SCALE = float(os.getenv("LLM_CASSETTE_LATENCY_SCALE", "0"))
+    LLM_CASSETTE_FLUSH_SECONDS = float(os.getenv("LLM_CASSETTE_FLUSH_SECONDS", "5"))
+    # Dialog orchestration: "langgraph" (compiled StateGraph) or "direct" (plain Python state machine)
+    DIALOG_EXECUTOR = os.getenv("DIALOG_EXECUTOR", "langgraph")
+    # Startup: tokenizer files are read from this directory instead of being downloaded
+    TIKTOKEN_CACHE_DIR = os.getenv("TIKTOKEN_CACHE_DIR", "./.tiktoken_cache")
+    WARMUP_CONNECT = os.getenv("WARMUP_CONNECT", "true").lower() == "true"
+    # POST /chat/batch: turns run concurrently across sessions, in order within a session
+    BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+    BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
\ No newline at end of file
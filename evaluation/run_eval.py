@@ -0,0 +1,276 @@
+"""Offline accuracy and latency evaluation of the NLU components.
+
+Scores intent classification, entity extraction, date/time parsing and
+correction detection on a labelled corpus, once per strategy, and writes a
+JSON report. LLM strategies replay responses from a recordings file, so the
+run needs no network; pass --record (with OPENAI_API_KEY set) to fill in
+requests that have no recording yet. Items whose LLM requests aren't in the
+recordings are reported as not evaluated and left out of the accuracy.
+
+The committed recordings are stubs written from the corpus labels
+(python -m evaluation.stub_recordings), so offline the LLM rows check the
+prompts, parsing and scoring rather than the model. For real model numbers,
+delete evaluation/recordings.json and run with --record.
+
+Usage:
+    python -m evaluation.run_eval
+    python -m evaluation.run_eval --components intent dates --strategies rules
+    python -m evaluation.run_eval --record
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from langchain_core.callbacks import BaseCallbackHandler
+from helpers.date_context import DateContext
+from utils.llm_factory import override_llm
+from utils.llm_cassette import Cassette, RecordingMissError, install_cassette
+
+EVALUATION_DIR = Path(__file__).resolve().parent
+# The corpus labels relative dates against this moment (a Monday morning)
+REFERENCE_DATETIME = "2025-01-27T10:30:00"
+
+
+class UsageCounter(BaseCallbackHandler):
+    """Counts LLM calls, failures and tokens across every component"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.recording_misses = 0
+
+    def on_llm_end(self, response, **kwargs):
+        self.calls += 1
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        self.prompt_tokens += usage.get("prompt_tokens", 0)
+        self.completion_tokens += usage.get("completion_tokens", 0)
+
+    def on_llm_error(self, error, **kwargs):
+        self.errors += 1
+        if isinstance(error, RecordingMissError):
+            self.recording_misses += 1
+
+
+class Components:
+    """The agents under evaluation, built once against the recorded model"""
+
+    def __init__(self):
+        from agents.dialog_agent import DialogAgent
+        from chains.correction_chain import CorrectionChain
+        from utils.datetime_parser import LLMDateTimeParser
+        self.dialog_agent = DialogAgent(os.getenv("OPENAI_API_KEY", "offline"))
+        self.correction_chain = CorrectionChain(self.dialog_agent.node_llm("correction"))
+        self.datetime_parser = LLMDateTimeParser(self.dialog_agent.node_llm("date_parsing"))
+
+    def llm_intent(self, text: str) -> str:
+        result = self.dialog_agent.intent_classifier.classify(text)
+        if result is None:
+            raise ValueError("LLM classification failed")
+        return result.intent.value
+
+    def local_intent(self, text: str) -> str:
+        result = self.dialog_agent.local_intent_model.classify(text)
+        if result is None:
+            raise FileNotFoundError(f"No local intent model at {self.dialog_agent.local_intent_model.path}")
+        return result.intent.value
+
+
+def _rule_datetime(expression: str) -> Dict:
+    from agents.rule_based import extract_date, extract_time
+    return {"date": extract_date(expression), "time": extract_time(expression)}
+
+
+# component -> strategy -> builder(components) returning predict(item)
+STRATEGIES: Dict[str, Dict[str, Callable]] = {
+    "intent": {
+        "llm": lambda c: lambda item: c.llm_intent(item["text"]),
+        "rules": lambda c: lambda item: c.dialog_agent.rule_classifier.classify(item["text"]).intent.value,
+        "local": lambda c: lambda item: c.local_intent(item["text"]),
+    },
+    "entities": {
+        "llm": lambda c: lambda item: _extract(c.dialog_agent.entity_extractor, item),
+        "rules": lambda c: lambda item: _extract(c.dialog_agent.rule_extractor, item),
+    },
+    "dates": {
+        "llm": lambda c: lambda item: c.datetime_parser.parse(item["date_expression"]),
+        "rules": lambda c: lambda item: _rule_datetime(item["date_expression"]),
+    },
+    "correction": {
+        "keywords": lambda c: lambda item: c.correction_chain.detect_correction(item["text"]),
+    },
+}
+
+# component -> which corpus items it is scored on
+SELECTORS = {
+    "intent": lambda item: "intent" in item,
+    "entities": lambda item: "meeting" in item or "email" in item,
+    "dates": lambda item: "date_expression" in item,
+    "correction": lambda item: "correction" in item,
+}
+
+
+def _extract(extractor, item: Dict) -> Dict:
+    if "meeting" in item:
+        return extractor.extract_meeting_entities(item["text"]).dict()
+    return extractor.extract_email_entities(item["text"]).dict()
+
+
+def _normalize(value) -> str:
+    return " ".join(str(value).lower().strip(" .!?'\"").split())
+
+
+def _field_matches(field: str, expected, predicted) -> bool:
+    if predicted is None:
+        return False
+    if field == "participants":
+        return {_normalize(p) for p in expected} <= {_normalize(p) for p in predicted}
+    if field in ("title", "subject", "body"):
+        # Free text: accept either phrasing containing the other
+        expected, predicted = _normalize(expected), _normalize(predicted)
+        return bool(predicted) and (expected in predicted or predicted in expected)
+    return _normalize(expected) == _normalize(predicted)
+
+
+def score(component: str, item: Dict, predicted) -> bool:
+    if component == "intent":
+        return predicted == item["intent"]
+    if component == "correction":
+        return bool(predicted) == item["correction"]
+    if component == "dates":
+        expected = item["expected"]
+    else:
+        expected = item.get("meeting", item.get("email"))
+    return all(_field_matches(field, value, predicted.get(field)) for field, value in expected.items())
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def evaluate(component: str, strategy: str, predict: Callable, items: List[Dict], usage: UsageCounter) -> Dict:
+    usage.reset()
+    latencies, failures = [], []
+    correct = exceptions = not_evaluated = 0
+    for item in items:
+        misses_before = usage.recording_misses
+        started = time.perf_counter()
+        try:
+            predicted = predict(item)
+            ok = score(component, item, predicted)
+        except Exception as e:
+            predicted, ok = f"error: {e}", False
+            exceptions += 1
+        if usage.recording_misses > misses_before:
+            # Scoring the fallback would measure the missing recording, not the strategy
+            not_evaluated += 1
+            continue
+        latencies.append((time.perf_counter() - started) * 1000)
+        if ok:
+            correct += 1
+        elif len(failures) < 5:
+            failures.append({"id": item["id"], "predicted": predicted})
+    evaluated = len(items) - not_evaluated
+    return {
+        "n": evaluated,
+        "not_evaluated": not_evaluated,
+        "accuracy": round(correct / evaluated, 3) if evaluated else None,
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies), 2),
+            "p50": round(_percentile(latencies, 0.5), 2),
+            "p95": round(_percentile(latencies, 0.95), 2),
+        } if latencies else None,
+        "llm_calls": usage.calls,
+        # Includes requests missing from the recordings (counted under not_evaluated)
+        "llm_errors": usage.errors,
+        "exceptions": exceptions,
+        "prompt_tokens": usage.prompt_tokens,
+        "completion_tokens": usage.completion_tokens,
+        "sample_failures": failures,
+    }
+
+
+def load_corpus(path: str) -> List[Dict]:
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline accuracy/latency evaluation of the NLU components")
+    parser.add_argument("--corpus", default=str(EVALUATION_DIR / "corpus.jsonl"))
+    parser.add_argument("--recordings", default=str(EVALUATION_DIR / "recordings.json"))
+    parser.add_argument("--output", default="eval_report.json", help="Where to write the JSON report")
+    parser.add_argument("--components", nargs="+", choices=list(STRATEGIES), default=list(STRATEGIES))
+    parser.add_argument("--strategies", nargs="+", help="Only run these strategies (default: all)")
+    parser.add_argument("--reference-datetime", default=REFERENCE_DATETIME,
+                        help="Clock used for relative dates; must match the corpus labels")
+    parser.add_argument("--record", action="store_true",
+                        help="Call the live model for unrecorded requests and save them (needs OPENAI_API_KEY)")
+    args = parser.parse_args(argv)
+
+    if args.record and not os.getenv("OPENAI_API_KEY"):
+        parser.error("--record needs OPENAI_API_KEY")
+
+    recordings = Cassette(args.recordings)
+    if args.record and recordings.source:
+        parser.error(f"{args.recordings} holds {recordings.source} responses; delete it or pass another --recordings path")
+    if recordings.source:
+        print(f"LLM responses in {args.recordings} are {recordings.source}s, not model output")
+
+    DateContext.set_reference(datetime.fromisoformat(args.reference_datetime))
+    usage = UsageCounter()
+    # The process-wide circuit breaker is left out so misses can't trip it mid-run
+    install_cassette(recordings, args.record, model_callbacks=[usage])
+
+    corpus = load_corpus(args.corpus)
+    components = Components()
+    report = {
+        "corpus": args.corpus,
+        "reference_datetime": args.reference_datetime,
+        "recordings": args.recordings,
+        "recordings_source": recordings.source,
+        "results": {},
+    }
+    try:
+        for component in args.components:
+            items = [item for item in corpus if SELECTORS[component](item)]
+            for strategy, build in STRATEGIES[component].items():
+                if args.strategies and strategy not in args.strategies:
+                    continue
+                result = evaluate(component, strategy, build(components), items, usage)
+                report["results"].setdefault(component, {})[strategy] = result
+                if result["accuracy"] is None:
+                    print(f"{component:<11} {strategy:<9} not evaluated: {result['not_evaluated']} items have no recordings")
+                    continue
+                print(f"{component:<11} {strategy:<9} accuracy={result['accuracy']:.3f} n={result['n']:<3} "
+                      f"not_evaluated={result['not_evaluated']:<3} "
+                      f"p50={result['latency_ms']['p50']:.1f}ms p95={result['latency_ms']['p95']:.1f}ms "
+                      f"tokens={result['prompt_tokens'] + result['completion_tokens']} "
+                      f"llm_errors={result['llm_errors']}")
+    finally:
+        override_llm(None)
+        DateContext.set_reference(None)
+        if args.record:
+            recordings.save()
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"Report written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
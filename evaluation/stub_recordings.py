@@ -0,0 +1,111 @@
+"""Write stub LLM recordings for the evaluation corpus from its labels.
+
+Real recordings need OPENAI_API_KEY (python -m evaluation.run_eval --record).
+Without one, this fills evaluation/recordings.json with the response the
+labels say a perfect model would give to each LLM request of the eval, so
+run_eval can exercise the LLM strategies (prompts, request keys, response
+parsing and scoring) offline. The file is marked "source": "stub" and
+run_eval flags its LLM columns as stubbed: they check the plumbing, not the
+model. Re-run this whenever a prompt changes, since that changes the
+request keys.
+
+Usage:
+    python -m evaluation.stub_recordings
+    python -m evaluation.stub_recordings --recordings /tmp/stub.json
+"""
+import argparse
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from helpers.date_context import DateContext
+from utils.llm_cassette import Cassette, CassetteChatModel
+from utils.llm_factory import override_llm
+from evaluation.run_eval import (
+    EVALUATION_DIR, REFERENCE_DATETIME, SELECTORS, STRATEGIES, Components, load_corpus
+)
+
+STUB_SOURCE = "stub"
+# Components whose "llm" strategy makes LLM requests (correction detection is keyword-only)
+LLM_COMPONENTS = ("intent", "entities", "dates")
+STUB_CONFIDENCE = 0.95
+
+
+class LabelChatModel(BaseChatModel):
+    """Answers every request with what the current corpus item's labels expect"""
+
+    item: Optional[Dict] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "label-stub"
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        function = (kwargs.get("function_call") or {}).get("name")
+        if function == "classify_intent":
+            message = self._function_call(function, {"intent": self.item["intent"], "confidence": STUB_CONFIDENCE})
+        elif function == "MeetingDetails":
+            message = self._function_call(function, self.item["meeting"])
+        elif function == "EmailDetails":
+            message = self._function_call(function, self.item["email"])
+        elif "expected" in self.item:
+            expected = self.item["expected"]
+            message = AIMessage(content=" ".join(value for value in (expected["date"], expected.get("time")) if value))
+        else:
+            raise ValueError(f"No label answers this request for item {self.item['id']}")
+        return ChatResult(generations=[ChatGeneration(message=message)], llm_output={"token_usage": {}})
+
+    @staticmethod
+    def _function_call(name: str, arguments: Dict) -> AIMessage:
+        return AIMessage(content="", additional_kwargs={"function_call": {"name": name, "arguments": json.dumps(arguments)}})
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default=str(EVALUATION_DIR / "corpus.jsonl"))
+    parser.add_argument("--recordings", default=str(EVALUATION_DIR / "recordings.json"))
+    parser.add_argument("--reference-datetime", default=REFERENCE_DATETIME)
+    args = parser.parse_args(argv)
+
+    path = Path(args.recordings)
+    if path.exists() and Cassette(str(path)).source != STUB_SOURCE:
+        parser.error(f"{path} holds real recordings; pass another --recordings path")
+    path.unlink(missing_ok=True)
+
+    DateContext.set_reference(datetime.fromisoformat(args.reference_datetime))
+    recordings = Cassette(str(path))
+    recordings.source = STUB_SOURCE
+    labels = LabelChatModel()
+    override_llm(lambda model_name, temperature, callbacks=None, **settings: CassetteChatModel(
+        model_name=model_name, cassette=recordings, delegate=labels
+    ))
+
+    corpus = load_corpus(args.corpus)
+    try:
+        components = Components()
+        # Stub answers are not model labels, so keep them out of the local model's training data
+        components.dialog_agent.intent_classifier.label_log.path = None
+        for component in LLM_COMPONENTS:
+            predict = STRATEGIES[component]["llm"](components)
+            for item in corpus:
+                if SELECTORS[component](item):
+                    labels.item = item
+                    predict(item)
+    finally:
+        override_llm(None)
+        DateContext.set_reference(None)
+
+    recordings.save()
+    print(f"{len(recordings.interactions)} stub responses written to {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""Pick semantic cache thresholds from labelled message pairs.
+
+Each line of the pairs file is {"a": ..., "b": ..., "paraphrase": bool}. A
+pair scoring at or above the threshold would be a cache hit, so a
+non-paraphrase there is a wrong answer served from the cache. The report
+lists every pair by similarity, precision and recall at each candidate
+threshold, and the lowest one with no false hits: the
+SEMANTIC_CACHE_*_THRESHOLD defaults in config.py come from this run.
+
+Usage:
+    python -m evaluation.tune_semantic_cache
+    python -m evaluation.tune_semantic_cache --pairs my_pairs.jsonl --step 0.01
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from helpers.semantic_cache import embed
+
+EVALUATION_DIR = Path(__file__).resolve().parent
+
+
+def load_pairs(path: str) -> list:
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pairs", default=str(EVALUATION_DIR / "paraphrase_pairs.jsonl"))
+    parser.add_argument("--step", type=float, default=0.05, help="spacing of candidate thresholds")
+    parser.add_argument("--show", action="store_true", help="print every pair with its similarity")
+    args = parser.parse_args()
+
+    scored = sorted(
+        ((float(embed(pair["a"]) @ embed(pair["b"])), pair) for pair in load_pairs(args.pairs)),
+        key=lambda item: -item[0]
+    )
+    if args.show:
+        for similarity, pair in scored:
+            print(f"{similarity:.3f}  {'same' if pair['paraphrase'] else 'diff'}  {pair['a']!r} ~ {pair['b']!r}")
+        print()
+
+    paraphrases = sum(1 for _, pair in scored if pair["paraphrase"])
+    print(f"{len(scored)} pairs, {paraphrases} paraphrases")
+    print(f"{'threshold':>9} {'hits':>6} {'false':>6} {'precision':>10} {'recall':>7}")
+    recommended = None
+    steps = int(round(1 / args.step))
+    for step in range(steps // 2, steps + 1):
+        threshold = round(step * args.step, 4)
+        hits = [pair for similarity, pair in scored if similarity >= threshold]
+        false_hits = sum(1 for pair in hits if not pair["paraphrase"])
+        true_hits = len(hits) - false_hits
+        precision = true_hits / len(hits) if hits else 1.0
+        recall = true_hits / paraphrases if paraphrases else 0.0
+        print(f"{threshold:>9.2f} {len(hits):>6} {false_hits:>6} {precision:>10.3f} {recall:>7.3f}")
+        if recommended is None and false_hits == 0:
+            recommended = threshold
+
+    closest = max((similarity for similarity, pair in scored if not pair["paraphrase"]), default=None)
+    if closest is not None:
+        print(f"\nclosest non-paraphrase pair: {closest:.3f}")
+    print(f"lowest threshold with no false hits: {recommended}")
+
+
+if __name__ == "__main__":
+    main()
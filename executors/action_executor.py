@@ -3,6 +3,7 @@ import os
 from datetime import datetime
 from pathlib import Path
 from typing import Dict
+from utils.tracing import span
 
 class ActionExecutor:
     def __init__(self, outbox_path: str = "./outbox"):
@@ -22,8 +23,9 @@ class ActionExecutor:
         filename = f"meeting_{timestamp.replace(':', '-').replace('.', '-')}.json"
         filepath = self.outbox_path / filename
         
-        with open(filepath, 'w') as f:
-            json.dump(action, f, indent=2)
+        with span("outbox.write", attributes={"action.type": "meeting", "outbox.file": filename}):
+            with open(filepath, 'w') as f:
+                json.dump(action, f, indent=2)
             
         return {
             "status": "success", 
@@ -44,8 +46,9 @@ class ActionExecutor:
         filename = f"email_{timestamp.replace(':', '-').replace('.', '-')}.json"
         filepath = self.outbox_path / filename
         
-        with open(filepath, 'w') as f:
-            json.dump(action, f, indent=2)
+        with span("outbox.write", attributes={"action.type": "email", "outbox.file": filename}):
+            with open(filepath, 'w') as f:
+                json.dump(action, f, indent=2)
             
         return {
             "status": "success",
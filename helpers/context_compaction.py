@@ -0,0 +1,223 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from models.schemas import IntentType
+from config import Config
+from collections import deque
+from array import array
+import threading
+import time
+import json
+import os
+
+# Entity fields each intent's prompts actually need
+INTENT_FIELDS = {
+    IntentType.SCHEDULE_MEETING: ["title", "date", "time", "participants"],
+    IntentType.SEND_EMAIL: ["recipient", "subject", "body"],
+}
+
+# Summaries are refreshed off the request path
+_summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="history-summary")
+# One lock for all histories; the critical sections are tiny and a lock per session costs memory
+_history_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    """Load the tokenizer for the configured model (cached after the first call)"""
+    # tiktoken downloads encodings on first use unless they are already in its cache dir
+    os.environ.setdefault("TIKTOKEN_CACHE_DIR", Config.TIKTOKEN_CACHE_DIR)
+    import tiktoken
+    try:
+        try:
+            return tiktoken.encoding_for_model(Config.MODEL_NAME)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # Encodings are downloaded on first use; without them fall back to an estimate
+        print(f"Error loading tiktoken encoding, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    encoding = get_encoding()
+    if encoding is None:
+        return text[:max_tokens * 4]
+    tokens = encoding.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+
+class HistorySummarizer:
+    """Folds turns that fell out of the window into a short running summary"""
+
+    def __init__(self, llm, is_available=lambda: True):
+        self.llm = llm
+        self.is_available = is_available
+        from langchain.prompts import ChatPromptTemplate
+        self.prompt = ChatPromptTemplate.from_template("""
+        Update the running summary of a conversation between a user and an assistant
+        that schedules meetings and sends emails.
+        Keep facts the assistant may need later (names, emails, dates, decisions).
+        Stay under {max_words} words.
+
+        Current summary: {summary}
+
+        New turns:
+        {turns}
+        """)
+
+    def summarize(self, summary: str, turns: List[Tuple[str, str]]) -> str:
+        if not self.is_available():
+            return self.local_summary(summary, turns)
+        from utils.prompt_cache_stats import llm_node
+        chain = self.prompt | self.llm
+        response = chain.invoke({
+            "summary": summary or "None",
+            "turns": "\n".join(f"User: {user}\nAssistant: {bot}" for user, bot in turns),
+            "max_words": Config.HISTORY_SUMMARY_MAX_TOKENS // 2
+        }, config=llm_node("history_summary"))
+        return response.content.strip()
+
+    @staticmethod
+    def local_summary(summary: str, turns: List[Tuple[str, str]]) -> str:
+        """Summary without the LLM: keep the user's side of the dropped turns"""
+        asked = [user for user, _ in turns]
+        return "; ".join([summary] + asked if summary else asked)
+
+
+class ConversationHistory:
+    """Bounded window of recent turns plus a rolling summary of older ones.
+
+    Turns are kept as parallel lists (user text, bot text, epoch timestamps)
+    rather than one dict per turn, since every live session holds one of these.
+    """
+
+    __slots__ = ("window", "summarizer", "users", "bots", "timestamps", "summary", "_pending", "_refreshing")
+
+    def __init__(self, window: int = Config.HISTORY_WINDOW, summarizer: Optional[HistorySummarizer] = None):
+        self.window = window
+        self.summarizer = summarizer
+        self.users: List[str] = []
+        self.bots: List[str] = []
+        self.timestamps = array("d")
+        self.summary = ""
+        self._pending: Optional[List[Tuple[str, str]]] = None
+        self._refreshing = False
+
+    def add_turn(self, user: str, bot: str, timestamp: Optional[float] = None):
+        with _history_lock:
+            self.users.append(user)
+            self.bots.append(bot)
+            self.timestamps.append(timestamp if timestamp is not None else time.time())
+            while len(self.users) > self.window:
+                if self._pending is None:
+                    self._pending = []
+                self._pending.append((self.users.pop(0), self.bots.pop(0)))
+                self.timestamps.pop(0)
+            schedule = bool(self._pending) and not self._refreshing
+            if schedule:
+                self._refreshing = True
+        if schedule:
+            _summary_executor.submit(self._refresh_summary)
+
+    def _refresh_summary(self):
+        while True:
+            with _history_lock:
+                pending, self._pending = self._pending, None
+                summary = self.summary
+                if not pending:
+                    self._refreshing = False
+                    return
+            try:
+                if self.summarizer:
+                    summary = self.summarizer.summarize(summary, pending)
+                else:
+                    summary = HistorySummarizer.local_summary(summary, pending)
+            except Exception as e:
+                print(f"Error refreshing history summary: {e}")
+                summary = HistorySummarizer.local_summary(summary, pending)
+            summary = truncate_to_tokens(summary, Config.HISTORY_SUMMARY_MAX_TOKENS)
+            with _history_lock:
+                self.summary = summary
+
+    def recent(self, limit: Optional[int] = None) -> List[Tuple[str, str]]:
+        turns = list(zip(self.users, self.bots))
+        return turns if limit is None else turns[-limit:]
+
+    def __len__(self) -> int:
+        return len(self.users)
+
+
+class CorrectionMemory:
+    """Last few corrections of one session, kept on its SessionRecord and dropped with it"""
+
+    __slots__ = ("turns",)
+
+    def __init__(self, max_turns: int = Config.CORRECTION_MEMORY_TURNS):
+        # (user message, compact JSON of the entities it produced)
+        self.turns = deque(maxlen=max_turns)
+
+    def add(self, user_input: str, entities: dict):
+        self.turns.append((user_input, json.dumps(entities, separators=(",", ":"), ensure_ascii=False)))
+
+    def messages(self, max_tokens: int = Config.CORRECTION_MEMORY_MAX_TOKENS) -> List[Tuple[str, str]]:
+        """Prompt messages for the most recent corrections that fit in max_tokens"""
+        messages = []
+        used = 0
+        for user_input, entities in reversed(self.turns):
+            used += count_tokens(user_input) + count_tokens(entities)
+            if used > max_tokens:
+                break
+            messages[:0] = [("human", user_input), ("ai", entities)]
+        return messages
+
+    def __len__(self) -> int:
+        return len(self.turns)
+
+
+def serialize_prompt_context(
+    entities: Optional[Dict],
+    intent: Optional[IntentType] = None,
+    history: Optional[ConversationHistory] = None,
+    max_tokens: int = Config.PROMPT_CONTEXT_MAX_TOKENS
+) -> str:
+    """Render only the context the current intent needs, capped at max_tokens"""
+    fields = INTENT_FIELDS.get(intent)
+    known = {
+        key: value for key, value in (entities or {}).items()
+        if value and (fields is None or key in fields)
+    }
+    payload = {}
+    if known:
+        payload["known"] = known
+    recent = []
+    if history is not None:
+        if history.summary:
+            payload["summary"] = history.summary
+        recent = [list(turn) for turn in history.recent()]
+    if not payload and not recent:
+        return "None"
+
+    # Drop the oldest turns first, then the summary, then hard-truncate
+    while True:
+        if recent:
+            payload["recent"] = recent
+        text = json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+        if count_tokens(text) <= max_tokens:
+            return text
+        if recent:
+            recent = recent[1:]
+            payload.pop("recent", None)
+        elif "summary" in payload:
+            payload.pop("summary")
+        else:
+            return truncate_to_tokens(text, max_tokens)
@@ -4,10 +4,23 @@ from typing import Dict, Optional
 class DateContext:
     """Provides current date/time context for the LLM"""
     
+    # Pinned "now" for offline evaluation and replays; None means the wall clock
+    _reference: Optional[datetime] = None
+    
+    @classmethod
+    def now(cls) -> datetime:
+        """Current date/time used by every prompt and relative-date calculation"""
+        return cls._reference or datetime.now()
+    
+    @classmethod
+    def set_reference(cls, reference: Optional[datetime]):
+        """Pin the clock to `reference` (or pass None to go back to the wall clock)"""
+        cls._reference = reference
+    
     @staticmethod
     def get_context_string() -> str:
         """Get a formatted string with current date/time context"""
-        now = datetime.now()
+        now = DateContext.now()
         
         context = f"""
         Current Information:
@@ -22,7 +35,7 @@ class DateContext:
     @staticmethod
     def parse_relative_date(expression: str) -> Optional[str]:
         """Parse common relative date expressions without LLM"""
-        now = datetime.now()
+        now = DateContext.now()
         expression_lower = expression.lower().strip()
         
         # Simple rule-based parsing for common cases
@@ -62,7 +75,7 @@ class DateContext:
     @staticmethod
     def parse_relative_time(expression: str) -> Optional[str]:
         """Parse common relative time expressions"""
-        now = datetime.now()
+        now = DateContext.now()
         expression_lower = expression.lower().strip()
         
         # Handle "in X hours"
@@ -0,0 +1,82 @@
+from models.schemas import IntentType
+from string import Formatter
+from typing import Dict, List, Optional
+
+# Phrasing variants per intent and missing field; {placeholders} are filled from the known
+# entities and a variant is only used when every value it mentions is known
+MISSING_FIELD_TEMPLATES = {
+    IntentType.SCHEDULE_MEETING: {
+        "title": [
+            "What would you like to call this meeting?",
+            "What's the meeting on {date} about?",
+            "What should I call the meeting with {participants}?",
+        ],
+        "date": [
+            "What day would you like to schedule this?",
+            "What day works for '{title}'?",
+            "Which day should I book '{title}' at {time}?",
+        ],
+        "time": [
+            "What time works best for you?",
+            "What time should '{title}' start?",
+            "What time on {date} works for '{title}'?",
+        ],
+        "participants": [
+            "Who should I invite to this meeting?",
+            "Who should I invite to '{title}'?",
+        ],
+    },
+    IntentType.SEND_EMAIL: {
+        "recipient": [
+            "Who should I send this email to?",
+            "Who should receive the email about {subject}?",
+        ],
+        "subject": [
+            "What should the subject of the email be?",
+            "What subject should I use for the email to {recipient}?",
+        ],
+        "body": [
+            "What would you like to say in the email?",
+            "What would you like to say to {recipient}?",
+            "What should the email about {subject} say?",
+        ],
+    },
+}
+
+CHITCHAT_FALLBACK = "I'm here to help! You can ask me to schedule meetings or send emails."
+FORM_CANCELLED = "Okay, I've dropped that. Is there anything else I can help with?"
+
+
+def _template_fields(template: str) -> List[str]:
+    return [name for _, name, _, _ in Formatter().parse(template) if name]
+
+
+def _render_value(value) -> str:
+    if isinstance(value, (list, tuple)):
+        return ", ".join(str(item) for item in value)
+    return str(value)
+
+
+def missing_field_question(
+    intent: IntentType,
+    field: str,
+    entities: Optional[Dict] = None,
+    variant: int = 0
+) -> str:
+    """Ask for a missing field, mentioning the details already known.
+
+    `variant` rotates between the phrasings that fit, so repeated questions don't read the same.
+    """
+    entities = entities or {}
+    templates = MISSING_FIELD_TEMPLATES.get(intent, {}).get(field)
+    if not templates:
+        action = intent.value.replace("_", " ") if intent else "continue"
+        return f"Could you tell me the {field} so I can {action}?"
+
+    # Most specific phrasing first
+    usable = sorted(
+        (template for template in templates if all(entities.get(name) for name in _template_fields(template))),
+        key=lambda template: -len(_template_fields(template))
+    )
+    template = usable[variant % len(usable)]
+    return template.format(**{name: _render_value(entities[name]) for name in _template_fields(template)})
@@ -0,0 +1,212 @@
+from typing import Any, List, Optional
+from config import Config
+import numpy as np
+import threading
+import time
+import zlib
+import re
+
+# Words, keeping emails, contractions and expressions like "2+2" as single tokens
+TOKEN_PATTERN = re.compile(r"[\w@'+\-*/^=.]*[\w@+\-*/^=]")
+# Phrasings folded to one form before tokenizing
+PHRASES = [
+    (re.compile(r"^(?:please )?(?:can|could|would|will) you (?:please )?"), ""),
+    (re.compile(r"\bthank you\b"), "thanks"),
+    (re.compile(r"\b(?:are|is|am) (you |they |we |i )?able to\b"), r"\1can"),
+    (re.compile(r"\b(?:set up|put together|line up)\b"), "schedule"),
+    (re.compile(r"\bhow come\b"), "why"),
+    (re.compile(r"\bwhat's up\b|\bwhats up\b|\bsup\b"), "how are you"),
+    (re.compile(r"\bhow's it going\b|\bhow are things\b|\bhow do you do\b"), "how are you"),
+]
+SYNONYMS = {
+    "hi": "hello", "hey": "hello", "hiya": "hello", "howdy": "hello", "greetings": "hello", "yo": "hello",
+    "thank": "thanks", "thx": "thanks", "ty": "thanks", "cheers": "thanks",
+    "goodbye": "bye", "cya": "bye", "farewell": "bye",
+    "e-mail": "email", "mail": "email",
+    "book": "schedule", "arrange": "schedule", "organize": "schedule", "organise": "schedule",
+    "could": "can", "would": "will", "u": "you", "ur": "your", "pls": "please", "plz": "please",
+}
+# Question words and auxiliaries: they shape a message but rarely decide what it asks
+FUNCTION_WORDS = {
+    "what", "how", "who", "why", "when", "where", "which", "it", "this", "that", "do", "does", "did",
+    "have", "has", "had", "with", "about", "some", "any",
+}
+# Dates and weekdays, like numbers, change what a request asks for
+DATE_WORDS = {
+    "today", "tonight", "tomorrow", "yesterday", "monday", "tuesday", "wednesday", "thursday", "friday",
+    "saturday", "sunday", "weekend", "morning", "afternoon", "evening", "noon", "midnight",
+}
+# Words that carry little meaning on their own
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "am", "was", "were", "be", "been", "to", "of", "in", "on", "at", "for",
+    "and", "or", "there", "please", "just", "so", "oh", "um", "uh", "well", "really", "very", "quick", "me",
+}
+NEGATIONS = {
+    "no", "not", "never", "nothing", "none", "don't", "dont", "doesn't", "didn't", "isn't", "aren't",
+    "can't", "cannot", "won't", "wouldn't", "shouldn't", "without",
+}
+STOPWORD_WEIGHT = 0.2
+FUNCTION_WORD_WEIGHT = 0.5
+# Numbers, emails, dates and negations: changing one changes what the message asks
+MARKED_WEIGHT = 2.0
+# Similarity above which a new entry replaces the existing one instead of being stored twice
+DUPLICATE_SIMILARITY = 0.98
+# Misses this close below the threshold are counted as near misses (threshold tuning signal)
+NEAR_MISS_MARGIN = 0.05
+
+
+def canonical_words(text: str) -> List[str]:
+    """Lower-cased words with common phrasings, synonyms, possessives and plurals folded"""
+    text = text.lower().strip()
+    for pattern, replacement in PHRASES:
+        text = pattern.sub(replacement, text)
+    words = []
+    for word in TOKEN_PATTERN.findall(text):
+        if word.endswith("'s"):
+            word = word[:-2]
+        word = SYNONYMS.get(word, word)
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss") and word.isalpha():
+            word = word[:-1]
+        words.append(word)
+    return words
+
+
+def word_weight(word: str) -> float:
+    if word in NEGATIONS or word in DATE_WORDS or "@" in word or any(char.isdigit() for char in word):
+        return MARKED_WEIGHT
+    if word in STOPWORDS:
+        return STOPWORD_WEIGHT
+    if word in FUNCTION_WORDS:
+        return FUNCTION_WORD_WEIGHT
+    return 1.0
+
+
+def embed(text: str, dim: int = Config.SEMANTIC_CACHE_DIM) -> np.ndarray:
+    """L2-normalised vector of hashed, weighted canonical words, computed locally.
+
+    Messages that differ only in wording score high; ones that differ in a
+    content word, number, email or negation score low.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for word in canonical_words(text):
+        vector[zlib.crc32(word.encode()) % dim] += word_weight(word)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def scope_id(scope: Optional[str]) -> int:
+    return zlib.crc32(scope.encode()) + 1 if scope is not None else 0
+
+
+class SemanticCache:
+    """Bounded cache looked up by meaning rather than exact text.
+
+    Entries live in a preallocated matrix; a lookup is one matrix-vector
+    product (cosine top-1) and a hit needs similarity >= threshold. When
+    full, the least recently used entry is overwritten. Entries put with a
+    scope (e.g. a session id) are only found by lookups with the same scope.
+    """
+
+    def __init__(self, capacity: int, threshold: float, dim: int = Config.SEMANTIC_CACHE_DIM):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.dim = dim
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.last_used = np.zeros(capacity, dtype=np.float64)
+        self.scope_ids = np.zeros(capacity, dtype=np.int64)
+        self.scopes: List[Optional[str]] = [None] * capacity
+        self.keys: List[Optional[str]] = [None] * capacity
+        self.values: List[Any] = [None] * capacity
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.near_misses = 0
+        self.evictions = 0
+        self.hit_similarity_total = 0.0
+        self.exact_hits = 0
+        self.audits = 0
+        self.audit_agreements = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, text: str, scope: Optional[str] = None) -> Optional[Any]:
+        query = embed(text, self.dim)
+        with self._lock:
+            if self.size == 0:
+                self.misses += 1
+                return None
+            similarities = self.scoped_similarities(query, scope)
+            best = int(similarities.argmax())
+            similarity = float(similarities[best])
+            if similarity < self.threshold or self.scopes[best] != scope:
+                self.misses += 1
+                if similarity >= self.threshold - NEAR_MISS_MARGIN:
+                    self.near_misses += 1
+                return None
+            self.hits += 1
+            self.hit_similarity_total += similarity
+            if self.keys[best] == text:
+                self.exact_hits += 1
+            self.last_used[best] = time.monotonic()
+            return self.values[best]
+
+    def contains(self, text: str, scope: Optional[str] = None) -> bool:
+        """Whether lookup() would hit, without counting it in the hit metrics"""
+        query = embed(text, self.dim)
+        with self._lock:
+            if self.size == 0:
+                return False
+            similarities = self.scoped_similarities(query, scope)
+            best = int(similarities.argmax())
+            return float(similarities[best]) >= self.threshold and self.scopes[best] == scope
+
+    def put(self, text: str, value: Any, scope: Optional[str] = None):
+        vector = embed(text, self.dim)
+        with self._lock:
+            slot = None
+            if self.size:
+                similarities = self.scoped_similarities(vector, scope)
+                best = int(similarities.argmax())
+                if similarities[best] >= DUPLICATE_SIMILARITY and self.scopes[best] == scope:
+                    slot = best
+            if slot is None:
+                if self.size < self.capacity:
+                    slot = self.size
+                    self.size += 1
+                else:
+                    slot = int(self.last_used.argmin())
+                    self.evictions += 1
+            self.vectors[slot] = vector
+            self.scope_ids[slot] = scope_id(scope)
+            self.scopes[slot] = scope
+            self.keys[slot] = text
+            self.values[slot] = value
+            self.last_used[slot] = time.monotonic()
+
+    def scoped_similarities(self, vector: np.ndarray, scope: Optional[str]) -> np.ndarray:
+        """Cosine similarity to every entry, -1 for entries in other scopes"""
+        similarities = self.vectors[:self.size] @ vector
+        return np.where(self.scope_ids[:self.size] == scope_id(scope), similarities, -1.0)
+
+    def record_audit(self, agreed: bool):
+        """Record whether a sampled hit matched what the uncached path produced"""
+        with self._lock:
+            self.audits += 1
+            self.audit_agreements += int(agreed)
+
+    def status(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": self.size,
+                "capacity": self.capacity,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "exact_hits": self.exact_hits,
+                "near_misses": self.near_misses,
+                "mean_hit_similarity": round(self.hit_similarity_total / self.hits, 3) if self.hits else None,
+                "audit_agreement": round(self.audit_agreements / self.audits, 3) if self.audits else None,
+                "audits": self.audits,
+                "evictions": self.evictions
+            }
@@ -1,19 +1,38 @@
-import gradio as gr
+import copy
 import json
-from typing import List, Tuple, Dict
+from typing import Dict, Iterator, List, Optional, Tuple
 from agents.dialog_agent import DialogAgent
 from executors.action_executor import ActionExecutor
 from chains.confirmation_chain import ConfirmationChain
 from chains.correction_chain import CorrectionChain
 from config import Config
-from models.schemas import ConversationContext, IntentType
+from models.schemas import IntentType
+from state.session_record import SessionRecord
 from langchain.prompts import ChatPromptTemplate
 import os
 import uuid
 # Add this import at the top
 from helpers.date_context import DateContext
+from utils.deadline import Deadline
+from utils.prompt_cache_stats import llm_node
+from utils.profiling import profile_mode, run_profiled
+from utils.tracing import traced_steps
+from agents.rule_based import detect_confirmation
+from helpers.context_compaction import ConversationHistory, HistorySummarizer
 from datetime import datetime
 
+# Graph nodes whose LLM output is the reply itself, so their tokens are shown as they arrive
+STREAMED_NODES = {"handle_chitchat", "ask_missing_info"}
+
+
+def collapse_updates(updates: Iterator[Tuple]) -> Tuple:
+    """Run process_message to the end; the last history plus the last sent value of each panel"""
+    history, *panels = None, None, None, None, None
+    for update in updates:
+        history = update[0]
+        panels = [value if value is not None else previous for value, previous in zip(update[1:], panels)]
+    return (history, *panels)
+
 # Update the process_message method to include date context
 class ConversationalAssistant:
     def __init__(self):
@@ -21,22 +40,51 @@ class ConversationalAssistant:
         if not self.config.OPENAI_API_KEY:
             raise ValueError("Please set OPENAI_API_KEY in .env file")
             
+        # Chat models are built against the recording/replay cassette when LLM_CASSETTE_MODE is set;
+        # turns are added to it while recording
+        self.turn_recorder = None
+        if self.config.LLM_CASSETTE_MODE in ("record", "replay"):
+            from utils.llm_cassette import use_configured_cassette
+            cassette = use_configured_cassette()
+            if self.config.LLM_CASSETTE_MODE == "record":
+                self.turn_recorder = cassette
         self.dialog_agent = DialogAgent(self.config.OPENAI_API_KEY)
         self.executor = ActionExecutor(self.config.OUTBOX_PATH)
-        self.confirmation_chain = ConfirmationChain(self.dialog_agent.llm)
-        self.correction_chain = CorrectionChain(self.dialog_agent.llm)
-        self.conversation_states = {}  # Store state per session
+        self.confirmation_chain = ConfirmationChain(self.dialog_agent.node_llm("confirmation"))
+        self.correction_chain = CorrectionChain(self.dialog_agent.node_llm("correction"))
+        self.history_summarizer = HistorySummarizer(
+            self.dialog_agent.node_llm("history_summary"),
+            lambda: self.dialog_agent.circuit_breaker.is_closed
+        )
+        self.conversation_states: Dict[str, SessionRecord] = {}  # Store state per session
+        self.rendered_panels: Dict[str, dict] = {}  # Context panel values last sent to each session
+        
+        self.confirmation_check_prompt = ChatPromptTemplate.from_template("""
+        Did the user confirm (yes) or deny (no) the action?
+        
+        Respond with only "YES", "NO", or "UNCLEAR".
+        
+        Examples of YES: yes, yeah, yep, sure, ok, confirm, go ahead, do it
+        Examples of NO: no, nope, cancel, stop, don't, nevermind
+        
+        User message: {message}
+        """)
         
     def process_message(
         self, 
         message: str, 
         history: List[List[str]], 
         session_id: str
-    ) -> Tuple[List[List[str]], str, str, str, dict]:
-        """Process user message and return updated UI components"""
+    ) -> Iterator[Tuple[List[List[str]], Optional[str], Optional[str], Optional[str], Optional[dict]]]:
+        """Process user message, yielding UI updates as the reply streams in.
+        
+        Yields (history, intent, entities, state, last_action); a context panel is
+        None when its value hasn't changed since the last update sent to the session.
+        """
         
         if not message.strip():
-            return history, "", "{}", "idle", {}
+            yield history, None, None, None, None
+            return
         
         # Add current date/time to message context
         date_context = DateContext.get_context_string()
@@ -44,57 +92,97 @@ class ConversationalAssistant:
         
         # Get or create session state
         if session_id not in self.conversation_states:
-            self.conversation_states[session_id] = {
-                "context": ConversationContext(),
-                "awaiting_confirmation": False,
-                "extracted_entities": {},
-                "last_intent": None
-            }
+            self.conversation_states[session_id] = SessionRecord(
+                ConversationHistory(summarizer=self.history_summarizer)
+            )
         
         session_state = self.conversation_states[session_id]
+        deadline = Deadline(self.config.REQUEST_BUDGET_SECONDS)
+        degraded = False
+        action_executed = False
+        
+        history = history or []
+        history.append([message, ""])
         
         # Check for corrections
-        if self.correction_chain.detect_correction(message) and session_state["extracted_entities"]:
+        if self.correction_chain.detect_correction(message) and session_state.extracted_entities:
+            # Common corrections patch a single slot locally; the LLM only sees ambiguous ones
             updated_entities = self.correction_chain.process_correction(
-                message, 
-                session_state["extracted_entities"]
+                message,
+                session_state.extracted_entities,
+                session_state.corrections,
+                session_state.last_intent,
+                use_llm=self.llm_available(deadline)
             )
-            session_state["extracted_entities"] = updated_entities
+            if updated_entities is None:
+                updated_entities = self.patch_entities_locally(message, session_state)
+                degraded = True
+            session_state.extracted_entities = updated_entities
             
             # Generate new confirmation with updated details
-            if session_state["last_intent"]:
-                confirmation_msg = self.confirmation_chain.generate_confirmation(
-                    session_state["last_intent"],
-                    updated_entities
+            if session_state.last_intent:
+                degraded = degraded or (self.llm_confirmations and not self.llm_available(deadline))
+                confirmation_msg = self.confirm_within_budget(
+                    session_state.last_intent,
+                    updated_entities,
+                    deadline
                 )
-                session_state["awaiting_confirmation"] = True
+                session_state.awaiting_confirmation = True
                 response = confirmation_msg
             else:
                 response = "I've updated the details. Please continue."
         
         # Check if we're waiting for confirmation
-        elif session_state["awaiting_confirmation"]:
-            response = self.handle_confirmation(message, session_state)
+        elif session_state.awaiting_confirmation:
+            use_llm = self.llm_available(deadline)
+            response = self.handle_confirmation(message, session_state, use_llm=use_llm)
+            # Only replies the keyword rules can't read needed the LLM
+            degraded = not use_llm and detect_confirmation(message) == "UNCLEAR"
+            action_executed = session_state.context.state == "completed" and not session_state.awaiting_confirmation
         else:
-            # Process through dialog agent
-            result = self.dialog_agent.graph.invoke({
+            # Process through dialog agent, streaming reply tokens into the chat as they arrive
+            result = {}
+            stream = self.dialog_agent.graph.stream({
                 "messages": [message],
-                "context": session_state["context"],
-                "extracted_entities": session_state["extracted_entities"],
+                "context": session_state.context,
+                "extracted_entities": session_state.extracted_entities,
                 "awaiting_confirmation": False,
-                "current_intent": None,
+                "current_intent": session_state.last_intent if session_state.pending_slots else None,
                 "missing_fields": [],
                 "confirmation_message": "",
-                "final_response": ""
-            })
+                "final_response": "",
+                "deadline": deadline,
+                "degraded": False,
+                "history": session_state.history,
+                "session_id": session_id,
+                "pending_slots": session_state.pending_slots
+            }, stream_mode=["messages", "values"])
+            for mode, chunk in stream:
+                if mode == "values":
+                    result = chunk
+                    continue
+                token, metadata = chunk
+                if metadata.get("langgraph_node") in STREAMED_NODES and isinstance(token.content, str) and token.content:
+                    history[-1][1] += token.content
+                    yield history, None, None, None, None
+            degraded = result.get("degraded", False)
             
             # Update session state
             if result.get("current_intent"):
-                session_state["context"].intent = result["current_intent"]
-                session_state["last_intent"] = result["current_intent"]
+                session_state.context.intent = result["current_intent"]
+                session_state.last_intent = result["current_intent"]
             
-            if result.get("extracted_entities"):
-                session_state["extracted_entities"].update(result["extracted_entities"])
+            if result.get("slot_fill_result") == "cancelled":
+                # The user dropped the half-filled request
+                session_state.extracted_entities = {}
+            elif result.get("extracted_entities"):
+                session_state.extracted_entities.update(result["extracted_entities"])
+            
+            # Remember which fields were asked for so the reply can be slot-filled
+            if result.get("current_intent") in [IntentType.SCHEDULE_MEETING, IntentType.SEND_EMAIL]:
+                session_state.pending_slots = result.get("missing_fields") or None
+            else:
+                session_state.pending_slots = None
             
             # Check if we need confirmation
             if result.get("missing_fields"):
@@ -102,73 +190,126 @@ class ConversationalAssistant:
             elif result["current_intent"] in [IntentType.SCHEDULE_MEETING, IntentType.SEND_EMAIL]:
                 if not result.get("missing_fields"):
                     # All required fields present, ask for confirmation
-                    confirmation_msg = self.confirmation_chain.generate_confirmation(
+                    degraded = degraded or (self.llm_confirmations and not self.llm_available(deadline))
+                    confirmation_msg = self.confirm_within_budget(
                         result["current_intent"],
-                        session_state["extracted_entities"]
+                        session_state.extracted_entities,
+                        deadline
                     )
-                    session_state["awaiting_confirmation"] = True
+                    session_state.awaiting_confirmation = True
                     response = confirmation_msg
                 else:
                     response = result["final_response"]
             else:
                 response = result.get("final_response", "I'm here to help! You can ask me to schedule meetings or send emails.")
         
-        # Update history
-        history = history or []
-        history.append([message, response])
-        
-        # Prepare display data
-        intent_display = session_state["context"].intent.value if session_state["context"].intent else "None"
-        entities_display = json.dumps(session_state["extracted_entities"], indent=2)
-        state_display = "Awaiting Confirmation" if session_state["awaiting_confirmation"] else session_state["context"].state
+        # Update history; the final text replaces anything streamed (e.g. a fallback after a failed call)
+        history[-1][1] = response
+        session_state.history.add_turn(message, response)
+        if self.turn_recorder is not None:
+            self.turn_recorder.record_turn(session_id, "gradio", response, message=message)
         
-        # Get last action if any
-        recent_actions = self.executor.get_recent_actions(1)
-        last_action = recent_actions[0] if recent_actions else {}
-        
-        return history, intent_display, entities_display, state_display, last_action
+        yield (history, *self.changed_panels(session_id, session_state, degraded, action_executed))
     
-    def handle_confirmation(self, message: str, session_state: Dict) -> str:
-        """Handle yes/no confirmation"""
-        
-        # Use LLM to understand if user confirmed or denied
-        confirmation_check = ChatPromptTemplate.from_template("""
-        Did the user confirm (yes) or deny (no) the action?
-        User message: {message}
+    def changed_panels(
+        self,
+        session_id: str,
+        session_state: SessionRecord,
+        degraded: bool,
+        action_executed: bool
+    ) -> Tuple[Optional[str], Optional[str], Optional[str], Optional[dict]]:
+        """Intent, entities, state and last action displays, None for those unchanged since the last update"""
+        previous = self.rendered_panels.get(session_id)
+        current = {
+            "intent": session_state.context.intent.value if session_state.context.intent else "None",
+            "state": "Awaiting Confirmation" if session_state.awaiting_confirmation else session_state.context.state,
+            "entities": session_state.extracted_entities
+        }
+        if degraded:
+            current["state"] += " (degraded)"
         
-        Respond with only "YES", "NO", or "UNCLEAR".
+        # The outbox is only re-read when this turn executed an action (or on the first render)
+        if previous is None or action_executed:
+            recent_actions = self.executor.get_recent_actions(1)
+            current["action"] = recent_actions[0] if recent_actions else {}
+        else:
+            current["action"] = previous["action"]
         
-        Examples of YES: yes, yeah, yep, sure, ok, confirm, go ahead, do it
-        Examples of NO: no, nope, cancel, stop, don't, nevermind
-        """)
+        changed = {}
+        for key, value in current.items():
+            if previous is None or previous[key] != value:
+                changed[key] = value
+            else:
+                current[key] = previous[key]
+        if "entities" in changed:
+            # Entities are updated in place, so compare against a snapshot
+            current["entities"] = copy.deepcopy(current["entities"])
+            changed["entities"] = json.dumps(current["entities"], indent=2)
+        self.rendered_panels[session_id] = current
         
-        chain = confirmation_check | self.dialog_agent.llm
-        result = chain.invoke({"message": message})
+        return changed.get("intent"), changed.get("entities"), changed.get("state"), changed.get("action")
+    
+    def llm_available(self, deadline: Deadline) -> bool:
+        """The LLM may be used when the circuit is closed and the turn can afford another call"""
+        return (
+            self.dialog_agent.circuit_breaker.is_closed
+            and deadline.can_afford(self.config.LLM_CALL_ESTIMATE_SECONDS)
+        )
+    
+    def patch_entities_locally(self, message: str, session_state: SessionRecord) -> dict:
+        """Rule-only correction: re-run regex extraction over the known entities"""
+        entities = session_state.extracted_entities
+        if session_state.last_intent == IntentType.SEND_EMAIL:
+            return self.dialog_agent.rule_extractor.extract_email_entities(message, entities).dict()
+        return self.dialog_agent.rule_extractor.extract_meeting_entities(message, entities).dict()
+    
+    @property
+    def llm_confirmations(self) -> bool:
+        return self.config.CONFIRMATION_STYLE == "llm"
+    
+    def confirm_within_budget(self, intent: IntentType, entities: dict, deadline: Deadline) -> str:
+        """Render the confirmation locally; the LLM phrases it only in the "llm" style and when in budget"""
+        return self.confirmation_chain.confirm(
+            intent,
+            entities,
+            use_llm=self.llm_confirmations and self.llm_available(deadline)
+        )
+    
+    def handle_confirmation(self, message: str, session_state: SessionRecord, use_llm: bool = True) -> str:
+        """Handle yes/no confirmation"""
         
-        decision = result.content.strip().upper()
+        # Plain yes/no replies are read by the keyword rules; the LLM only sees unclear ones
+        decision = detect_confirmation(message)
+        if decision == "UNCLEAR" and use_llm:
+            chain = self.confirmation_check_prompt | self.dialog_agent.node_llm("confirmation_check")
+            try:
+                result = chain.invoke({"message": message}, config=llm_node("confirmation_check"))
+                decision = result.content.strip().upper()
+            except Exception as e:
+                print(f"Confirmation check failed: {e}")
         
         if decision == "YES":
             # Execute the action
-            if session_state["context"].intent == IntentType.SCHEDULE_MEETING:
-                result = self.executor.execute_meeting(session_state["extracted_entities"])
-            elif session_state["context"].intent == IntentType.SEND_EMAIL:
-                result = self.executor.execute_email(session_state["extracted_entities"])
+            if session_state.context.intent == IntentType.SCHEDULE_MEETING:
+                result = self.executor.execute_meeting(session_state.extracted_entities)
+            elif session_state.context.intent == IntentType.SEND_EMAIL:
+                result = self.executor.execute_email(session_state.extracted_entities)
             else:
                 result = {"status": "error", "file": "unknown"}
             
-            session_state["awaiting_confirmation"] = False
-            session_state["context"].state = "completed"
+            session_state.awaiting_confirmation = False
+            session_state.context.state = "completed"
             
             # Clear entities for next action
-            session_state["extracted_entities"] = {}
-            session_state["last_intent"] = None
+            session_state.extracted_entities = {}
+            session_state.last_intent = None
             
-            action_type = session_state["context"].intent.value.replace('_', ' ')
+            action_type = session_state.context.intent.value.replace('_', ' ')
             return f"✅ Done! I've successfully {action_type}. The details have been saved to {result['file']}. Is there anything else I can help you with?"
             
         elif decision == "NO":
-            session_state["awaiting_confirmation"] = False
-            session_state["context"].state = "idle"
+            session_state.awaiting_confirmation = False
+            session_state.context.state = "idle"
             return "No problem! I've cancelled that action. Is there anything else you'd like me to help with?"
         
         else:
@@ -178,12 +319,16 @@ class ConversationalAssistant:
         """Clear session state"""
         if session_id in self.conversation_states:
             del self.conversation_states[session_id]
+        self.rendered_panels.pop(session_id, None)
     
     def create_interface(self):
         """Create Gradio interface"""
+        # Gradio is only needed for the UI, so it isn't imported with the module
+        import gradio as gr
         
         with gr.Blocks(theme=gr.themes.Soft(), title="AI Assistant") as demo:
             session_id = gr.State(value=lambda: str(uuid.uuid4()))
+            pending_message = gr.State(value="")
             
             gr.Markdown(
                 """
@@ -255,45 +400,58 @@ class ConversationalAssistant:
                     )
             
             # Event handlers
-            def respond(message, history, session):
-                if not message.strip():
-                    return history, "", "{}", "idle", {}
-                    
+            def respond(message, history, session, request: gr.Request):
+                history = history or []
+                turns = len(history)
                 try:
-                    hist, intent, entities, state, action = self.process_message(message, history, session)
-                    return hist, intent, entities, state, action
+                    updates = traced_steps(
+                        "turn",
+                        {"session.id": session, "transport": "gradio"},
+                        self.process_message(message, history, session)
+                    )
+                    profile = profile_mode(request.headers.get("x-profile") if request else None)
+                    if profile:
+                        # Generator steps may resume on different worker threads, so a profiled
+                        # turn runs to completion on this one and is sent as a single update
+                        updates = [run_profiled(profile, session, "gradio", collapse_updates, updates)]
+                    for hist, *panels in updates:
+                        # Unchanged panels are skipped instead of being re-sent to the browser
+                        yield (hist, *(gr.update() if value is None else value for value in panels))
                 except Exception as e:
                     print(f"Error processing message: {e}")
-                    history = history or []
+                    del history[turns:]
                     history.append([message, f"I encountered an error: {str(e)}. Please try again."])
-                    return history, "error", "{}", "error", {}
+                    self.rendered_panels.pop(session, None)
+                    yield history, "error", "{}", "error", {}
+            
+            def take_message(message):
+                # Clear the textbox right away; the turn itself runs on the queue
+                return "", message
             
             def clear_chat(session):
                 self.clear_session(session)
                 return [], "None", "{}", "idle", {}, str(uuid.uuid4())
             
             msg.submit(
-                respond,
-                [msg, chatbot, session_id],
-                [chatbot, intent_display, entities_display, state_display, actions_display],
+                take_message,
+                [msg],
+                [msg, pending_message],
                 queue=False
             ).then(
-                lambda: "",
-                None,
-                msg,
-                queue=False
+                respond,
+                [pending_message, chatbot, session_id],
+                [chatbot, intent_display, entities_display, state_display, actions_display]
             )
             
             send_btn.click(
-                respond,
-                [msg, chatbot, session_id],
-                [chatbot, intent_display, entities_display, state_display, actions_display],
+                take_message,
+                [msg],
+                [msg, pending_message],
                 queue=False
             ).then(
-                lambda: "",
-                None,
-                msg,
-                queue=False
+                respond,
+                [pending_message, chatbot, session_id],
+                [chatbot, intent_display, entities_display, state_display, actions_display]
             )
             
             clear_btn.click(
@@ -316,11 +474,17 @@ class ConversationalAssistant:
                 inputs=msg
             )
         
+        # LLM-bound turns run on the queue, at most GRADIO_CONCURRENCY_LIMIT at a time
+        demo.queue(
+            default_concurrency_limit=self.config.GRADIO_CONCURRENCY_LIMIT,
+            max_size=self.config.GRADIO_MAX_QUEUE_SIZE
+        )
         return demo
 
 if __name__ == "__main__":
     try:
         app = ConversationalAssistant()
+        app.dialog_agent.warm_up()
         demo = app.create_interface()
         print("Starting Gradio app on http://localhost:7860")
         demo.launch(
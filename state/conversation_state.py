@@ -1,13 +1,25 @@
-from typing import TypedDict, Annotated, Sequence, Optional
-from models.schemas import ConversationContext, IntentType
+from typing import TypedDict, Annotated, Sequence, Optional, Literal
+from models.schemas import ConversationContext, IntentType, IntentClassification
+from utils.deadline import Deadline
+from helpers.context_compaction import ConversationHistory
 import operator
 
 class ConversationState(TypedDict):
     messages: Annotated[Sequence[str], operator.add]
+    session_id: Optional[str]
     context: ConversationContext
     current_intent: Optional[IntentType]
     extracted_entities: dict
     missing_fields: list
     awaiting_confirmation: bool
     confirmation_message: str
-    final_response: str
\ No newline at end of file
+    final_response: str
+    deadline: Optional[Deadline]
+    degraded: bool
+    rule_only: bool
+    history: Optional[ConversationHistory]
+    precomputed_intent: Optional[IntentClassification]
+    pending_slots: Optional[list]
+    slot_fill_result: Optional[Literal["filled", "extract", "reclassify", "chitchat", "cancelled"]]
+    # Slot values parsed locally from a reply that still went to the extractor
+    slot_values: Optional[dict]
\ No newline at end of file
@@ -0,0 +1,59 @@
+from typing import Optional
+from models.schemas import ConversationContext, IntentType
+from helpers.context_compaction import ConversationHistory, CorrectionMemory
+from datetime import datetime
+import time
+
+
+class SessionRecord:
+    """Per-session state held by the front ends, laid out compactly.
+
+    Uses __slots__ instead of a per-session dict, keeps the intent as the shared
+    IntentType member, stores timestamps as epoch floats and only builds the
+    pydantic ConversationContext when a caller actually touches it.
+    """
+
+    __slots__ = (
+        "_context",
+        "awaiting_confirmation",
+        "extracted_entities",
+        "last_intent",
+        "history",
+        "created_at",
+        "message_count",
+        "_corrections",
+        "pending_slots",
+    )
+
+    def __init__(self, history: Optional[ConversationHistory] = None):
+        self._context = None
+        self.awaiting_confirmation = False
+        self.extracted_entities = {}
+        self.last_intent: Optional[IntentType] = None
+        self.history = history if history is not None else ConversationHistory()
+        self.created_at = time.time()
+        self.message_count = 0
+        self._corrections = None
+        # Missing fields the last turn asked for; the next message fills them without reclassifying
+        self.pending_slots: Optional[list] = None
+
+    @property
+    def context(self) -> ConversationContext:
+        if self._context is None:
+            self._context = ConversationContext()
+        return self._context
+
+    @context.setter
+    def context(self, value: ConversationContext):
+        self._context = value
+
+    @property
+    def corrections(self) -> CorrectionMemory:
+        # Most sessions never correct anything, so the deque is created on first use
+        if self._corrections is None:
+            self._corrections = CorrectionMemory()
+        return self._corrections
+
+    @property
+    def created_at_iso(self) -> str:
+        return datetime.fromtimestamp(self.created_at).isoformat()
@@ -0,0 +1,125 @@
+import threading
+import time
+from typing import Any, Dict, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+class CircuitOpenError(Exception):
+    """Raised when an LLM call is attempted while the circuit is open"""
+
+
+class CircuitBreaker(BaseCallbackHandler):
+    """Tracks LLM failures and latency and stops calling the backend while it is unhealthy.
+
+    Attached as a callback to every chat model, so all agents and chains share it.
+    While open, new LLM calls fail fast with CircuitOpenError. Once the recovery
+    timeout has passed, a single probe call is let through and every other call
+    is rejected until it resolves; success closes the circuit again, failure
+    re-opens it. A probe that never resolves is replaced after another timeout.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    # Make the callback manager propagate CircuitOpenError instead of logging it
+    raise_error = True
+
+    def __init__(
+        self,
+        failure_threshold: int = 3,
+        slow_call_seconds: float = 10.0,
+        recovery_timeout: float = 30.0
+    ):
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_granted_at = 0.0
+        self._probe_run: Optional[UUID] = None
+        self._started: Dict[UUID, float] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def is_closed(self) -> bool:
+        return self.state == self.CLOSED
+
+    def allow_request(self) -> bool:
+        """Decide whether the caller may use the LLM; grants one probe after the recovery timeout.
+
+        Call it right before the LLM call it guards: a granted probe that is
+        never used keeps every other caller out until it times out.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            return self._grant_probe()
+
+    def _grant_probe(self) -> bool:
+        """Go half-open once the timeout has passed since opening or since the last unresolved probe"""
+        now = time.monotonic()
+        waiting_since = self.opened_at if self.state == self.OPEN else self.probe_granted_at
+        if now - waiting_since < self.recovery_timeout:
+            return False
+        self.state = self.HALF_OPEN
+        self.probe_granted_at = now
+        self._probe_run = None
+        return True
+
+    def record_success(self, latency: float):
+        with self._lock:
+            if latency >= self.slow_call_seconds:
+                self._register_failure()
+                return
+            self.consecutive_failures = 0
+            self.state = self.CLOSED
+            self._probe_run = None
+
+    def record_failure(self):
+        with self._lock:
+            self._register_failure()
+
+    def _register_failure(self):
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                print(f"LLM circuit opened after {self.consecutive_failures} failed or slow calls")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self._probe_run = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures
+        }
+
+    # Callback hooks
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs):
+        with self._lock:
+            if self.state == self.OPEN and not self._grant_probe():
+                raise CircuitOpenError("LLM backend unavailable (circuit open)")
+            if self.state == self.HALF_OPEN:
+                # The first call after going half-open is the probe; the rest wait for its outcome
+                if self._probe_run is not None and not self._grant_probe():
+                    raise CircuitOpenError("LLM backend unavailable (recovery probe in flight)")
+                self._probe_run = run_id
+                self.probe_granted_at = time.monotonic()
+        self._started[run_id] = time.monotonic()
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs):
+        self.on_chat_model_start(serialized, prompts, run_id=run_id, **kwargs)
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs):
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            self.record_success(time.monotonic() - started)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        self._started.pop(run_id, None)
+        self.record_failure()
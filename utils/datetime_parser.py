@@ -1,37 +1,40 @@
 from langchain_openai import ChatOpenAI
 from datetime import datetime, timedelta
 from langchain.prompts import ChatPromptTemplate
+from helpers.date_context import DateContext
+from utils.prompt_cache_stats import llm_node
+from utils.tracing import span
 from typing import Dict, Optional
 import re
 
 class LLMDateTimeParser:
     def __init__(self, llm: ChatOpenAI):
         self.llm = llm
-        self.current_datetime = datetime.now()
+        self.current_datetime = DateContext.now()
         
-        self.prompt = ChatPromptTemplate.from_template("""
-        IMPORTANT: Use this as the current date and time for all calculations:
-        Current date: {current_date}
-        Current time: {current_time}
-        Current day of week: {day_of_week}
-        
-        Parse this date/time expression into a specific date and time:
-        Expression: "{expression}"
+        self.prompt = ChatPromptTemplate.from_messages([
+            ("system", """Parse a date/time expression into a specific date and time.
         
         Rules:
-        - "tomorrow" means {tomorrow_date}
-        - "today" means {current_date}
-        - "next Monday" means the Monday after {current_date}
-        - Calculate all relative dates from {current_date}
+        - Calculate all relative dates from the current date given below
+        - "today" means the current date
+        - "tomorrow" means the day after the current date
+        - "next Monday" means the Monday after the current date
         
         Return ONLY in format: YYYY-MM-DD HH:MM
-        If time is not specified, return only: YYYY-MM-DD
+        If time is not specified, return only: YYYY-MM-DD"""),
+            ("human", """IMPORTANT: Use this as the current date and time for all calculations:
+        Current date: {current_date}
+        Current time: {current_time}
+        Current day of week: {day_of_week}
         
         Examples based on current date {current_date}:
         - "tomorrow at 3pm" -> {tomorrow_date} 15:00
         - "next week" -> {next_week_date}
         - "in 2 hours" -> {current_date} {two_hours_later}
-        """)
+        
+        Expression: {expression}""")
+        ])
         
     def get_relative_dates(self):
         """Calculate commonly used relative dates"""
@@ -54,10 +57,11 @@ class LLMDateTimeParser:
         
         chain = self.prompt | self.llm
         
-        result = chain.invoke({
-            "expression": expression,
-            **dates
-        })
+        with span("date_parser.parse", attributes={"date.expression": expression}):
+            result = chain.invoke({
+                "expression": expression,
+                **dates
+            }, config=llm_node("date_parsing"))
         
         # Parse the response
         parsed_text = result.content.strip()
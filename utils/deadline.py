@@ -0,0 +1,41 @@
+import time
+from typing import Optional
+
+
+class Deadline:
+    """Latency budget for a single conversation turn"""
+
+    def __init__(self, budget_seconds: float):
+        self.budget_seconds = budget_seconds
+        self.started_at = time.monotonic()
+
+    @classmethod
+    def from_header(cls, header_value: Optional[str], default_seconds: float) -> "Deadline":
+        """Build a deadline from a millisecond header value, falling back to the default"""
+        try:
+            if header_value:
+                return cls(max(float(header_value), 0.0) / 1000.0)
+        except ValueError:
+            pass
+        return cls(default_seconds)
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def remaining(self) -> float:
+        return max(self.budget_seconds - self.elapsed(), 0.0)
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def can_afford(self, estimate_seconds: float) -> bool:
+        """Check whether another call of the estimated duration still fits in the budget"""
+        return self.remaining() >= estimate_seconds
+
+    def bind_timeout(self, runnable):
+        """Cap a chat model call at the remaining budget, or the node's own timeout if that is shorter"""
+        timeout = max(self.remaining(), 0.1)
+        node_timeout = getattr(getattr(runnable, "bound", runnable), "request_timeout", None)
+        if isinstance(node_timeout, (int, float)):
+            timeout = min(timeout, node_timeout)
+        return runnable.bind(timeout=timeout)
@@ -0,0 +1,283 @@
+"""Record/replay cassettes for LLM calls.
+
+A cassette is one JSON file of LLM interactions (the request with secrets
+redacted, the response, token usage and latency) plus the conversation
+turns that produced them. In record mode a request missing from the
+cassette goes to the live model and is added; in replay mode responses are
+only served from the cassette, optionally after their recorded latency, so
+recorded conversations can be re-run offline and deterministically
+(python -m benchmarks.replay_cassette). The offline evaluation uses the same
+model for its recordings.
+"""
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pathlib import Path
+from config import Config
+from helpers.date_context import DateContext
+from utils.llm_factory import override_llm
+from utils.prompt_cache_stats import LLM_NODE_KEY
+import atexit
+import hashlib
+import json
+import re
+import threading
+import time
+
+CASSETTE_MODES = ("record", "replay")
+REDACTED = "[REDACTED]"
+# Credentials that must never reach a cassette file; the request key is hashed before redaction
+SECRET_PATTERNS = [
+    (re.compile(r"sk-[A-Za-z0-9_\-]{16,}"), REDACTED),
+    (re.compile(r"(?i)\bbearer\s+[A-Za-z0-9._~+/\-]+=*"), f"Bearer {REDACTED}"),
+    (re.compile(r"(?i)\b(api[_-]?key|password|passwd|secret|token)(\s*[:=]\s*)[^\s\"',]+"), rf"\1\2{REDACTED}"),
+]
+# Clock values in prompts (dates, times, weekday and month names); masked out for fallback matching
+CLOCK_PATTERN = re.compile(
+    r"\d+|\b(?:Monday|Tuesday|Wednesday|Thursday|Friday|Saturday|Sunday|January|February|March|April|May|June|"
+    r"July|August|September|October|November|December)\b"
+)
+
+
+class RecordingMissError(KeyError):
+    """No recorded response matches the request"""
+
+
+def redact(text: str) -> str:
+    if Config.OPENAI_API_KEY:
+        text = text.replace(Config.OPENAI_API_KEY, REDACTED)
+    for pattern, replacement in SECRET_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def redact_json(value: Any) -> Any:
+    """`value` with every string in it redacted"""
+    if isinstance(value, str):
+        return redact(value)
+    if isinstance(value, dict):
+        return {key: redact_json(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact_json(item) for item in value]
+    return value
+
+
+class Cassette:
+    """LLM interactions and conversation turns recorded to one JSON file.
+
+    Lookups match the exact request first. When replaying, a request that
+    differs only in its clock values (the prompt's current date and time)
+    falls back to the next unused interaction recorded for the same masked
+    request, in recorded order.
+    """
+
+    def __init__(self, path: str, flush_seconds: Optional[float] = None):
+        self.path = Path(path)
+        # While recording, new interactions and turns are saved at most this often (None: only on save())
+        self.flush_seconds = flush_seconds
+        self._last_saved = time.monotonic()
+        self._dirty = False
+        self.recorded_at = datetime.now().isoformat(timespec="seconds")
+        # Where the responses came from when not a live model (e.g. "stub"); None for real recordings
+        self.source: Optional[str] = None
+        self.interactions: List[dict] = []
+        self.turns: List[dict] = []
+        self.misses = 0
+        self._exact: Dict[str, dict] = {}
+        self._by_match: Dict[str, Deque[dict]] = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        if self.path.exists():
+            self.load()
+
+    def load(self):
+        with open(self.path, "r") as f:
+            data = json.load(f)
+        if "interactions" not in data:
+            # Evaluation recordings from before cassettes: {request key: response}
+            data = {"interactions": [
+                {"key": key, "response": {"content": entry["content"], "additional_kwargs": entry.get("additional_kwargs", {})},
+                 **{field: entry[field] for field in ("token_usage", "latency_ms") if field in entry}}
+                for key, entry in data.items()
+            ]}
+        self.recorded_at = data.get("recorded_at", self.recorded_at)
+        self.source = data.get("source")
+        self.turns = data.get("turns", [])
+        for interaction in data["interactions"]:
+            self.index(interaction)
+
+    def index(self, interaction: dict):
+        self.interactions.append(interaction)
+        self._exact[interaction["key"]] = interaction
+        if interaction.get("match_key"):
+            self._by_match.setdefault(interaction["match_key"], deque()).append(interaction)
+
+    @staticmethod
+    def request_keys(model_name: str, messages: List[BaseMessage], kwargs: Dict[str, Any]) -> Tuple[str, str]:
+        """(exact key, key with clock values masked) of one request"""
+        request = {
+            "model": model_name,
+            "messages": [[message.type, message.content] for message in messages],
+            "functions": [function.get("name") for function in kwargs.get("functions") or []],
+            "function_call": kwargs.get("function_call"),
+            "stop": kwargs.get("stop"),
+        }
+        encoded = json.dumps(request, sort_keys=True, default=str)
+        return (
+            hashlib.sha256(encoded.encode()).hexdigest(),
+            hashlib.sha256(CLOCK_PATTERN.sub("#", encoded).encode()).hexdigest()
+        )
+
+    def lookup(self, key: str, match_key: str, fallback: bool = True) -> Optional[dict]:
+        with self._lock:
+            interaction = self._exact.get(key)
+            unused = self._by_match.get(match_key)
+            if interaction is not None and unused and interaction in unused:
+                unused.remove(interaction)
+            elif interaction is None and fallback and unused:
+                interaction = unused.popleft()
+            if interaction is None:
+                self.misses += 1
+            return interaction
+
+    def record(self, interaction: dict):
+        with self._lock:
+            self.index(interaction)
+            self._dirty = True
+        self.flush_if_due()
+
+    def record_turn(self, session_id: str, transport: str, response: str, message: Optional[str] = None, **details):
+        """Add a conversation turn, so it can be replayed with the interactions it made"""
+        turn = {
+            "session_id": session_id,
+            "transport": transport,
+            "at": DateContext.now().isoformat(),
+            "message": message,
+            "response": response,
+            **details
+        }
+        with self._lock:
+            self.turns.append(redact_json(turn))
+            self._dirty = True
+        self.flush_if_due()
+
+    def flush_if_due(self):
+        """Save when flush_seconds have passed since the last save, so a crash loses at most that much"""
+        if self.flush_seconds is not None and time.monotonic() - self._last_saved >= self.flush_seconds:
+            self.save()
+
+    def save(self):
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty and self.path.exists():
+                    return
+                data = {"recorded_at": self.recorded_at, "interactions": list(self.interactions), "turns": list(self.turns)}
+                if self.source:
+                    data["source"] = self.source
+                self._dirty = False
+                self._last_saved = time.monotonic()
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            temporary = self.path.with_suffix(self.path.suffix + ".tmp")
+            with open(temporary, "w") as f:
+                json.dump(data, f, indent=2)
+            temporary.replace(self.path)
+
+
+class CassetteChatModel(BaseChatModel):
+    """Chat model that replays cassette responses, or records them from a live model.
+
+    Interactions may also be written by hand to stub a response.
+    """
+
+    model_name: str = "gpt-4o-mini"
+    cassette: Any = None
+    delegate: Optional[BaseChatModel] = None
+    # Replayed calls sleep for their recorded latency times this (0 replays instantly)
+    latency_scale: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "cassette-chat"
+
+    def bind_functions(self, functions, function_call=None, **kwargs):
+        return self.bind(functions=functions, function_call=function_call, **kwargs)
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        timeout = kwargs.pop("timeout", None)
+        key, match_key = Cassette.request_keys(self.model_name, messages, {**kwargs, "stop": stop})
+        # Recording only reuses exact matches so every new request reaches the live model
+        interaction = self.cassette.lookup(key, match_key, fallback=self.delegate is None)
+
+        if interaction is None:
+            if self.delegate is None:
+                raise RecordingMissError(f"No recorded response for request {key[:12]}")
+            if timeout is not None:
+                kwargs["timeout"] = timeout
+            started = time.monotonic()
+            result = self.delegate._generate(messages, stop=stop, **kwargs)
+            reply = result.generations[0].message
+            interaction = {
+                "key": key,
+                "match_key": match_key,
+                "node": ((run_manager.metadata if run_manager else None) or {}).get(LLM_NODE_KEY),
+                "request": redact_json({
+                    "model": self.model_name,
+                    "messages": [[message.type, message.content] for message in messages],
+                    "functions": [function.get("name") for function in kwargs.get("functions") or []],
+                    "stop": stop
+                }),
+                "response": redact_json({"content": reply.content, "additional_kwargs": reply.additional_kwargs}),
+                "token_usage": (result.llm_output or {}).get("token_usage", {}),
+                "latency_ms": round((time.monotonic() - started) * 1000, 1),
+            }
+            self.cassette.record(interaction)
+        elif self.latency_scale > 0 and interaction.get("latency_ms"):
+            time.sleep(interaction["latency_ms"] / 1000 * self.latency_scale)
+
+        response = interaction["response"]
+        message = AIMessage(content=response["content"], additional_kwargs=response.get("additional_kwargs", {}))
+        return ChatResult(
+            generations=[ChatGeneration(message=message)],
+            llm_output={"token_usage": interaction.get("token_usage", {}), "model_name": self.model_name}
+        )
+
+
+def install_cassette(cassette: Cassette, record: bool, latency_scale: float = 0.0, model_callbacks: Optional[list] = None):
+    """Build every chat model against `cassette`; `model_callbacks` replaces their usual ones (breaker, stats, spans)"""
+    def factory(model_name: str, temperature: float, callbacks: Optional[list] = None, **settings):
+        delegate = None
+        if record:
+            from langchain_openai import ChatOpenAI
+            delegate = ChatOpenAI(model_name=model_name, temperature=temperature, **settings)
+        return CassetteChatModel(
+            model_name=model_name,
+            cassette=cassette,
+            delegate=delegate,
+            latency_scale=latency_scale,
+            callbacks=model_callbacks if model_callbacks is not None else callbacks
+        )
+    override_llm(factory)
+
+
+_active: Optional[Cassette] = None
+_active_lock = threading.Lock()
+
+
+def use_configured_cassette() -> Optional[Cassette]:
+    """Install the cassette set by LLM_CASSETTE_MODE and LLM_CASSETTE_PATH (once per process)"""
+    global _active
+    if Config.LLM_CASSETTE_MODE not in CASSETTE_MODES:
+        return None
+    with _active_lock:
+        if _active is None:
+            record = Config.LLM_CASSETTE_MODE == "record"
+            _active = Cassette(Config.LLM_CASSETTE_PATH, Config.LLM_CASSETTE_FLUSH_SECONDS if record else None)
+            install_cassette(_active, record, Config.LLM_CASSETTE_LATENCY_SCALE)
+            if record:
+                atexit.register(_active.save)
+            print(f"LLM cassette: {Config.LLM_CASSETTE_MODE} {Config.LLM_CASSETTE_PATH}")
+    return _active
+
@@ -0,0 +1,83 @@
+from typing import Any, Callable, Dict, Optional
+from utils.circuit_breaker import CircuitBreaker
+from utils.prompt_cache_stats import PromptCacheStats
+from utils.tracing import LLMSpans
+from config import Config
+import json
+import os
+
+# Shared by every chat model in the process so one unhealthy backend trips all of them
+llm_circuit_breaker = CircuitBreaker(
+    failure_threshold=Config.CIRCUIT_FAILURE_THRESHOLD,
+    slow_call_seconds=Config.CIRCUIT_SLOW_CALL_SECONDS,
+    recovery_timeout=Config.CIRCUIT_RECOVERY_SECONDS
+)
+# Cached-token share of each node's prompts, reported on GET /health
+prompt_cache_stats = PromptCacheStats()
+# Span per LLM call in the turn's trace (TRACING_ENABLED)
+llm_spans = LLMSpans()
+
+# Replaces ChatOpenAI for every component (offline evaluation runs against recorded responses)
+_model_override: Optional[Callable] = None
+
+# How LLM_<NODE>_<FIELD> environment overrides are parsed
+NODE_SETTING_PARSERS = {
+    "model": str,
+    "temperature": float,
+    "max_tokens": int,
+    "stop": json.loads,
+    "timeout": float
+}
+
+
+def override_llm(factory: Optional[Callable]):
+    """Build every chat model with `factory(model_name=..., temperature=..., callbacks=..., max_tokens=..., stop=..., timeout=...)`; None restores ChatOpenAI"""
+    global _model_override
+    _model_override = factory
+
+
+def node_settings(node: str) -> Dict[str, Any]:
+    """Model, temperature, max_tokens, stop and timeout for one LLM node (see Config.LLM_NODES)"""
+    settings = {
+        "model": Config.MODEL_NAME,
+        "temperature": Config.TEMPERATURE,
+        "max_tokens": None,
+        "stop": None,
+        "timeout": Config.LLM_TIMEOUT_SECONDS
+    }
+    settings.update(Config.LLM_NODES.get(node, {}))
+    for field, parse in NODE_SETTING_PARSERS.items():
+        value = os.getenv(f"LLM_{node.upper()}_{field.upper()}")
+        if value:
+            settings[field] = parse(value)
+    return settings
+
+
+def create_llm(api_key: str, node: str):
+    """Create the chat model for an LLM node, wired to the shared circuit breaker"""
+    settings = node_settings(node)
+    callbacks = [llm_circuit_breaker, prompt_cache_stats]
+    if Config.TRACING_ENABLED:
+        callbacks.append(llm_spans)
+    if _model_override is not None:
+        return _model_override(
+            model_name=settings["model"],
+            temperature=settings["temperature"],
+            callbacks=callbacks,
+            max_tokens=settings["max_tokens"],
+            stop=settings["stop"],
+            timeout=settings["timeout"]
+        )
+    
+    # Imported here so importing the breaker doesn't pull in the OpenAI client
+    from langchain_openai import ChatOpenAI
+    # Nodes with the same timeout share one pooled HTTP client
+    return ChatOpenAI(
+        api_key=api_key,
+        model_name=settings["model"],
+        temperature=settings["temperature"],
+        max_tokens=settings["max_tokens"],
+        stop=settings["stop"],
+        timeout=settings["timeout"],
+        callbacks=callbacks
+    )
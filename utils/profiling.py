@@ -0,0 +1,193 @@
+"""Opt-in per-turn profiling.
+
+A turn is profiled when the client asks for it (X-Profile header) or when it
+falls in the PROFILE_SAMPLE_RATE share of turns. Two profilers are available:
+
+* "sample": a background thread records the turn thread's stack every
+  PROFILE_INTERVAL_MS. Low overhead, statistical.
+* "trace": sys.setprofile records every call and return on the turn thread.
+  Exact, but slows the turn down considerably.
+
+Each profile is written to PROFILE_DIR as collapsed stacks
+(`frame;frame;frame value` per line, value in microseconds), ready for
+flamegraph.pl or speedscope, plus a JSON file with the session id and the
+time spent in each dialog node. When a turn isn't profiled the only cost is
+the header check and one random() call.
+"""
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+from config import Config
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+
+PROFILE_MODES = ("sample", "trace")
+# Dialog graph nodes are the agent methods named *_node; their inclusive time is reported per profile
+NODE_SUFFIX = "_node"
+
+
+def node_name(frame: str) -> Optional[str]:
+    """"dialog_agent:DialogAgent.extract_entities_node" -> "extract_entities_node", None for other frames"""
+    qualname = frame.split(":", 1)[-1]
+    if "." in qualname and qualname.endswith(NODE_SUFFIX):
+        return qualname.rsplit(".", 1)[-1]
+    return None
+
+
+def profile_mode(header_value: Optional[str]) -> Optional[str]:
+    """Profiler to use for this turn, or None (the common case) to run it unprofiled"""
+    if header_value:
+        value = header_value.strip().lower()
+        if value in PROFILE_MODES:
+            return value
+        if value in ("1", "true", "yes"):
+            return Config.PROFILE_MODE
+    if Config.PROFILE_SAMPLE_RATE > 0 and random.random() < Config.PROFILE_SAMPLE_RATE:
+        return Config.PROFILE_MODE
+    return None
+
+
+def frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{Path(code.co_filename).stem}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class StackSampler:
+    """Samples one thread's stack at a fixed interval from a background thread.
+
+    Each sample is weighted by the time since the previous one, since waits
+    overshoot the interval when the sampled thread holds the GIL.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.times: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self.run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            stack = []
+            while frame is not None:
+                stack.append(frame_name(frame))
+                frame = frame.f_back
+            if stack:
+                self.times[tuple(reversed(stack))] += now - last
+            last = now
+
+    def stacks(self) -> Dict[Tuple[str, ...], float]:
+        """Stack -> estimated microseconds"""
+        return {stack: seconds * 1e6 for stack, seconds in self.times.items()}
+
+
+class CallTracer:
+    """Deterministic profiler: self time of every call stack on the current thread via sys.setprofile"""
+
+    def __init__(self):
+        self.stack = []
+        self.times: Counter = Counter()
+        self.last = 0.0
+
+    def start(self):
+        self.last = time.perf_counter()
+        sys.setprofile(self)
+
+    def stop(self):
+        sys.setprofile(None)
+
+    def __call__(self, frame, event, arg):
+        now = time.perf_counter()
+        if self.stack:
+            self.times[tuple(self.stack)] += now - self.last
+        if event == "call":
+            self.stack.append(frame_name(frame))
+        elif event == "c_call":
+            self.stack.append(f"builtin:{getattr(arg, '__qualname__', repr(arg))}")
+        elif event in ("return", "c_return", "c_exception") and self.stack:
+            self.stack.pop()
+        self.last = time.perf_counter()
+
+    def stacks(self) -> Dict[Tuple[str, ...], float]:
+        return {stack: seconds * 1e6 for stack, seconds in self.times.items()}
+
+
+class TurnProfile:
+    """Context manager profiling the current thread for one turn and writing the result to PROFILE_DIR"""
+
+    def __init__(self, mode: str, session_id: str, label: str = "turn"):
+        self.mode = mode
+        self.session_id = session_id
+        self.label = label
+        self.profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.profiler = None
+        self.started = 0.0
+
+    def __enter__(self) -> "TurnProfile":
+        if self.mode == "trace":
+            self.profiler = CallTracer()
+        else:
+            self.profiler = StackSampler(threading.get_ident(), Config.PROFILE_INTERVAL_MS / 1000)
+        self.started = time.perf_counter()
+        self.profiler.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler.stop()
+        duration = time.perf_counter() - self.started
+        try:
+            self.write(duration, failed=exc_type is not None)
+        except Exception as e:
+            print(f"Error writing profile {self.profile_id}: {e}")
+        return False
+
+    def write(self, duration: float, failed: bool):
+        stacks = self.profiler.stacks()
+        node_us: Counter = Counter()
+        for stack, us in stacks.items():
+            for node in {node_name(frame) for frame in stack} - {None}:
+                node_us[node] += us
+
+        directory = Path(Config.PROFILE_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        base = directory / f"{self.profile_id}-{self.label}"
+        with open(f"{base}.collapsed", "w") as f:
+            for stack, us in sorted(stacks.items()):
+                if us >= 1:
+                    f.write(f"{';'.join(stack)} {int(us)}\n")
+        with open(f"{base}.json", "w") as f:
+            json.dump({
+                "profile_id": self.profile_id,
+                "label": self.label,
+                "session_id": self.session_id,
+                "mode": self.mode,
+                "pid": os.getpid(),
+                "duration_ms": round(duration * 1000, 2),
+                "failed": failed,
+                "node_timings_ms": {node: round(us / 1000, 2) for node, us in node_us.most_common()},
+                "collapsed_stacks": f"{base}.collapsed"
+            }, f, indent=2)
+        print(f"Profile written to {base}.collapsed ({self.mode}, {duration * 1000:.0f} ms, session {self.session_id})")
+
+
+def run_profiled(mode: Optional[str], session_id: str, label: str, function: Callable, *args, **kwargs):
+    """Call `function`, under a TurnProfile when `mode` is set"""
+    if mode is None:
+        return function(*args, **kwargs)
+    with TurnProfile(mode, session_id, label):
+        return function(*args, **kwargs)
@@ -0,0 +1,69 @@
+import threading
+from typing import Any, Dict, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Run metadata key naming the component that made an LLM call
+LLM_NODE_KEY = "llm_node"
+
+
+def llm_node(name: str) -> Dict[str, Any]:
+    """Run config that attributes the chain's LLM calls to `name` in the prompt cache stats"""
+    return {"metadata": {LLM_NODE_KEY: name}}
+
+
+def token_usage(response) -> Tuple[int, int, int]:
+    """(prompt tokens, prompt tokens served from the provider's prefix cache, completion tokens) of one LLM result"""
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                cached = (usage.get("input_token_details") or {}).get("cache_read", 0)
+                return usage.get("input_tokens", 0), cached, usage.get("output_tokens", 0)
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+    return usage.get("prompt_tokens", 0), cached, usage.get("completion_tokens", 0)
+
+
+class PromptCacheStats(BaseCallbackHandler):
+    """Per-node prompt and cached-token counts reported by the provider.
+
+    OpenAI caches prompt prefixes of 1024+ tokens automatically, which is why
+    every prompt template puts its static instructions first and the per-call
+    values (the message, current date, known entities) last. The share of
+    cached tokens shows whether a node's prompt still does;
+    python -m benchmarks.prompt_prefix measures the prefix offline.
+    """
+
+    def __init__(self):
+        self.nodes: Dict[str, Dict[str, int]] = {}
+        self._running: Dict[UUID, str] = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, metadata: Optional[dict] = None, **kwargs):
+        with self._lock:
+            self._running[run_id] = (metadata or {}).get(LLM_NODE_KEY, "other")
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs):
+        prompt_tokens, cached_tokens, _ = token_usage(response)
+        with self._lock:
+            node = self._running.pop(run_id, "other")
+            counts = self.nodes.setdefault(node, {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0})
+            counts["calls"] += 1
+            counts["prompt_tokens"] += prompt_tokens
+            counts["cached_tokens"] += cached_tokens
+
+    def on_llm_error(self, error, *, run_id: UUID, **kwargs):
+        with self._lock:
+            self._running.pop(run_id, None)
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                node: dict(
+                    counts,
+                    cached_ratio=round(counts["cached_tokens"] / counts["prompt_tokens"], 3) if counts["prompt_tokens"] else None
+                )
+                for node, counts in sorted(self.nodes.items())
+            }
@@ -0,0 +1,51 @@
+from fastapi.responses import JSONResponse, Response
+from typing import Any, List, Optional
+from config import Config
+import json
+
+# Both are optional: without them the API keeps stdlib JSON and text WebSocket frames
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ormsgpack
+except ImportError:
+    ormsgpack = None
+
+# Offered by clients in Sec-WebSocket-Protocol to get binary msgpack frames on /ws
+MSGPACK_SUBPROTOCOL = "msgpack"
+
+
+def fast_json_enabled() -> bool:
+    return Config.FAST_JSON and orjson is not None
+
+
+def dumps_json(payload: Any) -> str:
+    if fast_json_enabled():
+        return orjson.dumps(payload).decode()
+    return json.dumps(payload)
+
+
+def json_response(content: Any, status_code: int = 200) -> Response:
+    """orjson-rendered response when FAST_JSON is on, the stdlib one otherwise"""
+    if fast_json_enabled():
+        from fastapi.responses import ORJSONResponse
+        return ORJSONResponse(content=content, status_code=status_code)
+    return JSONResponse(content=content, status_code=status_code)
+
+
+def negotiate_subprotocol(offered: List[str]) -> Optional[str]:
+    """Pick the WebSocket subprotocol from the client's offer; None means JSON text frames"""
+    if MSGPACK_SUBPROTOCOL in offered and ormsgpack is not None:
+        return MSGPACK_SUBPROTOCOL
+    return None
+
+
+def packb(payload: Any) -> bytes:
+    return ormsgpack.packb(payload)
+
+
+def unpackb(data: bytes) -> Any:
+    return ormsgpack.unpackb(data)
@@ -0,0 +1,124 @@
+"""Summarize the span files written by utils/tracing.py.
+
+Prints latency percentiles per span name, then the slowest turns with their
+critical path: the chain of nodes, LLM calls and writes the turn actually
+waited on, with each span's self time.
+
+Run from the repository root:
+    python -m utils.trace_report --slowest 5
+    python -m utils.trace_report traces/spans.jsonl --min-ms 500
+"""
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+import argparse
+import glob
+import json
+
+from config import Config
+
+
+def attribute_values(span: dict) -> Dict[str, object]:
+    values = {}
+    for attribute in span.get("attributes", []):
+        value = attribute["value"]
+        if "intValue" in value:
+            values[attribute["key"]] = int(value["intValue"])
+        else:
+            values[attribute["key"]] = next(iter(value.values()), None)
+    return values
+
+
+def load_spans(path: str) -> List[dict]:
+    """Spans from `path` and its rotated backups (path.1, path.2, ...)"""
+    spans = []
+    for file in sorted(glob.glob(glob.escape(path) + "*")):
+        with open(file, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                span = json.loads(line)
+                span["duration_ms"] = (int(span["endTimeUnixNano"]) - int(span["startTimeUnixNano"])) / 1e6
+                span["attrs"] = attribute_values(span)
+                spans.append(span)
+    return spans
+
+
+def percentile(values: List[float], share: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+def critical_path(span: dict, children: Dict[str, List[dict]], depth: int = 0) -> List[Tuple[int, dict]]:
+    """(depth, span) the turn waited on, in order.
+
+    Walks back from the span's end: the child that finished last, then the
+    last one to finish before that child started, and so on.
+    """
+    waited_on = []
+    cursor = int(span["endTimeUnixNano"])
+    for child in sorted(children.get(span["spanId"], []), key=lambda child: -int(child["endTimeUnixNano"])):
+        if int(child["endTimeUnixNano"]) <= cursor:
+            waited_on.append(child)
+            cursor = int(child["startTimeUnixNano"])
+    path = [(depth, span)]
+    for child in reversed(waited_on):
+        path.extend(critical_path(child, children, depth + 1))
+    return path
+
+
+def label(span: dict) -> str:
+    attrs = span["attrs"]
+    details = [f"{key}={attrs[key]}" for key in ("llm.node", "gen_ai.request.model", "llm.cache_hit", "semantic_cache.hit") if key in attrs]
+    if "gen_ai.usage.input_tokens" in attrs:
+        details.append(f"tokens={attrs['gen_ai.usage.input_tokens']}/{attrs.get('gen_ai.usage.output_tokens', 0)}")
+    if span.get("status", {}).get("code") == 2:
+        details.append(f"error={span['status'].get('message', '')}")
+    return f"{span['name']} {' '.join(details)}".strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", nargs="?", default=Config.TRACE_PATH)
+    parser.add_argument("--slowest", type=int, default=10, help="turns to show with their critical path")
+    parser.add_argument("--min-ms", type=float, default=0.0, help="only show turns at least this slow")
+    args = parser.parse_args()
+
+    spans = load_spans(args.path)
+    if not spans:
+        print(f"No spans in {args.path}*")
+        return
+
+    by_name = defaultdict(list)
+    children = defaultdict(list)
+    span_ids = {span["spanId"] for span in spans}
+    roots = []
+    for span in spans:
+        by_name[span["name"]].append(span["duration_ms"])
+        if span["parentSpanId"] and span["parentSpanId"] in span_ids:
+            children[span["parentSpanId"]].append(span)
+        else:
+            roots.append(span)
+
+    print(f"{len(roots)} traces, {len(spans)} spans from {Path(args.path).name}*\n")
+    print(f"{'span':<32} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'total ms':>10}")
+    for name, durations in sorted(by_name.items(), key=lambda item: -sum(item[1])):
+        print(
+            f"{name:<32} {len(durations):>7} {percentile(durations, 0.5):>9.1f} "
+            f"{percentile(durations, 0.95):>9.1f} {max(durations):>9.1f} {sum(durations):>10.1f}"
+        )
+
+    slow = [root for root in roots if root["duration_ms"] >= args.min_ms]
+    for root in sorted(slow, key=lambda span: -span["duration_ms"])[:args.slowest]:
+        attrs = root["attrs"]
+        print(
+            f"\n{root['duration_ms']:.1f} ms  {root['name']}  trace={root['traceId']}  "
+            f"session={attrs.get('session.id', '-')}  transport={attrs.get('transport', '-')}"
+        )
+        for depth, span in critical_path(root, children):
+            own = span["duration_ms"] - sum(child["duration_ms"] for child in children.get(span["spanId"], []))
+            print(f"  {'  ' * depth}{span['duration_ms']:>8.1f} ms (self {max(own, 0.0):.1f})  {label(span)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""Local span tracing of conversation turns.
+
+Every turn gets a root span (POST /chat, batch items, WebSocket messages and
+Gradio messages) with child spans for each dialog node, LLM call, LLM date
+parse and outbox write. Finished spans are queued and written by a
+background thread to TRACE_PATH, one JSON object per line, rotated at
+TRACE_MAX_BYTES. Each line is an OTLP/JSON Span (traceId, spanId,
+parentSpanId, kind, start/endTimeUnixNano, attributes, status), so it can be
+wrapped in resourceSpans/scopeSpans and sent to any OpenTelemetry backend;
+none is needed to read them (python -m utils.trace_report).
+
+With TRACING_ENABLED off, start_span returns None and nodes and models are
+built without tracing wrappers.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional
+from uuid import UUID
+from config import Config
+import atexit
+import functools
+import json
+import logging
+import queue
+import random
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from utils.prompt_cache_stats import LLM_NODE_KEY, token_usage
+
+# OTLP span kinds and status codes
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+def otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Span:
+    """One timed operation; children started while it is current share its trace"""
+
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id", "start_ns", "attributes")
+
+    def __init__(self, name: str, parent: Optional["Span"], kind: int, attributes: Dict[str, Any]):
+        self.name = name
+        self.kind = kind
+        self.trace_id = parent.trace_id if parent else f"{random.getrandbits(128):032x}"
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent.span_id if parent else ""
+        self.start_ns = time.time_ns()
+        self.attributes = attributes
+
+    def set_attributes(self, attributes: Dict[str, Any]):
+        self.attributes.update(attributes)
+
+    def end(self, error: Optional[BaseException] = None):
+        status = {"code": STATUS_OK}
+        if error is not None:
+            status = {"code": STATUS_ERROR, "message": f"{type(error).__name__}: {error}"}
+        span_writer().info({
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(time.time_ns()),
+            "attributes": [
+                {"key": key, "value": otlp_value(value)}
+                for key, value in self.attributes.items() if value is not None
+            ],
+            "status": status
+        })
+
+
+def start_span(
+    name: str,
+    parent: Optional[Span] = None,
+    kind: int = SPAN_KIND_INTERNAL,
+    attributes: Optional[Dict[str, Any]] = None
+) -> Optional[Span]:
+    """Start a span under `parent` (default: the current span); None when tracing is off"""
+    if not Config.TRACING_ENABLED:
+        return None
+    return Span(name, parent or _current_span.get(), kind, dict(attributes or {}))
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def annotate(attributes: Dict[str, Any]):
+    """Add attributes to the current span, if any"""
+    span = _current_span.get()
+    if span is not None:
+        span.set_attributes(attributes)
+
+
+@contextmanager
+def activate(span: Optional[Span]):
+    """Make `span` the parent of spans started in this block"""
+    if span is None:
+        yield None
+        return
+    token = _current_span.set(span)
+    try:
+        yield span
+    finally:
+        _current_span.reset(token)
+
+
+@contextmanager
+def span(name: str, kind: int = SPAN_KIND_INTERNAL, attributes: Optional[Dict[str, Any]] = None):
+    """Start a child of the current span, make it current for the block and end it afterwards"""
+    child = start_span(name, kind=kind, attributes=attributes)
+    if child is None:
+        yield None
+        return
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        _current_span.reset(token)
+        child.end(e)
+        raise
+    _current_span.reset(token)
+    child.end()
+
+
+def traced_steps(name: str, attributes: Dict[str, Any], steps: Iterator) -> Iterator:
+    """Run a turn generator under a root span.
+
+    The span is made current around each step rather than held for the whole
+    generator, since steps may resume on different threads (Gradio runs sync
+    generators on a worker pool).
+    """
+    root = start_span(name, kind=SPAN_KIND_SERVER, attributes=attributes)
+    if root is None:
+        yield from steps
+        return
+    try:
+        while True:
+            with activate(root):
+                try:
+                    update = next(steps)
+                except StopIteration:
+                    break
+            yield update
+    except BaseException as e:
+        root.end(e)
+        raise
+    root.end()
+
+
+def traced_node(name: str, node: Callable[[dict], Optional[dict]]) -> Callable[[dict], Optional[dict]]:
+    """Wrap a dialog node so each run is a span under the turn"""
+    if not Config.TRACING_ENABLED:
+        return node
+
+    @functools.wraps(node)
+    def run(state: dict) -> Optional[dict]:
+        with span(f"node.{name}", attributes={"dialog.node": name}):
+            return node(state)
+
+    return run
+
+
+class LLMSpans(BaseCallbackHandler):
+    """Callback recording each chat model call as a client span under the node that made it"""
+
+    # Run in the caller's context so the current span is the node's
+    run_inline = True
+
+    def __init__(self):
+        self._running: Dict[UUID, Span] = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, metadata: Optional[dict] = None, **kwargs):
+        metadata = metadata or {}
+        params = kwargs.get("invocation_params") or {}
+        llm_span = start_span("llm.call", kind=SPAN_KIND_CLIENT, attributes={
+            "gen_ai.system": "openai",
+            "gen_ai.request.model": params.get("model") or params.get("model_name") or metadata.get("ls_model_name"),
+            "gen_ai.request.max_tokens": params.get("max_tokens"),
+            "llm.node": metadata.get(LLM_NODE_KEY, "other")
+        })
+        if llm_span is not None:
+            with self._lock:
+                self._running[run_id] = llm_span
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs):
+        with self._lock:
+            llm_span = self._running.pop(run_id, None)
+        if llm_span is None:
+            return
+        prompt_tokens, cached_tokens, completion_tokens = token_usage(response)
+        llm_span.set_attributes({
+            "gen_ai.usage.input_tokens": prompt_tokens,
+            "gen_ai.usage.output_tokens": completion_tokens,
+            "gen_ai.usage.cached_input_tokens": cached_tokens,
+            "llm.cache_hit": cached_tokens > 0
+        })
+        llm_span.end()
+
+    def on_llm_error(self, error, *, run_id: UUID, **kwargs):
+        with self._lock:
+            llm_span = self._running.pop(run_id, None)
+        if llm_span is not None:
+            llm_span.end(error)
+
+
+class _SpanQueueHandler(QueueHandler):
+    def prepare(self, record):
+        # Serialized on the writer thread, not in the turn
+        return record
+
+
+class _SpanFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps(record.msg, separators=(",", ":"))
+
+
+_writer: Optional[logging.Logger] = None
+_writer_lock = threading.Lock()
+
+
+def span_writer() -> logging.Logger:
+    """Logger whose records are written to the rotating trace file by a background thread"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                path = Path(Config.TRACE_PATH)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                file_handler = RotatingFileHandler(
+                    path,
+                    maxBytes=Config.TRACE_MAX_BYTES,
+                    backupCount=Config.TRACE_BACKUP_COUNT,
+                    encoding="utf-8"
+                )
+                file_handler.setFormatter(_SpanFormatter())
+                records = queue.SimpleQueue()
+                listener = QueueListener(records, file_handler)
+                listener.start()
+                # Flush queued spans on shutdown
+                atexit.register(listener.stop)
+
+                logger = logging.getLogger("conversational_assistant.spans")
+                logger.setLevel(logging.INFO)
+                logger.propagate = False
+                logger.addHandler(_SpanQueueHandler(records))
+                _writer = logger
+    return _writer
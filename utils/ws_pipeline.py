@@ -0,0 +1,215 @@
+"""Framed, pipelined WebSocket protocol for /ws/{session_id}.
+
+Client frames:
+    {"type": "chat", "id": "r1", "message": "Book a meeting"}
+    {"type": "ping", "id": "p1"}            answered with {"type": "pong", "id": "p1"}
+    {"type": "pong"}                        reply to a server ping
+
+Server frames:
+    {"type": "response", "id": "r1", "response": {...}}
+    {"type": "error", "id": "r1", "error": "..."}
+    {"type": "busy", "id": "r1", "retry_after_ms": 5000}    inbox full, request dropped
+    {"type": "throttle", "queued": 24, "capacity": 32}      slow down until "resume"
+    {"type": "resume", "queued": 8}
+    {"type": "ping", "ts": 1700000000.0}
+
+Requests may be pipelined: they queue in a bounded per-connection inbox and are
+answered in order. A frame that isn't a typed object (e.g. plain text) is the
+legacy protocol: it is answered with the bare response and no pings are sent.
+A frame that can't be decoded gets an error frame with no id and the
+connection stays open.
+"""
+from fastapi import HTTPException, WebSocket, WebSocketDisconnect
+from typing import Any, Awaitable, Callable, Optional, Set
+from utils.serialization import dumps_json, packb, unpackb
+from config import Config
+import asyncio
+import json
+import time
+
+
+class FrameError(ValueError):
+    """A frame that can't be decoded, or of the wrong kind (text on a msgpack connection or vice versa)"""
+
+
+class FrameCodec:
+    """JSON text frames, or msgpack binary frames when that subprotocol was negotiated"""
+
+    def __init__(self, binary: bool):
+        self.binary = binary
+
+    async def receive(self, websocket: WebSocket) -> Any:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+        if self.binary:
+            if message.get("bytes") is None:
+                raise FrameError("Expected a binary msgpack frame")
+            try:
+                return unpackb(message["bytes"])
+            except ValueError as e:
+                raise FrameError(f"Malformed msgpack frame: {e}")
+        text = message.get("text")
+        if text is None:
+            raise FrameError("Expected a JSON text frame")
+        try:
+            frame = json.loads(text)
+        except ValueError:
+            return text
+        # Only objects are protocol frames; legacy plain text like "123" or "true" stays a string
+        return frame if isinstance(frame, dict) else text
+
+    async def send(self, websocket: WebSocket, payload: Any):
+        if self.binary:
+            await websocket.send_bytes(packb(payload))
+        else:
+            await websocket.send_text(dumps_json(payload))
+
+
+class PipelinedConnection:
+    """One client connection: a reader, a bounded inbox and an in-order worker started on demand"""
+
+    __slots__ = ("websocket", "codec", "handler", "hub", "inbox", "capacity", "worker",
+                 "send_lock", "last_seen", "framed", "throttled")
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        codec: FrameCodec,
+        handler: Callable[[str], Awaitable[dict]],
+        hub: "ConnectionHub",
+        capacity: int = Config.WS_INBOX_SIZE
+    ):
+        self.websocket = websocket
+        self.codec = codec
+        self.handler = handler
+        self.hub = hub
+        self.capacity = capacity
+        self.inbox: asyncio.Queue = asyncio.Queue(maxsize=capacity)
+        self.worker: Optional[asyncio.Task] = None
+        self.send_lock = asyncio.Lock()
+        self.last_seen = time.monotonic()
+        self.framed = False
+        self.throttled = False
+
+    async def send(self, payload: Any):
+        async with self.send_lock:
+            await self.codec.send(self.websocket, payload)
+
+    async def run(self):
+        self.hub.register(self)
+        try:
+            while True:
+                try:
+                    frame = await self.codec.receive(self.websocket)
+                except FrameError as e:
+                    # Answer the bad frame and keep reading; one garbled frame doesn't end the connection
+                    self.last_seen = time.monotonic()
+                    await self.send({"type": "error", "id": None, "error": str(e)})
+                    continue
+                self.last_seen = time.monotonic()
+                await self.dispatch(frame)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            self.hub.unregister(self)
+            if self.worker is not None:
+                self.worker.cancel()
+
+    async def dispatch(self, frame: Any):
+        if isinstance(frame, dict) and "type" in frame:
+            self.framed = True
+        else:
+            frame = {"type": "chat", "message": frame.get("message", "") if isinstance(frame, dict) else str(frame), "legacy": True}
+
+        kind = frame["type"]
+        if kind == "pong":
+            return
+        if kind == "ping":
+            await self.send({"type": "pong", "id": frame.get("id")})
+            return
+        if kind != "chat":
+            await self.send({"type": "error", "id": frame.get("id"), "error": f"Unknown frame type: {kind}"})
+            return
+        if not isinstance(frame.get("message"), str):
+            await self.send({"type": "error", "id": frame.get("id"), "error": "Chat frames need a string \"message\""})
+            return
+
+        if self.inbox.full():
+            # Explicit rejection rather than letting the socket buffer grow without bound
+            retry_after = self.inbox.qsize() * Config.LLM_CALL_ESTIMATE_SECONDS
+            await self.send({"type": "busy", "id": frame.get("id"), "retry_after_ms": int(retry_after * 1000)})
+            return
+        self.inbox.put_nowait(frame)
+
+        if not self.throttled and self.inbox.qsize() >= self.capacity * 3 // 4:
+            self.throttled = True
+            await self.send({"type": "throttle", "queued": self.inbox.qsize(), "capacity": self.capacity})
+        if self.worker is None or self.worker.done():
+            self.worker = asyncio.create_task(self.drain())
+
+    async def drain(self):
+        """Answer queued requests in order; exits when the inbox is empty"""
+        while not self.inbox.empty():
+            frame = self.inbox.get_nowait()
+            try:
+                response = await self.handler(frame["message"])
+                payload = response if frame.get("legacy") else {"type": "response", "id": frame.get("id"), "response": response}
+            except HTTPException as e:
+                payload = {"type": "error", "id": frame.get("id"), "error": e.detail}
+            except Exception as e:
+                # One bad request must not stop the worker; later frames still get answers
+                print(f"WebSocket request failed: {e}")
+                payload = {"type": "error", "id": frame.get("id"), "error": str(e)}
+            try:
+                await self.send(payload)
+            except (WebSocketDisconnect, RuntimeError):
+                # Client went away mid-pipeline; the reader cleans up
+                return
+
+            if self.throttled and self.inbox.qsize() <= self.capacity // 4:
+                self.throttled = False
+                await self.send({"type": "resume", "queued": self.inbox.qsize()})
+
+    async def ping(self, now: float):
+        try:
+            if now - self.last_seen > Config.WS_IDLE_TIMEOUT_SECONDS:
+                await self.websocket.close(code=1001)
+            else:
+                await self.send({"type": "ping", "ts": time.time()})
+        except Exception:
+            # The reader notices the closed socket and unregisters the connection
+            pass
+
+
+class ConnectionHub:
+    """One heartbeat task for all framed connections instead of a timer per socket"""
+
+    def __init__(self, ping_interval: float = Config.WS_PING_INTERVAL_SECONDS):
+        self.ping_interval = ping_interval
+        self.connections: Set[PipelinedConnection] = set()
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    def register(self, connection: PipelinedConnection):
+        self.connections.add(connection)
+        if self._heartbeat is None or self._heartbeat.done():
+            self._heartbeat = asyncio.create_task(self.heartbeat())
+
+    def unregister(self, connection: PipelinedConnection):
+        self.connections.discard(connection)
+
+    async def heartbeat(self):
+        while self.connections:
+            await asyncio.sleep(self.ping_interval)
+            now = time.monotonic()
+            # Legacy clients don't understand ping frames
+            framed = [connection for connection in self.connections if connection.framed]
+            await asyncio.gather(*(connection.ping(now) for connection in framed))
+
+    def status(self) -> dict:
+        return {
+            "connections": len(self.connections),
+            "framed": sum(1 for connection in self.connections if connection.framed),
+            "queued": sum(connection.inbox.qsize() for connection in self.connections),
+            "throttled": sum(1 for connection in self.connections if connection.throttled)
+        }